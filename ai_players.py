@@ -1,30 +1,88 @@
+import asyncio
 import json
 import os
+import time
 from poke_env.player import Player
-from ollama_chat import local_choose_action
-from open_router_chat import router_choose_action
+from poke_env.concurrency import POKE_LOOP, handle_threaded_coroutines
+from ollama_chat import local_choose_action, local_stream_action, warm_up, close_clients, DEFAULT_KEEP_ALIVE
+from open_router_chat import router_choose_action, router_stream_action, close_default_client
+from battle_log import BattleLogAccumulator
+from prompt_registry import get_registry, DEFAULT_VARIANT
+from streaming_decision import ActionStreamParser
 from poke_env.battle import Battle
 from colorama import init, Fore
-from utils import (create_observation_dictionary, create_team_array, create_action_context,
-                   encode_to_toon, load_yaml, log_battle_interaction)
+from prompt_layout import assemble_prompt, section_token_counts, PrefixStabilityTracker, LAYOUTS, SECTION_TITLES
+from token_counting import get_tokenizer, count_cached
+from battle_toon import encode_observations, encode_actions, TeamFragmentCache
+from log_writer import get_default_writer, close_default_writer
+from interaction_spool import InteractionSpool, recover_spools, log_interaction, DEFAULT_SPOOL_DIR
+from metrics import get_metrics
+from tracing import tracer
 
 init(autoreset=True)
 
 class AIPlayer(Player):
-    def __init__ (self, model, provider, verbosity=False, account_configuration=None, team=None, battle_format=None, log_length=15, max_concurrent_battles=0, max_turns=25):
-        super().__init__(account_configuration=account_configuration, team=team, battle_format=battle_format, max_concurrent_battles=max_concurrent_battles)
+    def __init__ (self, model, provider, verbosity=False, account_configuration=None, team=None, battle_format=None, log_length=15, max_concurrent_battles=0, max_turns=25, prompt_variant=DEFAULT_VARIANT, router_client=None, ollama_host=None, keep_alive=DEFAULT_KEEP_ALIVE, preload=True, stream=False, temperature=None, decision_cache=None, prompt_layout="stable", token_budget=None, tokenizer="approx", log_writer=None, spool_dir=DEFAULT_SPOOL_DIR, spool_recovery="log", server_configuration=None):
+        super().__init__(account_configuration=account_configuration, team=team, battle_format=battle_format, max_concurrent_battles=max_concurrent_battles, server_configuration=server_configuration)
         self.model = model
         self._provider = provider  # 'local' or 'router'
         self.verbosity = verbosity
         self.log_length = log_length
         self.max_turns = max_turns
-        # Store battle interactions to log when battle finishes
+        self.prompt_variant = prompt_variant
+        # Shared pooled HTTP client for OpenRouter (None uses the process-wide client)
+        self.router_client = router_client
+        # Ollama host and how long the model stays resident between requests
+        self.ollama_host = ollama_host
+        self.keep_alive = keep_alive
+        # Stream decisions and commit the action before the reasoning is complete
+        self.stream = stream
+        # Sampling temperature sent to the provider (None = provider default)
+        self.temperature = temperature
+        # Optional DecisionCache shared across battles (and players of the same model)
+        self.decision_cache = decision_cache
+        # Background writer for interaction logs (None uses the process-wide writer)
+        self.log_writer = log_writer if log_writer is not None else get_default_writer()
+        # Process-wide battle and request metrics (see metrics.start_metrics to export them)
+        self.metrics = get_metrics()
+        # Completed interactions of in-flight battles are spooled to disk (None keeps them in memory).
+        # Spools left by a process that died mid-battle are logged as "unfinished" or discarded.
+        self.spool = None
+        if spool_dir:
+            recover_spools(spool_dir, action=spool_recovery, writer=self.log_writer)
+            self.spool = InteractionSpool(spool_dir, owner=self.username, writer=self.log_writer)
+        # Prompt section order (see prompt_layout.LAYOUTS) and per-battle prefix stability tracking
+        if prompt_layout not in LAYOUTS:
+            raise ValueError(f"Unknown prompt layout: {prompt_layout}")
+        self.prompt_layout = prompt_layout
+        self.prefix_tracker = PrefixStabilityTracker()
+        # Prompt token budget (None = log_length events) and the tokenizer used for section accounting.
+        # With a budget, log_length caps how many events are candidates for the battle log.
+        self.token_budget = token_budget
+        self.count_tokens = get_tokenizer(tokenizer)
+        # Per-section token counts of the latest prompt, per battle
+        self.battle_token_counts = {}
+        # Parse prompts.yaml up front (and fail fast on an unknown variant)
+        get_registry().system_message(prompt_variant)
+        # Battle interactions to log when the battle finishes (with a spool, only the latest one)
         self.battle_interactions = {}
         # Store scratchpad content per battle for context persistence
         self.battle_scratchpads = {}
+        # Incremental battle log per battle (only new events are formatted each turn)
+        self.battle_logs = {}
+        # Encoded team member fragments per battle (only changed Pokemon are re-serialized)
+        self.battle_team_fragments = {}
+        # Background tasks finishing a streamed decision, per battle
+        self.battle_pending_streams = {}
+
+        # Load the local model now so the first turn doesn't include model load time
+        if provider == 'local' and preload:
+            asyncio.run_coroutine_threadsafe(
+                warm_up(model, host=ollama_host, keep_alive=keep_alive), self.ps_client.loop
+            ).add_done_callback(self._warm_up_done)
 
     @classmethod
-    def local(cls, model, verbosity=False, account_configuration=None, team=None, battle_format=None, log_length=10, max_concurrent_battles=0, max_turns=25):
+    def local(cls, model, verbosity=False, account_configuration=None, team=None, battle_format=None, log_length=10, max_concurrent_battles=0, max_turns=25, prompt_variant=DEFAULT_VARIANT, ollama_host=None, keep_alive=DEFAULT_KEEP_ALIVE, preload=True, stream=False, temperature=None, decision_cache=None, prompt_layout="stable", token_budget=None, tokenizer="approx", log_writer=None, spool_dir=DEFAULT_SPOOL_DIR, spool_recovery="log", server_configuration=None):
         """Create an AIPlayer that uses local Ollama models"""
         return cls(
             model=model,
@@ -35,11 +93,25 @@ class AIPlayer(Player):
             battle_format=battle_format,
             log_length=log_length if log_length is not None else 25,
             max_concurrent_battles=max_concurrent_battles,
-            max_turns=max_turns
+            max_turns=max_turns,
+            prompt_variant=prompt_variant,
+            ollama_host=ollama_host,
+            keep_alive=keep_alive,
+            preload=preload,
+            stream=stream,
+            temperature=temperature,
+            decision_cache=decision_cache,
+            prompt_layout=prompt_layout,
+            token_budget=token_budget,
+            tokenizer=tokenizer,
+            log_writer=log_writer,
+            spool_dir=spool_dir,
+            spool_recovery=spool_recovery,
+            server_configuration=server_configuration
         )
 
     @classmethod
-    def router(cls, model, verbosity=False, account_configuration=None, team=None, battle_format=None, log_length=None, max_concurrent_battles=0, max_turns=25):
+    def router(cls, model, verbosity=False, account_configuration=None, team=None, battle_format=None, log_length=None, max_concurrent_battles=0, max_turns=25, prompt_variant=DEFAULT_VARIANT, router_client=None, stream=False, temperature=None, decision_cache=None, prompt_layout="stable", token_budget=None, tokenizer="approx", log_writer=None, spool_dir=DEFAULT_SPOOL_DIR, spool_recovery="log", server_configuration=None):
         """Create an AIPlayer that uses OpenRouter models"""
         return cls(
             model=model,
@@ -50,58 +122,77 @@ class AIPlayer(Player):
             battle_format=battle_format,
             log_length=log_length if log_length is not None else 100,
             max_concurrent_battles=max_concurrent_battles,
-            max_turns=max_turns
+            max_turns=max_turns,
+            prompt_variant=prompt_variant,
+            router_client=router_client,
+            stream=stream,
+            temperature=temperature,
+            decision_cache=decision_cache,
+            prompt_layout=prompt_layout,
+            token_budget=token_budget,
+            tokenizer=tokenizer,
+            log_writer=log_writer,
+            spool_dir=spool_dir,
+            spool_recovery=spool_recovery,
+            server_configuration=server_configuration
         )
 
-    def write_prompt(self, battle: Battle):
-        system_prompt = load_yaml()
+    def _warm_up_done(self, future):
+        if future.exception() is not None and self.verbosity:
+            print(Fore.RED + f"Failed to warm up {self.model}: {future.exception()}")
+
+    def encode_battle_state(self, battle: Battle):
+        """Encode the structured battle state sections (TOON) used in the prompt and decision cache key."""
+        state = {"observations": encode_observations(battle)}
+        fragments = self.battle_team_fragments.get(battle.battle_tag)
+        if fragments is None:
+            fragments = self.battle_team_fragments[battle.battle_tag] = TeamFragmentCache()
+        if self.prompt_layout == "stable":
+            # Static sets and per-turn status are split so the sets can stay in the cached prefix
+            state["team_sets"] = fragments.encode_team_sets(battle)
+            state["team_status"] = fragments.encode_team_status(battle)
+        else:
+            state["team"] = fragments.encode_team(battle)
+        # Simplified - no duplication of moves already in team/observations
+        state["actions"] = encode_actions(battle)
+        return state
+
+    def write_prompt(self, battle: Battle, state=None):
+        system_message = get_registry().system_message(self.prompt_variant)
         battle_tag = battle.battle_tag
-
-        # Collect battle log events
-        battle_log = []
-        for turn_num in sorted(battle.observations.keys()):
-            for event in battle.observations[turn_num].events:
-                # Format event as a string (join the split message parts with |)
-                if "html" not in event:
-                    battle_log.append("|".join(event))
-
-        # Get last 100 events
-        recent_messages = battle_log[-self.log_length:] if len(battle_log) > self.log_length else battle_log
-
-        # Build the prompt
-        prompt_parts = []
-
-        # Add battle log (plain text - already optimal)
-        prompt_parts.append("Battle Log (Recent Events):")
-        for msg in recent_messages:
-            prompt_parts.append(f"  {msg}")
-
-        # Use TOON encoding for structured data to save tokens
-        observations = create_observation_dictionary(battle)
-        prompt_parts.append("Observations:")
-        prompt_parts.append(encode_to_toon(observations))
-
-        team_info = create_team_array(battle)
-        prompt_parts.append("Team Status:")
-        prompt_parts.append(encode_to_toon(team_info))
-
-        # Add available actions (simplified - no duplication of moves already in team/observations)
-        available_actions = create_action_context(battle)
-        prompt_parts.append("Available Actions:")
-        prompt_parts.append(encode_to_toon(available_actions))
-
-        # Add scratchpad from previous turn if it exists
-        if battle_tag in self.battle_scratchpads:
-            prompt_parts.append(f"Scratchpad (from previous turn):\n{self.battle_scratchpads[battle_tag]}")
-
-        # Combine all parts with clear separation
-        final_prompt = "\n".join(prompt_parts)
+        if state is None:
+            state = self.encode_battle_state(battle)
+
+        sections = dict(state)
+        # Scratchpad from previous turns, if any
+        sections["scratchpad"] = self.battle_scratchpads.get(battle_tag)
+        token_counts = section_token_counts(sections, self.count_tokens)
+        token_counts["system"] = count_cached(self.count_tokens, system_message["content"])
+
+        # Collect new battle log events since the last turn
+        if battle_tag not in self.battle_logs:
+            self.battle_logs[battle_tag] = BattleLogAccumulator(self.log_length, self.count_tokens)
+        battle_log = self.battle_logs[battle_tag].update(battle)
+        if self.token_budget is not None:
+            # Fill the battle log newest-first with whatever the other sections leave
+            log_title = count_cached(self.count_tokens, SECTION_TITLES["battle_log"])
+            remaining = self.token_budget - sum(token_counts.values()) - log_title
+            recent_messages = battle_log.recent_within(max(remaining, 0))
+        else:
+            recent_messages = battle_log.recent()
+
+        # Battle log (plain text - already optimal)
+        sections["battle_log"] = "\n".join(f"  {msg}" for msg in recent_messages)
+        token_counts["battle_log"] = (count_cached(self.count_tokens, SECTION_TITLES["battle_log"])
+                                      + battle_log.recent_tokens(len(recent_messages)))
+        token_counts["total"] = sum(token_counts.values())
+        token_counts["battle_log_events"] = len(recent_messages)
+        self.battle_token_counts[battle_tag] = token_counts
+
+        final_prompt = assemble_prompt(sections, self.prompt_layout)
 
         return [
-            {
-                "role": "system",
-                "content": system_prompt["agent"]["system_prompt"]
-            },
+            system_message,
             {
                 "role": "user",
                 "content": final_prompt
@@ -110,26 +201,180 @@ class AIPlayer(Player):
 
 
     async def choose_move(self, battle: Battle):
+        with tracer.battle("choose_move", battle.battle_tag, battle.turn, self.model, self.username):
+            return await self._choose_move(battle)
+
+    async def _choose_move(self, battle: Battle):
+        # Let the previous turn's streamed decision finish so its scratchpad is in this prompt
+        if battle.battle_tag in self.battle_pending_streams:
+            with tracer.span("wait_previous_stream"):
+                await self.battle_pending_streams.pop(battle.battle_tag)
+
         # Check if turn limit exceeded
         if battle.turn > self.max_turns:
-            if self.verbosity:
-                print(Fore.YELLOW + f"Turn limit ({self.max_turns}) exceeded. Forfeiting battle.")
-            try:
-                await self.ps_client.send_message(message="/forfeit", room=battle.battle_tag)
-            except Exception:
-                pass
+            with tracer.span("forfeit"):
+                if self.verbosity:
+                    print(Fore.YELLOW + f"Turn limit ({self.max_turns}) exceeded. Forfeiting battle.")
+                try:
+                    await self.ps_client.send_message(message="/forfeit", room=battle.battle_tag)
+                except Exception:
+                    pass
             # Return a random move as fallback (forfeit command should end the battle)
+            self.metrics.random_fallback(self.model)
             return self.choose_random_move(battle)
 
-        battle_message = self.write_prompt(battle=battle)
-        ai_decision = await self.ask_ai_model(battle_message)
+        with tracer.span("encode_state", profile=True):
+            state = self.encode_battle_state(battle)
+        with tracer.span("write_prompt", profile=True):
+            battle_message = self.write_prompt(battle=battle, state=state)
+            prefix_stability = self.prefix_tracker.record(battle.battle_tag, battle_message)
+        token_counts = self.battle_token_counts.get(battle.battle_tag)
+        latency = {}
+
+        # Reuse an earlier decision for an identical state if the cache allows it
+        cache_key = None
+        ai_decision = None
+        if self.decision_cache is not None:
+            with tracer.span("decision_cache", profile=True):
+                cache_key = self.decision_cache.make_key(self.model, self.prompt_variant, state)
+                ai_decision = self.decision_cache.get(cache_key, temperature=self.temperature)
+
+        if ai_decision is None and self.stream:
+            return await self._choose_move_streaming(battle, battle_message, latency, cache_key, prefix_stability,
+                                                    token_counts)
+
+        interaction = self._record_interaction(battle, battle_message, latency, prefix_stability, token_counts)
+        if ai_decision is not None:
+            interaction["cached"] = True
+        else:
+            with self.metrics.request(self.model), tracer.span("ask_ai_model"):
+                ai_decision = await self.ask_ai_model(battle_message, timing=latency)
+        with tracer.span("apply_decision", profile=True):
+            self._apply_decision(battle, interaction, ai_decision)
 
+        # Send reasoning as a message to the battle room
+        with tracer.span("send_reasoning"):
+            await self._send_reasoning(battle, interaction["response"])
+
+        # Execute the decision
+        with tracer.span("create_order", profile=True):
+            order = self._order_for_action(battle, interaction["response"].get("action"))
+        if order is not None:
+            interaction["is_valid_response"] = True
+            if cache_key is not None and not interaction.get("cached"):
+                self.decision_cache.put(cache_key, interaction["response"])
+            return order
+
+        # Fallback to random if AI decision fails
+        self.metrics.invalid_action(self.model)
+        self.metrics.random_fallback(self.model)
+        if self.verbosity:
+            print(Fore.RED +"Error in decision response. Defaulting to a random choice")
+        return self.choose_random_move(battle)
+
+    async def _choose_move_streaming(self, battle: Battle, battle_message, latency, cache_key=None,
+                                     prefix_stability=None, token_counts=None):
+        """
+        Commit the order as soon as the streamed action field is complete.
+        The rest of the stream (reasoning, scratchpad) is consumed in the background.
+        """
+        interaction = self._record_interaction(battle, battle_message, latency, prefix_stability, token_counts)
+        action_ready = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(self._consume_decision_stream(battle, battle_message, interaction, action_ready))
+        self.battle_pending_streams[battle.battle_tag] = task
+
+        with tracer.span("wait_streamed_action"):
+            action = await action_ready
+        with tracer.span("create_order", profile=True):
+            order = self._order_for_action(battle, action)
+        if order is not None:
+            # Unless the full decision already turned out not to match the committed action
+            interaction["is_valid_response"] = not interaction.get("decision_mismatch")
+            if cache_key is not None:
+                # Done callbacks run after this coroutine resumes, so validity is already known
+                task.add_done_callback(lambda _: self._cache_streamed_decision(cache_key, interaction))
+            return order
+
+        self.metrics.invalid_action(self.model)
+        self.metrics.random_fallback(self.model)
+        if self.verbosity:
+            print(Fore.RED +"Error in decision response. Defaulting to a random choice")
+        return self.choose_random_move(battle)
+
+    async def _consume_decision_stream(self, battle: Battle, battle_message, interaction, action_ready):
+        parser = ActionStreamParser()
+        start = time.perf_counter()
+        try:
+            with self.metrics.request(self.model), tracer.span("stream_ai_model", track="stream"):
+                async for chunk in self.stream_ai_model(battle_message, timing=interaction["latency"]):
+                    if parser.feed(chunk) is not None and not action_ready.done():
+                        interaction["latency"]["action"] = time.perf_counter() - start
+                        interaction["committed_action"] = parser.action
+                        action_ready.set_result(parser.action)
+            with tracer.span("parse_json", profile=True, track="stream"):
+                ai_decision = self._parse_decision(parser.text)
+        except Exception as e:
+            # Already counted as a request error by metrics.request
+            if self.verbosity:
+                print(Fore.RED + f"Error calling AI model: {str(e)}")
+            ai_decision = {"reasoning": f"API error: {str(e)}", "action": None}
+        finally:
+            # Stream ended without a usable action field
+            if not action_ready.done():
+                action_ready.set_result(None)
+
+        if "committed_action" in interaction and ai_decision.get("action") != interaction["committed_action"]:
+            # The action was played, but the full reply failed to parse (or disagrees): not a valid response
+            interaction["decision_mismatch"] = True
+            interaction["is_valid_response"] = False
+
+        with tracer.span("apply_decision", profile=True, track="stream"):
+            self._apply_decision(battle, interaction, ai_decision)
+        with tracer.span("send_reasoning", track="stream"):
+            await self._send_reasoning(battle, interaction["response"])
+
+    def _cache_streamed_decision(self, cache_key, interaction):
+        decision = interaction["response"]
+        # Only cache if the full decision agrees with the action that was committed early
+        if decision and decision.get("action") == interaction.get("committed_action"):
+            self.decision_cache.put(cache_key, decision)
+
+    def _record_interaction(self, battle: Battle, battle_message, latency, prefix_stability=None, token_counts=None):
+        """Create the interaction entry that is logged when the battle finishes."""
+        interaction = {
+            "messages": battle_message,
+            "response": None,
+            "is_valid_response": False,
+            "latency": latency,
+            "prefix_stability": prefix_stability,
+            "token_counts": token_counts,
+            "turn": battle.turn,
+            "timestamp": time.time()
+        }
+        interactions = self.battle_interactions.get(battle.battle_tag)
+        if interactions is None:
+            interactions = self.battle_interactions[battle.battle_tag] = []
+            self.metrics.battle_started(self.model)
+        self.metrics.turn(self.model)
+        if self.spool is not None:
+            # Earlier interactions are complete by now (a pending stream is awaited before the next turn)
+            header = {"model": self.model, "battle_tag": battle.battle_tag, "opponent": battle.opponent_username}
+            for previous in interactions:
+                self.spool.append(battle.battle_tag, previous, header)
+            interactions.clear()
+        interactions.append(interaction)
+        return interaction
+
+    def _apply_decision(self, battle: Battle, interaction, ai_decision):
+        """Store the model's decision on the interaction and carry its scratchpad forward."""
         # Ensure ai_decision is a dict
         if not isinstance(ai_decision, dict):
             if self.verbosity:
                 print(Fore.RED + f"AI returned invalid type: {type(ai_decision)}. Value: {ai_decision}")
             ai_decision = {"reasoning": "Invalid response type", "action": None}
 
+        interaction["response"] = ai_decision
+
         # Append scratchpad if provided
         if ai_decision.get("scratchpad"):
             # Convert scratchpad to string if it's a dict
@@ -144,19 +389,6 @@ class AIPlayer(Player):
             else:
                 self.battle_scratchpads[battle.battle_tag] = scratchpad_str
 
-        # Store interaction to log when battle finishes
-        if battle.battle_tag not in self.battle_interactions:
-            self.battle_interactions[battle.battle_tag] = []
-
-        # Create interaction entry
-        interaction = {
-            "messages": battle_message,
-            "response": ai_decision,
-            "is_valid_response": False
-        }
-
-        self.battle_interactions[battle.battle_tag].append(interaction)
-
         # TODO Replace for proper logging
         if self.verbosity:
             # print("-"*30)
@@ -167,8 +399,7 @@ class AIPlayer(Player):
             print(f"Decision: {ai_decision.get("reasoning")}")
             print(f"Action: {ai_decision.get("action")}")
 
-
-        # Send reasoning as a message to the battle room
+    async def _send_reasoning(self, battle: Battle, ai_decision):
         if ai_decision.get("reasoning"):
             try:
                 await self.ps_client.send_message(message=ai_decision["reasoning"], room=battle.battle_tag)
@@ -176,62 +407,79 @@ class AIPlayer(Player):
                 # Silently ignore chat errors (e.g., unregistered accounts)
                 pass
 
-        # Execute the decision
-        if ai_decision.get("action"):
-            action_name = ai_decision["action"].lower()
+    def _order_for_action(self, battle: Battle, action):
+        """Return the order matching an action name, or None if it isn't available."""
+        if not action or not isinstance(action, str):
+            return None
+        action_name = action.lower()
 
-            # First try to find it as a move
-            for move in battle.available_moves:
-                if move.id == action_name:
-                    interaction["is_valid_response"] = True
-                    return self.create_order(move)
+        # First try to find it as a move
+        for move in battle.available_moves:
+            if move.id == action_name:
+                return self.create_order(move)
 
-            # If not a move, try to find it as a pokemon to switch to
-            for pokemon in battle.available_switches:
-                if pokemon.species == action_name:
-                    interaction["is_valid_response"] = True
-                    return self.create_order(pokemon)
+        # If not a move, try to find it as a pokemon to switch to
+        for pokemon in battle.available_switches:
+            if pokemon.species == action_name:
+                return self.create_order(pokemon)
 
-        # Fallback to random if AI decision fails
-        if self.verbosity:
-            print(Fore.RED +"Error in decision response. Defaulting to a random choice")
-        return self.choose_random_move(battle)
+        return None
 
-    async def ask_ai_model(self, battle_message):
+    def _parse_decision(self, response):
+        """Parse a model's JSON reply into a decision dict."""
+        try:
+            decision = json.loads(response)
+        except json.JSONDecodeError as e:
+            if self.verbosity:
+                print(Fore.RED + f"Failed to parse AI response as JSON: {str(e)}")
+                print(Fore.RED + f"Response was: {response[:200]}")
+            return {"reasoning": "Failed to parse response", "action": None}
+        # Ensure decision is a dict
+        if not isinstance(decision, dict):
+            if self.verbosity:
+                print(Fore.RED + f"AI response parsed but not a dict: {type(decision)} = {decision}")
+            return {"reasoning": "Response not a dict", "action": None}
+        return decision
+
+    def stream_ai_model(self, battle_message, timing=None):
+        """Stream the AI model's decision as content chunks (local or router based on provider)."""
+        if self._provider == 'local':
+            return local_stream_action(battle_message, self.model, host=self.ollama_host,
+                                       keep_alive=self.keep_alive, temperature=self.temperature,
+                                       timing=timing)
+        elif self._provider == 'router':
+            return router_stream_action(battle_message, self.model, client=self.router_client,
+                                        temperature=self.temperature, timing=timing)
+        else:
+            raise ValueError(f"Unknown provider: {self._provider}")
+
+    async def ask_ai_model(self, battle_message, timing=None):
         """
-        Call AI model to get battle decision (local or router based on provider)
+        Call AI model to get battle decision (local or router based on provider).
+        If timing is a dict, it is filled with the provider's request latency breakdown.
         """
         try:
             if self._provider == 'local':
                 # Call Ollama
-                response = await local_choose_action(battle_message, self.model)
-                try:
-                    decision = json.loads(response)
-                    return decision
-                except json.JSONDecodeError:
-                    return {"reasoning": "Failed to parse response", "action": None}
+                with tracer.span("provider_request"):
+                    response = await local_choose_action(battle_message, self.model, host=self.ollama_host,
+                                                        keep_alive=self.keep_alive, temperature=self.temperature,
+                                                        timing=timing)
 
             elif self._provider == 'router':
                 # Call OpenRouter
-                response = await router_choose_action(battle_message, self.model)
-                try:
-                    decision = json.loads(response)
-                    # Ensure decision is a dict
-                    if not isinstance(decision, dict):
-                        if self.verbosity:
-                            print(Fore.RED + f"AI response parsed but not a dict: {type(decision)} = {decision}")
-                        return {"reasoning": "Response not a dict", "action": None}
-                    return decision
-                except json.JSONDecodeError as e:
-                    if self.verbosity:
-                        print(Fore.RED + f"Failed to parse AI response as JSON: {str(e)}")
-                        print(Fore.RED + f"Response was: {response[:200]}")
-                    return {"reasoning": "Failed to parse response", "action": None}
+                with tracer.span("provider_request"):
+                    response = await router_choose_action(battle_message, self.model, client=self.router_client,
+                                                         temperature=self.temperature, timing=timing)
 
             else:
                 raise ValueError(f"Unknown provider: {self._provider}")
 
+            with tracer.span("parse_json", profile=True):
+                return self._parse_decision(response)
+
         except Exception as e:
+            self.metrics.request_error(self.model)
             if self.verbosity:
                 print(Fore.RED + f"Error calling AI model: {str(e)}")
             return {"reasoning": f"API error: {str(e)}", "action": None}
@@ -240,22 +488,53 @@ class AIPlayer(Player):
         """
         Called when a battle finishes. Logs all interactions with the outcome.
         """
-        if battle.battle_tag in self.battle_interactions:
-            outcome = "win" if battle.won else "loss"
-
-            for interaction in self.battle_interactions[battle.battle_tag]:
-                log_battle_interaction(
-                    model_name=self.model,
-                    messages=interaction["messages"],
-                    response=interaction["response"],
-                    outcome=outcome,
-                    is_valid_response=interaction["is_valid_response"]
-                )
-
-            # Clean up stored interactions for this battle
-            del self.battle_interactions[battle.battle_tag]
+        pending = self.battle_pending_streams.pop(battle.battle_tag, None)
+        if pending is not None and not pending.done():
+            # Log once the last streamed decision has been fully received
+            pending.add_done_callback(lambda _: self._log_finished_battle(battle))
+            return
+        self._log_finished_battle(battle)
+
+    def _log_finished_battle(self, battle: Battle):
+        outcome = "win" if battle.won else "loss"
+        interactions = self.battle_interactions.pop(battle.battle_tag, None)
+        if interactions is not None:
+            # Ties are logged with the losses, but counted separately
+            self.metrics.battle_finished(self.model, outcome if battle.won or battle.lost else "tie")
+        else:
+            interactions = []
+        if self.spool is not None:
+            # Spooled turns first, then the ones still in memory, replayed on the log writer's thread
+            model, battle_tag, opponent = self.model, battle.battle_tag, battle.opponent_username
+            self.spool.finish(battle_tag, lambda interaction, writer: log_interaction(
+                model, interaction, outcome, battle_tag, opponent, writer=writer), interactions)
+        else:
+            for interaction in interactions:
+                log_interaction(self.model, interaction, outcome, battle.battle_tag, battle.opponent_username,
+                                writer=self.log_writer)
 
         # Clean up scratchpad for this battle
         if battle.battle_tag in self.battle_scratchpads:
             del self.battle_scratchpads[battle.battle_tag]
 
+        # Clean up incremental battle log for this battle
+        if battle.battle_tag in self.battle_logs:
+            del self.battle_logs[battle.battle_tag]
+        self.prefix_tracker.release(battle.battle_tag)
+        self.battle_token_counts.pop(battle.battle_tag, None)
+        self.battle_team_fragments.pop(battle.battle_tag, None)
+        tracer.finish_battle(battle.battle_tag, self.username)
+
+
+async def close_provider_clients():
+    """
+    Shutdown hook: close the shared OpenRouter and Ollama clients.
+    They live on poke-env's event loop, so they are closed there.
+    """
+    await handle_threaded_coroutines(close_default_client(), POKE_LOOP)
+    await handle_threaded_coroutines(close_clients(), POKE_LOOP)
+
+
+def close_log_writer():
+    """Shutdown hook: write out every queued interaction log entry and close the log files."""
+    close_default_writer()
@@ -0,0 +1,91 @@
+from collections import deque
+from itertools import islice
+from poke_env.battle import Battle
+
+
+def format_event(event):
+    """Format a split Showdown message as a single log line, or None if it should be skipped."""
+    if "html" in event:
+        return None
+    return "|".join(event)
+
+
+class BattleLogAccumulator:
+    """
+    Incremental battle log for a single battle.
+
+    Keeps a cursor into battle.observations (turn number + event index) and a
+    bounded ring buffer of already-formatted lines, so each update only touches
+    events that arrived since the previous call. If count_tokens is given, each
+    line's token count is computed once, when the line is added.
+    """
+
+    def __init__(self, max_length: int, count_tokens=None):
+        self.lines = deque(maxlen=max_length)
+        self.count_tokens = count_tokens
+        self.token_counts = deque(maxlen=max_length)
+        self._turn = None
+        self._event_index = 0
+        self._turns_seen = 0
+
+    def _consume(self, events, start=0):
+        for event in events[start:]:
+            line = format_event(event)
+            if line is not None:
+                self.lines.append(line)
+                if self.count_tokens is not None:
+                    self.token_counts.append(self.count_tokens(f"  {line}"))
+        return len(events)
+
+    def update(self, battle: Battle):
+        """Consume any events added to battle.observations since the last update."""
+        observations = battle.observations
+        if not observations:
+            return self
+
+        if self._turn is None:
+            turn = min(observations)
+        else:
+            # The last turn we read may still have received events since then
+            self._event_index = self._consume(observations[self._turn].events, self._event_index)
+            turn = self._turn + 1
+
+        # Turns are recorded consecutively, so probe forward from the cursor
+        while turn in observations:
+            self._event_index = self._consume(observations[turn].events)
+            self._turn = turn
+            self._turns_seen += 1
+            turn += 1
+
+        # Fallback for non-consecutive turn keys
+        if self._turns_seen < len(observations):
+            for turn in sorted(t for t in observations if self._turn is None or t > self._turn):
+                self._event_index = self._consume(observations[turn].events)
+                self._turn = turn
+                self._turns_seen += 1
+
+        return self
+
+    def recent(self):
+        """Return the most recent formatted events, oldest first."""
+        return list(self.lines)
+
+    def recent_within(self, budget: int):
+        """
+        Return the most recent formatted events whose token counts fit in budget, oldest first.
+        Events are taken newest-first; requires count_tokens.
+        """
+        taken = 0
+        spent = 0
+        for tokens in reversed(self.token_counts):
+            if spent + tokens > budget:
+                break
+            spent += tokens
+            taken += 1
+        if taken == 0:
+            return []
+        return list(self.lines)[-taken:]
+
+    def recent_tokens(self, count: int) -> int:
+        """Total token count of the count most recent events; requires count_tokens."""
+        return sum(islice(reversed(self.token_counts), count))
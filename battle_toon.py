@@ -0,0 +1,485 @@
+"""
+Single-pass TOON serializers for the prompt's battle state sections.
+
+The create_* functions in utils build nested dicts, prune them with remove_empty_values
+and only then hand them to the TOON encoder. The functions here walk the Battle once and
+emit the same text directly (byte-identical, with indent 1 and comma delimiter), applying
+the same pruning rules inline. Per Pokemon only a flat tuple of (key, value) fields is
+kept, which is what TOON needs to choose between its tabular and list forms.
+"""
+
+import math
+from functools import lru_cache
+from poke_env.battle import Battle
+from toon.primitives import encode_key, encode_string_literal, format_number
+from utils import (create_observation_dictionary, create_team_array, create_team_sets, create_team_status,
+                   encode_to_toon)
+
+
+DELIMITER = ","
+
+
+class _NeedsGenericEncoder(Exception):
+    """Raised for shapes the fast path doesn't emit (nested tabular arrays); the caller falls back."""
+
+
+# Keys, species, moves and condition names repeat every turn, so their quoting is memoized
+_key = lru_cache(maxsize=1024)(encode_key)
+_string = lru_cache(maxsize=4096)(lambda value: encode_string_literal(value, DELIMITER))
+
+
+def _prim(value):
+    """encode_primitive, with the repeated string and int cases short-circuited."""
+    value_type = type(value)
+    if value_type is str:
+        return _string(value)
+    if value_type is int:
+        return str(value)
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return "null"
+    if isinstance(value, (int, float)):
+        return format_number(value)
+    return _string(value)
+
+
+def _is_empty(value):
+    """Values remove_empty_values drops from a dict."""
+    return value is None or value == "" or value == []
+
+
+def _is_zero_map(mapping):
+    return not mapping or all(v == 0 or v is None for v in mapping.values())
+
+
+def _clean_map(mapping):
+    """Prune a dict of primitives the way remove_empty_values does when it's a dict value (None if dropped)."""
+    if _is_zero_map(mapping):
+        return None
+    cleaned = {k: v for k, v in mapping.items() if not _is_empty(v)}
+    return cleaned or None
+
+
+def _clean_list(items):
+    """Prune a list of primitives (None if dropped)."""
+    cleaned = [item for item in items if not _is_empty(item)]
+    return cleaned or None
+
+
+def _emit_field(lines, depth, key, value):
+    """Emit an already-pruned field: primitive, dict of primitives, list of primitives or list of objects."""
+    encoded_key = _key(key)
+    if isinstance(value, dict):
+        lines.append((depth, f"{encoded_key}:"))
+        for entry_key, entry_value in value.items():
+            lines.append((depth + 1, f"{_key(str(entry_key))}: {_prim(entry_value)}"))
+    elif isinstance(value, list):
+        if isinstance(value[0], tuple):
+            _emit_object_array(lines, depth, key, value)
+        else:
+            lines.append((depth, f"{encoded_key}[{len(value)}]: {DELIMITER.join(_prim(item) for item in value)}"))
+    else:
+        lines.append((depth, f"{encoded_key}: {_prim(value)}"))
+
+
+def _kind(value):
+    if isinstance(value, dict):
+        return "dict"
+    if isinstance(value, list):
+        return "list"
+    return "primitive"
+
+
+def _shape(obj):
+    """The (name, kind) pairs of an object, which is all TOON looks at to pick an array form."""
+    return tuple((name, _kind(value)) for name, value in obj)
+
+
+def _tabular_names(shapes):
+    """Header field names if objects with these shapes qualify for TOON's tabular form, else None."""
+    first = shapes[0]
+    if not first:
+        return None
+    names = tuple(name for name, _ in first)
+    if all(shape == first for shape in shapes):
+        columns = [[kind] for _, kind in first]
+    else:
+        name_set = set(names)
+        kinds = [dict(shape) for shape in shapes]
+        if any(len(row) != len(name_set) or row.keys() != name_set for row in kinds):
+            return None
+        columns = [[row[name] for row in kinds] for name in names]
+    for column in columns:
+        if all(kind == "primitive" for kind in column):
+            continue
+        if all(kind == "dict" for kind in column):
+            # Uniform nested objects would use a nested tabular header
+            raise _NeedsGenericEncoder()
+        return None
+    return names
+
+
+def _tabular_header(key, length, names):
+    return f"{_key(key)}[{length}]{{{DELIMITER.join(_key(name) for name in names)}}}:"
+
+
+def _tabular_row(obj, names):
+    values = dict(obj)
+    return DELIMITER.join(_prim(values[name]) for name in names)
+
+
+def _emit_list_item(lines, depth, obj):
+    if not obj:
+        lines.append((depth, "-"))
+        return
+    # The first field is encoded one level deeper and carried on the hyphen line
+    first_line = len(lines)
+    for name, value in obj:
+        _emit_field(lines, depth + 1, name, value)
+    _, content = lines[first_line]
+    lines[first_line] = (depth, f"- {content}")
+
+
+def _emit_object_array(lines, depth, key, objects):
+    names = _tabular_names([_shape(obj) for obj in objects])
+    if names is not None:
+        lines.append((depth, _tabular_header(key, len(objects), names)))
+        for obj in objects:
+            lines.append((depth + 1, _tabular_row(obj, names)))
+        return
+
+    lines.append((depth, f"{_key(key)}[{len(objects)}]:"))
+    for obj in objects:
+        _emit_list_item(lines, depth + 1, obj)
+
+
+def _render(lines):
+    return "\n".join(f"{' ' * depth}{content}" for depth, content in lines)
+
+
+def _pokemon_observation(lines, key, pokemon, with_moves):
+    """Active or opponent active Pokemon, as in create_observation_dictionary."""
+    fields = [
+        ("species", str(pokemon.species)),
+        ("level", pokemon.level),
+        ("ability", str(pokemon.ability)),
+        ("item", str(pokemon.item)),
+        ("current_hp_fraction", "{:.2%}".format(pokemon.current_hp_fraction)),
+        ("status", str(pokemon.status) if pokemon.status else None),
+        ("boosts", _clean_map({k: v for k, v in pokemon.boosts.items() if v != 0})),
+    ]
+    if with_moves:
+        fields.append(("moves", _clean_list(list(pokemon.moves.keys()))))
+    fields.append(("effects", _clean_list([str(effect) for effect in pokemon.effects])))
+    if pokemon.stats:
+        stats = {k: v for k, v in pokemon.stats.items() if v is not None}
+        if stats:
+            fields.append(("stats", _clean_map(stats)))
+
+    lines.append((0, f"{key}:"))
+    for name, value in fields:
+        if not _is_empty(value):
+            _emit_field(lines, 1, name, value)
+
+
+def _status_map(team):
+    statuses = {}
+    for pokemon in team.values():
+        if pokemon.status:
+            statuses[pokemon.species] = str(pokemon.status)
+    return _clean_map(statuses)
+
+
+def _fast_observations(battle: Battle):
+    lines = []
+    if battle.weather:
+        weather = str(battle.weather)
+        if weather:
+            lines.append((0, f"weather: {_prim(weather)}"))
+    fields = _clean_list([str(field) for field in battle.fields])
+    if fields:
+        _emit_field(lines, 0, "fields", fields)
+    for key, conditions in (("side_conditions", battle.side_conditions),
+                            ("opponent_side_conditions", battle.opponent_side_conditions)):
+        cleaned = _clean_map({str(condition): value for condition, value in conditions.items()})
+        if cleaned:
+            _emit_field(lines, 0, key, cleaned)
+    if not _is_empty(battle.turn):
+        lines.append((0, f"turn: {_prim(battle.turn)}"))
+
+    if battle.active_pokemon:
+        _pokemon_observation(lines, "active_pokemon", battle.active_pokemon, with_moves=False)
+    team_status = _status_map(battle.team)
+    if team_status:
+        _emit_field(lines, 0, "team", team_status)
+
+    if battle.opponent_active_pokemon:
+        _pokemon_observation(lines, "opponent_active_pokemon", battle.opponent_active_pokemon, with_moves=True)
+    opponent_team_status = _status_map(battle.opponent_team)
+    if opponent_team_status:
+        _emit_field(lines, 0, "opponent_team", opponent_team_status)
+
+    return _render(lines)
+
+
+def _flat_stats(pokemon):
+    if not pokemon.stats:
+        return []
+    return [(name, value) for name, value in pokemon.stats.items() if value is not None]
+
+
+def _pruned(fields):
+    return tuple((name, value) for name, value in fields if not _is_empty(value))
+
+
+def _team_member(battle: Battle, pokemon):
+    """One create_team_array entry."""
+    fields = [
+        ("species", pokemon.species),
+        ("level", pokemon.level),
+        ("ability", str(pokemon.ability)),
+        ("item", str(pokemon.item)),
+        ("current_hp", pokemon.current_hp),
+        ("max_hp", pokemon.max_hp),
+        ("current_hp_fraction", "{:.2%}".format(pokemon.current_hp_fraction)),
+        ("is_active", pokemon == battle.active_pokemon),
+        ("fainted", pokemon.fainted),
+    ]
+    if pokemon.status:
+        fields.append(("status", str(pokemon.status)))
+    fields.extend(_flat_stats(pokemon))
+    fields.append(("types", _clean_list([str(type_) for type_ in pokemon.types])))
+    non_zero_boosts = {k: v for k, v in pokemon.boosts.items() if v != 0}
+    if non_zero_boosts:
+        fields.append(("boosts", _clean_map(non_zero_boosts)))
+    moves = [
+        (("id", move_id), ("pp", move.current_pp), ("max_pp", move.max_pp))
+        if move.current_pp < move.max_pp else (("id", move_id),)
+        for move_id, move in pokemon.moves.items()
+    ]
+    if moves:
+        fields.append(("moves", [_pruned(move) for move in moves]))
+    if pokemon.effects:
+        fields.append(("effects", _clean_list([str(effect) for effect in pokemon.effects])))
+    return _merge_keys(fields)
+
+
+def _team_set(pokemon):
+    """One create_team_sets entry."""
+    fields = [
+        ("species", pokemon.species),
+        ("level", pokemon.level),
+        ("ability", str(pokemon.ability)),
+        ("item", str(pokemon.item)),
+        ("max_hp", pokemon.max_hp),
+    ]
+    fields.extend(_flat_stats(pokemon))
+    fields.append(("types", _clean_list([str(type_) for type_ in pokemon.types])))
+    fields.append(("moves", _clean_list(list(pokemon.moves.keys()))))
+    return _merge_keys(fields)
+
+
+def _team_status_entry(battle: Battle, pokemon):
+    """One create_team_status entry."""
+    fields = [
+        ("species", pokemon.species),
+        ("current_hp", pokemon.current_hp),
+        ("current_hp_fraction", "{:.2%}".format(pokemon.current_hp_fraction)),
+        ("is_active", pokemon == battle.active_pokemon),
+        ("fainted", pokemon.fainted),
+    ]
+    if pokemon.status:
+        fields.append(("status", str(pokemon.status)))
+    non_zero_boosts = {k: v for k, v in pokemon.boosts.items() if v != 0}
+    if non_zero_boosts:
+        fields.append(("boosts", _clean_map(non_zero_boosts)))
+    spent_pp = [_pruned((("id", move_id), ("pp", move.current_pp), ("max_pp", move.max_pp)))
+                for move_id, move in pokemon.moves.items() if move.current_pp < move.max_pp]
+    if spent_pp:
+        fields.append(("pp", spent_pp))
+    if pokemon.effects:
+        fields.append(("effects", _clean_list([str(effect) for effect in pokemon.effects])))
+    return _merge_keys(fields)
+
+
+def _merge_keys(fields):
+    """
+    Mirror dict assignment semantics (a repeated key keeps its first position and last value),
+    then prune empty values.
+    """
+    names = [name for name, _ in fields]
+    if len(set(names)) != len(names):
+        fields = list(dict(fields).items())
+    return _pruned(fields)
+
+
+class _Fragment:
+    """One player_team entry: its fields, with the list item and tabular row text rendered on first use."""
+
+    __slots__ = ("fields", "shape", "names", "_item", "_row")
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.shape = _shape(fields)
+        self.names = tuple(name for name, _ in fields)
+        self._item = None
+        self._row = None
+
+    def item(self):
+        if self._item is None:
+            lines = []
+            _emit_list_item(lines, 1, self.fields)
+            self._item = _render(lines)
+        return self._item
+
+    def row(self, names):
+        if names != self.names:
+            return f" {_tabular_row(self.fields, names)}"
+        if self._row is None:
+            self._row = f" {_tabular_row(self.fields, names)}"
+        return self._row
+
+
+def _assemble_team(fragments):
+    """TOON text of {"player_team": [...]} from its entries' fragments."""
+    if not fragments:
+        return ""
+    names = _tabular_names([fragment.shape for fragment in fragments])
+    if names is not None:
+        parts = [_tabular_header("player_team", len(fragments), names)]
+        parts.extend(fragment.row(names) for fragment in fragments)
+    else:
+        parts = [f"player_team[{len(fragments)}]:"]
+        parts.extend(fragment.item() for fragment in fragments)
+    return "\n".join(parts)
+
+
+def _fast_team(members):
+    return _assemble_team([_Fragment(member) for member in members])
+
+
+def encode_observations(battle: Battle) -> str:
+    """TOON text of create_observation_dictionary(battle)."""
+    try:
+        return _fast_observations(battle)
+    except _NeedsGenericEncoder:
+        return encode_to_toon(create_observation_dictionary(battle))
+
+
+def encode_team(battle: Battle) -> str:
+    """TOON text of create_team_array(battle)."""
+    try:
+        return _fast_team(_team_member(battle, pokemon) for pokemon in battle.team.values())
+    except _NeedsGenericEncoder:
+        return encode_to_toon(create_team_array(battle))
+
+
+def encode_team_sets(battle: Battle) -> str:
+    """TOON text of create_team_sets(battle)."""
+    try:
+        return _fast_team(_team_set(pokemon) for pokemon in battle.team.values())
+    except _NeedsGenericEncoder:
+        return encode_to_toon(create_team_sets(battle))
+
+
+def encode_team_status(battle: Battle) -> str:
+    """TOON text of create_team_status(battle)."""
+    try:
+        return _fast_team(_team_status_entry(battle, pokemon) for pokemon in battle.team.values())
+    except _NeedsGenericEncoder:
+        return encode_to_toon(create_team_status(battle))
+
+
+def encode_actions(battle: Battle) -> str:
+    """TOON text of create_action_context(battle)."""
+    lines = []
+    moves = _clean_list([move.id for move in battle.available_moves])
+    if moves:
+        _emit_field(lines, 0, "moves", moves)
+    switches = _clean_list([pokemon.species for pokemon in battle.available_switches])
+    if switches:
+        _emit_field(lines, 0, "switches", switches)
+    return _render(lines)
+
+
+def _sets_fingerprint(pokemon):
+    """Everything create_team_sets reads from a Pokemon; changes only when something is revealed."""
+    return (pokemon.species, pokemon.level, pokemon.ability, pokemon.item, pokemon.max_hp,
+            tuple(pokemon.stats.items()) if pokemon.stats else None, tuple(pokemon.types), tuple(pokemon.moves))
+
+
+def _status_fingerprint(pokemon, is_active):
+    """Everything create_team_status reads from a Pokemon: HP, status, PP per move, boosts, effects, active flag."""
+    return (pokemon.species, pokemon.current_hp, pokemon.max_hp, is_active, pokemon.fainted, pokemon.status,
+            tuple(pokemon.boosts.values()), tuple((move_id, move.current_pp) for move_id, move in pokemon.moves.items()),
+            tuple(pokemon.effects))
+
+
+class TeamFragmentCache:
+    """
+    Per-battle cache of each team member's encoded fragment.
+
+    Benched Pokemon usually look the same turn after turn, so each member's fields and
+    rendered text are kept alongside a cheap fingerprint of what the encoder reads from it.
+    Only members whose fingerprint changed are rebuilt; the array is then reassembled from
+    the fragments. Create one per battle and drop it when the battle finishes.
+    """
+
+    def __init__(self):
+        self._fragments = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _encode(self, battle, section, fingerprint, build):
+        active = battle.active_pokemon
+        fragments = []
+        for identifier, pokemon in battle.team.items():
+            is_active = pokemon == active
+            key = fingerprint(pokemon, is_active)
+            cached = self._fragments.get((section, identifier))
+            if cached is not None and cached[0] == key:
+                self.hits += 1
+                fragments.append(cached[1])
+                continue
+            self.misses += 1
+            fragment = _Fragment(build(battle, pokemon))
+            self._fragments[(section, identifier)] = (key, fragment)
+            fragments.append(fragment)
+        return _assemble_team(fragments)
+
+    def encode_team(self, battle: Battle) -> str:
+        """Cached encode_team(battle)."""
+        try:
+            return self._encode(battle, "team",
+                                lambda pokemon, is_active: (_sets_fingerprint(pokemon),
+                                                            _status_fingerprint(pokemon, is_active)),
+                                _team_member)
+        except _NeedsGenericEncoder:
+            return encode_to_toon(create_team_array(battle))
+
+    def encode_team_sets(self, battle: Battle) -> str:
+        """Cached encode_team_sets(battle)."""
+        try:
+            return self._encode(battle, "team_sets", lambda pokemon, is_active: _sets_fingerprint(pokemon),
+                                lambda battle, pokemon: _team_set(pokemon))
+        except _NeedsGenericEncoder:
+            return encode_to_toon(create_team_sets(battle))
+
+    def encode_team_status(self, battle: Battle) -> str:
+        """Cached encode_team_status(battle)."""
+        try:
+            return self._encode(battle, "team_status", _status_fingerprint, _team_status_entry)
+        except _NeedsGenericEncoder:
+            return encode_to_toon(create_team_status(battle))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "fragments": len(self._fragments),
+        }
@@ -0,0 +1,73 @@
+import random
+import time
+from types import SimpleNamespace
+from poke_env.battle.observation import Observation
+from battle_log import BattleLogAccumulator
+
+# Benchmark configuration variables
+N_TURNS = 300
+EVENTS_PER_TURN = 40
+LOG_LENGTHS = [10, 25, 100]
+SEED = 0
+
+
+def full_rescan(battle, log_length):
+    """Previous write_prompt behaviour: re-format every event each turn, then slice."""
+    battle_log = []
+    for turn_num in sorted(battle.observations.keys()):
+        for event in battle.observations[turn_num].events:
+            if "html" not in event:
+                battle_log.append("|".join(event))
+    return battle_log[-log_length:] if len(battle_log) > log_length else battle_log
+
+
+def make_turn_events(turn, rng):
+    """Build a plausible set of split Showdown messages for a turn."""
+    events = [["", "turn", str(turn)]]
+    for i in range(EVENTS_PER_TURN - 1):
+        kind = rng.choice(["move", "-damage", "switch", "-boost", "raw"])
+        if kind == "raw":
+            events.append(["", "raw", "<div class=\"html\">chat</div>", "html"])
+        else:
+            events.append(["", kind, f"p{1 + i % 2}a: Mon{i}", f"{rng.randint(0, 100)}/100"])
+    return events
+
+
+def run(log_length):
+    rng = random.Random(SEED)
+    turns = [make_turn_events(turn, rng) for turn in range(N_TURNS)]
+
+    # Full rescan: battle grows one turn at a time, prompt built every turn
+    battle = SimpleNamespace(observations={})
+    start = time.perf_counter()
+    expected = []
+    for turn, events in enumerate(turns):
+        battle.observations[turn] = Observation(events=events)
+        expected.append(full_rescan(battle, log_length))
+    rescan_time = time.perf_counter() - start
+
+    # Incremental accumulator over the same sequence
+    battle = SimpleNamespace(observations={})
+    accumulator = BattleLogAccumulator(log_length)
+    start = time.perf_counter()
+    actual = []
+    for turn, events in enumerate(turns):
+        battle.observations[turn] = Observation(events=events)
+        actual.append(accumulator.update(battle).recent())
+    incremental_time = time.perf_counter() - start
+
+    assert actual == expected, "Incremental log diverged from full rescan"
+    return rescan_time, incremental_time
+
+
+def main():
+    print(f"Battle of {N_TURNS} turns, {EVENTS_PER_TURN} events per turn")
+    print(f"{'log_length':>10} | {'full rescan':>12} | {'incremental':>12} | {'speedup':>8}")
+    for log_length in LOG_LENGTHS:
+        rescan_time, incremental_time = run(log_length)
+        print(f"{log_length:>10} | {rescan_time * 1000:>10.1f}ms | {incremental_time * 1000:>10.1f}ms | "
+              f"{rescan_time / incremental_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
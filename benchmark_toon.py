@@ -0,0 +1,216 @@
+"""
+Micro-benchmark of the battle state serializers.
+
+Replays recorded-style battles (Showdown protocol messages plus requests, generated from a
+seed) through poke_env, and at every turn encodes the prompt sections both ways: the
+create_* dicts passed through remove_empty_values and the TOON encoder, and the single-pass
+battle_toon functions. Outputs are asserted byte-identical before timings are reported.
+"""
+
+import logging
+import random
+import time
+from poke_env.battle import Battle
+from battle_toon import (encode_actions, encode_observations, encode_team, encode_team_sets, encode_team_status,
+                         TeamFragmentCache)
+from utils import (create_action_context, create_observation_dictionary, create_team_array, create_team_sets,
+                   create_team_status, encode_to_toon)
+
+# Benchmark configuration variables
+N_BATTLES = 10
+N_TURNS = 40
+REPEATS = 10
+SEED = 0
+
+TEAM = [
+    ("Tyranitar", "leftovers", "sandstream", ["rockslide", "earthquake", "dragondance", "icebeam"], 341),
+    ("Metagross", "choiceband", "clearbody", ["meteormash", "earthquake", "explosion", "rockslide"], 301),
+    ("Skarmory", "leftovers", "keeneye", ["spikes", "whirlwind", "drillpeck", "rest"], 334),
+    ("Blissey", "leftovers", "naturalcure", ["softboiled", "seismictoss", "toxic", "aromatherapy"], 651),
+    ("Gengar", "leftovers", "levitate", ["thunderbolt", "icepunch", "willowisp", "explosion"], 261),
+    ("Suicune", "leftovers", "pressure", ["surf", "calmmind", "rest", "sleeptalk"], 404),
+]
+OPPONENTS = ["Salamence", "Swampert", "Celebi", "Zapdos", "Heracross", "Jirachi"]
+STATUSES = ["brn", "par", "psn", "tox", "slp", "frz"]
+BOOSTS = ["atk", "def", "spa", "spd", "spe", "accuracy"]
+EFFECTS = ["confusion", "Leech Seed", "Substitute", "taunt"]
+SIDE_CONDITIONS = ["Spikes", "Reflect", "Light Screen", "Safeguard"]
+WEATHERS = ["Sandstorm", "RainDance", "SunnyDay", "Hail"]
+MAX_PP = 16
+
+
+def make_request(state):
+    """Build the request the server would send for the current state."""
+    side = []
+    for i, (species, item, ability, moves, max_hp) in enumerate(TEAM):
+        hp = state["hp"][i]
+        condition = f"{hp}/{max_hp}" if hp > 0 else "0 fnt"
+        if hp > 0 and state["status"][i]:
+            condition += f" {state['status'][i]}"
+        side.append({"ident": f"p1: {species}", "details": f"{species}, L100", "condition": condition,
+                     "active": i == state["active"],
+                     "stats": {"atk": 250, "def": 240, "spa": 200, "spd": 230, "spe": 210},
+                     "moves": moves, "baseAbility": ability, "item": item, "pokeball": "pokeball"})
+    active_moves = TEAM[state["active"]][3]
+    active = [{"moves": [{"move": move, "id": move, "pp": state["pp"][state["active"]][move], "maxpp": MAX_PP,
+                          "target": "normal", "disabled": False} for move in active_moves]}]
+    return {"active": active, "side": {"name": "bot", "id": "p1", "pokemon": side}, "rqid": state["turn"]}
+
+
+def record_battle(seed):
+    """
+    Generate a battle as a recorded message stream: a list of ("message", split_message)
+    and ("request", request) entries, in the order the client would receive them.
+    """
+    rng = random.Random(seed)
+    state = {
+        "hp": [member[4] for member in TEAM],
+        "status": [None] * len(TEAM),
+        "pp": [{move: MAX_PP for move in member[3]} for member in TEAM],
+        "active": 0,
+        "turn": 1,
+    }
+    opponent = 0
+    record = [("message", message) for message in [
+        ["", "player", "p1", "bot", ""], ["", "player", "p2", "opp", ""], ["", "gen", "3"],
+        ["", "tier", "[Gen 3] OU"], ["", "start"],
+        ["", "switch", f"p1a: {TEAM[0][0]}", f"{TEAM[0][0]}, L100", f"{TEAM[0][4]}/{TEAM[0][4]}"],
+        ["", "switch", f"p2a: {OPPONENTS[0]}", f"{OPPONENTS[0]}, L100", "100/100"],
+        ["", "turn", "1"],
+    ]]
+    record.append(("request", make_request(state)))
+
+    for turn in range(2, N_TURNS + 1):
+        messages = [["", ""]]
+        ours = f"p1a: {TEAM[state['active']][0]}"
+        theirs = f"p2a: {OPPONENTS[opponent]}"
+
+        move = rng.choice(TEAM[state["active"]][3])
+        state["pp"][state["active"]][move] = max(0, state["pp"][state["active"]][move] - 1)
+        messages.append(["", "move", ours, move, theirs])
+        messages.append(["", "-damage", theirs, f"{rng.randint(1, 99)}/100"])
+        messages.append(["", "move", theirs, "earthquake", ours])
+        state["hp"][state["active"]] = max(1, state["hp"][state["active"]] - rng.randint(0, 40))
+        messages.append(["", "-damage", ours, f"{state['hp'][state['active']]}/{TEAM[state['active']][4]}"])
+
+        if rng.random() < 0.25:
+            messages.append(["", rng.choice(["-boost", "-unboost"]), rng.choice([ours, theirs]),
+                             rng.choice(BOOSTS), str(rng.randint(1, 2))])
+        if rng.random() < 0.15 and state["status"][state["active"]] is None:
+            status = rng.choice(STATUSES)
+            state["status"][state["active"]] = status
+            messages.append(["", "-status", ours, status])
+        if rng.random() < 0.1:
+            messages.append(["", "-status", theirs, rng.choice(STATUSES)])
+        if rng.random() < 0.15:
+            messages.append(["", "-start", rng.choice([ours, theirs]), rng.choice(EFFECTS)])
+        if rng.random() < 0.1:
+            messages.append(["", "-sidestart", rng.choice(["p1: bot", "p2: opp"]), rng.choice(SIDE_CONDITIONS)])
+        if rng.random() < 0.05:
+            messages.append(["", "-weather", rng.choice(WEATHERS)])
+        if rng.random() < 0.05:
+            messages.append(["", "-fieldstart", "move: Mud Sport"])
+        if rng.random() < 0.1:
+            messages.append(["", "faint", theirs])
+        if rng.random() < 0.2:
+            opponent = (opponent + 1) % len(OPPONENTS)
+            messages.append(["", "switch", f"p2a: {OPPONENTS[opponent]}", f"{OPPONENTS[opponent]}, L100",
+                             "100/100"])
+        if rng.random() < 0.15:
+            state["active"] = (state["active"] + 1) % len(TEAM)
+            hp = state["hp"][state["active"]]
+            messages.append(["", "switch", f"p1a: {TEAM[state['active']][0]}",
+                             f"{TEAM[state['active']][0]}, L100", f"{hp}/{TEAM[state['active']][4]}"])
+
+        messages.append(["", "html", "<div class=\"broadcast\">html</div>"])
+        messages += [["", "upkeep"], ["", "turn", str(turn)]]
+        state["turn"] = turn
+        record.extend(("message", message) for message in messages)
+        record.append(("request", make_request(state)))
+
+    return record
+
+
+def replay(record, battle_tag):
+    """Feed a recorded stream into a fresh Battle, yielding it after each request."""
+    battle = Battle(battle_tag, "bot", logging.getLogger("benchmark_toon"), gen=3)
+    for kind, payload in record:
+        if kind == "message":
+            battle.parse_message(payload)
+        else:
+            battle.parse_request(payload)
+            yield battle
+
+
+SECTIONS = [
+    ("observations", lambda battle: encode_to_toon(create_observation_dictionary(battle)), encode_observations),
+    ("team", lambda battle: encode_to_toon(create_team_array(battle)), encode_team),
+    ("team_sets", lambda battle: encode_to_toon(create_team_sets(battle)), encode_team_sets),
+    ("team_status", lambda battle: encode_to_toon(create_team_status(battle)), encode_team_status),
+    ("actions", lambda battle: encode_to_toon(create_action_context(battle)), encode_actions),
+]
+
+
+CACHED_SECTIONS = [
+    ("team", encode_team, TeamFragmentCache.encode_team),
+    ("team_sets", encode_team_sets, TeamFragmentCache.encode_team_sets),
+    ("team_status", encode_team_status, TeamFragmentCache.encode_team_status),
+]
+
+
+def time_call(function, *args, repeats=REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    timings = {name: [0.0, 0.0] for name, _, _ in SECTIONS}
+    cached_timings = {name: [0.0, 0.0] for name, _, _ in CACHED_SECTIONS}
+    hits = misses = 0
+    states = 0
+    for index in range(N_BATTLES):
+        record = record_battle(SEED + index)
+        fragments = TeamFragmentCache()
+        for battle in replay(record, f"battle-gen3ou-{index}"):
+            states += 1
+            # The fragment cache is exercised once per turn, as in a real battle
+            for name, single_pass, cached in CACHED_SECTIONS:
+                start = time.perf_counter()
+                actual = cached(fragments, battle)
+                cached_timings[name][1] += time.perf_counter() - start
+                assert actual == single_pass(battle), f"cached {name} differs at turn {battle.turn}"
+                cached_timings[name][0] += time_call(single_pass, battle) / REPEATS
+            for name, legacy, single_pass in SECTIONS:
+                expected = legacy(battle)
+                actual = single_pass(battle)
+                assert actual == expected, (
+                    f"{name} differs at {battle.battle_tag} turn {battle.turn}:\n{expected}\n---\n{actual}"
+                )
+                timings[name][0] += time_call(legacy, battle)
+                timings[name][1] += time_call(single_pass, battle)
+        hits += fragments.hits
+        misses += fragments.misses
+
+    print(f"{states} battle states from {N_BATTLES} battles, {REPEATS} encodes each, outputs byte-identical")
+    print(f"{'section':>12} | {'dict + TOON':>12} | {'single pass':>12} | {'speedup':>8}")
+    total_legacy = total_single_pass = 0.0
+    for name, (legacy_time, single_pass_time) in timings.items():
+        total_legacy += legacy_time
+        total_single_pass += single_pass_time
+        per_state = 1e6 / (states * REPEATS)
+        print(f"{name:>12} | {legacy_time * per_state:>10.1f}us | {single_pass_time * per_state:>10.1f}us | "
+              f"{legacy_time / single_pass_time:>7.1f}x")
+    print(f"{'total':>12} | {total_legacy * 1000:>10.1f}ms | {total_single_pass * 1000:>10.1f}ms | "
+          f"{total_legacy / total_single_pass:>7.1f}x")
+
+    print(f"\nTeam sections with a per-battle TeamFragmentCache (fragment hit rate {hits / (hits + misses):.0%})")
+    print(f"{'section':>12} | {'single pass':>12} | {'fragments':>12} | {'speedup':>8}")
+    for name, (single_pass_time, cached_time) in cached_timings.items():
+        print(f"{name:>12} | {single_pass_time * 1e6 / states:>10.1f}us | {cached_time * 1e6 / states:>10.1f}us | "
+              f"{single_pass_time / cached_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
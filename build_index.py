@@ -0,0 +1,165 @@
+"""
+Pre-parsed index of a Pokemon builds file.
+
+Every build is parsed once into species, base species, tier tags (from its "# NAME - TIER"
+header), item, ability, moves and the Showdown text without comment lines, and the tags
+are indexed so format filters are set lookups. The index is pickled next to the builds
+file and reused while the file's size and mtime (or, if those changed, its sha256) still
+match. Loaded indexes are shared per file within a process, so several RandomTeamBuilders
+with different filters parse and load it once.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+
+BUILD_SEPARATOR = "============================================================"
+
+# Bumped when the parsed fields change, so older cache files are rebuilt
+INDEX_VERSION = 1
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def extract_species(first_line: str) -> str:
+    """Species from the first line of a build: "Species @ Item", "Nickname (Species) @ Item" or "Species (M) @ Item"."""
+    name = first_line.split("@")[0].strip()
+    if "(" in name and ")" in name:
+        inner = name.split("(")[1].split(")")[0].strip()
+        # A single letter in parentheses is the gender, not the species
+        return name.split("(")[0].strip() if inner in ("M", "F") else inner
+    return name
+
+
+def base_species(species: str) -> str:
+    """Treat alternate formes as the same species, e.g. 'Deoxys-Attack' -> 'Deoxys'."""
+    return species.split("-")[0]
+
+
+def parse_build(block: str) -> dict:
+    """Parse one separator-delimited block of the builds file (None if it holds no build)."""
+    lines = block.strip().split("\n")
+    header = [line.strip().lstrip("#").strip() for line in lines if line.strip().startswith("#")]
+    text = "\n".join(line for line in lines if not line.strip().startswith("#")).strip()
+    if not text:
+        return None
+
+    tags = []
+    for comment in header:
+        if " - " in comment and not comment.lower().startswith("source:"):
+            tags.extend(tag.strip().lower() for tag in comment.split(" - ")[1:])
+
+    build_lines = text.split("\n")
+    species = extract_species(build_lines[0])
+    item = build_lines[0].split("@", 1)[1].strip() if "@" in build_lines[0] else None
+    ability = next((line.split(":", 1)[1].strip() for line in build_lines if line.startswith("Ability:")), None)
+    return {
+        "species": species,
+        "base_species": base_species(species),
+        "tags": tuple(tags),
+        "item": item,
+        "ability": ability,
+        "moves": tuple(line[1:].strip() for line in build_lines if line.startswith("-")),
+        "text": text,
+    }
+
+
+class BuildIndex:
+    """Parsed builds of one file, with the build numbers of every tier tag."""
+
+    def __init__(self, builds: list):
+        self.builds = builds
+        self.by_tag = {}
+        for number, build in enumerate(builds):
+            for tag in build["tags"]:
+                self.by_tag.setdefault(tag, set()).add(number)
+
+    @classmethod
+    def parse(cls, content: str) -> "BuildIndex":
+        builds = (parse_build(block) for block in content.split(BUILD_SEPARATOR) if block.strip())
+        return cls([build for build in builds if build is not None])
+
+    def __len__(self):
+        return len(self.builds)
+
+    def tags(self) -> list:
+        return sorted(self.by_tag)
+
+    def select(self, filter_format: str = None, include_formats: list = None) -> list:
+        """
+        Builds passing the format filters, in file order.
+
+        Args:
+            filter_format: Tier tag to exclude (e.g. "doubles"), case-insensitive
+            include_formats: Tier tags to keep (e.g. ["OU", "Uber"]); None keeps every tag
+        """
+        if include_formats:
+            numbers = set().union(*(self.by_tag.get(fmt.lower(), ()) for fmt in include_formats))
+        else:
+            numbers = set(range(len(self.builds)))
+        if filter_format:
+            numbers -= self.by_tag.get(filter_format.lower(), set())
+        return [self.builds[number] for number in sorted(numbers)]
+
+
+def _file_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    return cached if isinstance(cached, dict) and cached.get("version") == INDEX_VERSION else None
+
+
+def _write_cache(cache_path, cached):
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: could not write build index cache {cache_path}: {e}")
+
+
+def load_build_index(builds_file: str, cache_path: str = None) -> BuildIndex:
+    """
+    The BuildIndex of builds_file, from memory, the cache file or a fresh parse.
+
+    Args:
+        builds_file: Path to the builds file in Showdown format
+        cache_path: Pickled index file (default: "<builds_file>.idx"; False disables it)
+    """
+    path = os.path.abspath(builds_file)
+    if cache_path is None:
+        cache_path = f"{path}.idx"
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+
+    with _lock:
+        loaded = _loaded.get(path)
+        if loaded is not None and loaded[0] == signature:
+            return loaded[1]
+
+        cached = _read_cache(cache_path) if cache_path else None
+        if cached is not None and (cached["size"], cached["mtime_ns"]) == signature:
+            index = BuildIndex(cached["builds"])
+        else:
+            with open(path, "rb") as f:
+                content = f.read()
+            digest = _file_hash(content)
+            if cached is not None and cached["sha256"] == digest:
+                # Touched but unchanged: keep the parse and remember the new mtime
+                index = BuildIndex(cached["builds"])
+            else:
+                index = BuildIndex.parse(content.decode("utf-8"))
+            if cache_path:
+                _write_cache(cache_path, {"version": INDEX_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                          "sha256": digest, "builds": index.builds})
+        _loaded[path] = (signature, index)
+        return index
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def _without_scratchpad(decision):
+    return {key: value for key, value in decision.items() if key != "scratchpad"}
+
+
+class DecisionCache:
+    """
+    Cross-battle cache of model decisions keyed on a canonical hash of the battle state.
+
+    Identical prompts (e.g. turn 1 with the same leads, repeated across n_challenges
+    battles) can reuse an earlier decision instead of calling the model again.
+    Entries are kept in an LRU and optionally persisted to SQLite so they survive restarts.
+
+    Reuse is temperature-aware: at or below max_temperature the model is treated as
+    deterministic and a single stored decision is reused. Above it (or when the temperature
+    is unknown) the cache first collects samples_per_key decisions for the state and then
+    returns one of them at random, so reuse still follows the model's sampled distribution.
+
+    The cache is built on one thread and used from poke-env's event loop thread, so the
+    SQLite connection is shared across threads behind a lock. Database errors are reported
+    and treated as misses rather than failing the turn.
+
+    Scratchpads are not cached: they are notes about the battle they were written in, and
+    the key covers the visible state only, so a reused decision carries just its action
+    and reasoning.
+    """
+
+    def __init__(self, max_entries: int = 10000, db_path: str = None, max_temperature: float = 0.0,
+                 samples_per_key: int = 3):
+        """
+        Args:
+            max_entries: Maximum number of states kept in memory (least recently used are evicted)
+            db_path: Optional SQLite file backing the cache
+            max_temperature: Highest sampling temperature treated as deterministic
+            samples_per_key: Decisions to collect before reusing a non-deterministic state
+        """
+        self.max_entries = max_entries
+        self.max_temperature = max_temperature
+        self.samples_per_key = samples_per_key
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS decisions (key TEXT NOT NULL, decision TEXT NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS decisions_key ON decisions (key)")
+
+    @staticmethod
+    def make_key(model: str, prompt_variant: str, state: dict) -> str:
+        """Canonical hash of the model, prompt variant and encoded battle state sections."""
+        payload = json.dumps([model, prompt_variant, state], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _required_samples(self, temperature):
+        if temperature is not None and temperature <= self.max_temperature:
+            return 1
+        return self.samples_per_key
+
+    def _load(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        samples = []
+        if self._db is not None:
+            try:
+                rows = self._db.execute("SELECT decision FROM decisions WHERE key = ?", (key,)).fetchall()
+            except sqlite3.Error as e:
+                print(f"Decision cache read failed: {e}")
+                rows = []
+            samples = [json.loads(row[0]) for row in rows]
+        if samples:
+            self._store(key, samples)
+        return samples
+
+    def _store(self, key, samples):
+        self._entries[key] = samples
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str, temperature: float = None):
+        """Return a cached decision for the state, or None if reuse isn't allowed yet."""
+        with self._lock:
+            samples = self._load(key)
+            if len(samples) >= self._required_samples(temperature):
+                self.hits += 1
+                return _without_scratchpad(random.choice(samples))
+            self.misses += 1
+            return None
+
+    def put(self, key: str, decision: dict):
+        """Record a valid decision for the state."""
+        with self._lock:
+            samples = self._load(key)
+            if len(samples) >= self.samples_per_key:
+                return
+            decision = _without_scratchpad(decision)
+            samples = samples + [decision]
+            self._store(key, samples)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT INTO decisions (key, decision) VALUES (?, ?)",
+                                     (key, json.dumps(decision, ensure_ascii=False)))
+                except sqlite3.Error as e:
+                    print(f"Decision cache write failed: {e}")
+
+    def stats(self) -> dict:
+        """Hit-rate metrics for the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,250 @@
+"""
+Stream battle logs into columnar training data.
+
+Reads the JSONL logs (and a log store, if present) one record at a time, keeps the records
+that pass the outcome / validity / model filters, drops repeated prompts by hash, and writes
+Parquet or Arrow IPC files in fixed-size chunks. Memory is bounded by one chunk of rows plus
+an 8-byte hash per distinct prompt, so multi-GB logs are exported in a single pass.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from log_store import LogStoreReader
+
+COLUMNS = ["prompt", "system", "action", "reasoning", "outcome", "turn", "model", "battle_tag"]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Dataset export requires the pyarrow package: pip install pyarrow") from None
+    return pyarrow
+
+
+def _sources(logs_dir):
+    """Yield (record, bytes read so far) over the JSONL files, then the store segments."""
+    read = 0
+    for path in sorted(glob.glob(os.path.join(logs_dir, "*.jsonl"))):
+        with open(path, "rb") as f:
+            for line in f:
+                read += len(line)
+                yield json.loads(line), read
+    store_dir = os.path.join(logs_dir, "store")
+    if os.path.isdir(store_dir):
+        reader = LogStoreReader(store_dir)
+        for path in reader.segments():
+            for record in reader.segment_records(path):
+                yield record, read
+            read += os.path.getsize(path)
+            yield None, read
+
+
+def total_bytes(logs_dir: str) -> int:
+    paths = glob.glob(os.path.join(logs_dir, "*.jsonl"))
+    paths += glob.glob(os.path.join(logs_dir, "store", "segments", "*"))
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def _message(messages, role):
+    """Content of the last message with the given role."""
+    for message in reversed(messages or []):
+        if message.get("role") == role:
+            return message.get("content")
+    return None
+
+
+def to_row(record: dict) -> dict:
+    response = record.get("response")
+    if not isinstance(response, dict):
+        response = {}
+    return {
+        "prompt": _message(record.get("messages"), "user"),
+        "system": _message(record.get("messages"), "system"),
+        "action": response.get("action"),
+        "reasoning": response.get("reasoning"),
+        "outcome": record.get("outcome"),
+        "turn": record.get("turn"),
+        "model": record.get("model"),
+        "battle_tag": record.get("battle_tag"),
+    }
+
+
+def prompt_hash(record: dict) -> bytes:
+    """8-byte hash of the model and prompt messages, used to drop duplicate prompts."""
+    payload = json.dumps([record.get("model"), record.get("messages")], sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest()
+
+
+class ChunkedDatasetWriter:
+    """Writes rows to <out_dir>/part-NNNNN.<ext>, one row group per chunk, rotating files every rows_per_file."""
+
+    def __init__(self, out_dir: str, file_format: str = "parquet", chunk_rows: int = 10000,
+                 rows_per_file: int = 1000000, compression: str = "zstd"):
+        if file_format not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown dataset format: {file_format}")
+        self.pa = _pyarrow()
+        self.out_dir = out_dir
+        self.file_format = file_format
+        self.chunk_rows = chunk_rows
+        self.rows_per_file = rows_per_file
+        self.compression = compression
+        self.schema = self.pa.schema([
+            ("prompt", self.pa.string()),
+            ("system", self.pa.string()),
+            ("action", self.pa.string()),
+            ("reasoning", self.pa.string()),
+            ("outcome", self.pa.string()),
+            ("turn", self.pa.int32()),
+            ("model", self.pa.string()),
+            ("battle_tag", self.pa.string()),
+        ])
+        self._buffer = {column: [] for column in COLUMNS}
+        self._buffered = 0
+        self._writer = None
+        self._file_rows = 0
+        self.files = []
+        self.rows = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _open(self):
+        extension = "parquet" if self.file_format == "parquet" else "arrow"
+        path = os.path.join(self.out_dir, f"part-{len(self.files):05d}.{extension}")
+        if self.file_format == "parquet":
+            self._writer = self.pa.parquet.ParquetWriter(path, self.schema, compression=self.compression)
+        else:
+            options = self.pa.ipc.IpcWriteOptions(compression=self.compression)
+            self._writer = self.pa.ipc.new_file(path, self.schema, options=options)
+        self.files.append(path)
+        self._file_rows = 0
+
+    def write(self, row: dict):
+        for column in COLUMNS:
+            self._buffer[column].append(row[column])
+        self._buffered += 1
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered:
+            return
+        if self._writer is None or self._file_rows >= self.rows_per_file:
+            self.close_file()
+            self._open()
+        batch = self.pa.record_batch([self.pa.array(self._buffer[column], type=self.schema.field(column).type)
+                                      for column in COLUMNS], schema=self.schema)
+        self._writer.write_batch(batch)
+        self._file_rows += self._buffered
+        self.rows += self._buffered
+        self._buffer = {column: [] for column in COLUMNS}
+        self._buffered = 0
+
+    @property
+    def kept(self) -> int:
+        """Rows written or buffered so far."""
+        return self.rows + self._buffered
+
+    def close_file(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def close(self):
+        self.flush()
+        self.close_file()
+
+
+def export(logs_dir: str, out_dir: str, outcomes=("win",), valid_only: bool = True, models=None,
+           dedup: bool = True, file_format: str = "parquet", chunk_rows: int = 10000,
+           rows_per_file: int = 1000000, progress_interval: float = 2.0) -> dict:
+    """
+    Export matching log records as a dataset.
+
+    Args:
+        logs_dir: Battle logs directory
+        out_dir: Output directory for the part files
+        outcomes: Outcomes to keep ("win", "loss", "invalid", "unfinished"), None for all
+        valid_only: Drop records whose response failed validation
+        models: Models to keep, None for all
+        dedup: Drop records whose model and prompt messages were already exported
+        file_format: "parquet" or "arrow" (IPC file)
+        chunk_rows: Rows buffered per row group / record batch
+        rows_per_file: Rows after which the next part file is started
+        progress_interval: Seconds between progress lines on stderr (0 disables)
+
+    Returns:
+        Counts of records read, filtered, duplicate and written, and the files written.
+    """
+    writer = ChunkedDatasetWriter(out_dir, file_format, chunk_rows, rows_per_file)
+    outcomes = set(outcomes) if outcomes else None
+    models = set(models) if models else None
+    seen = set()
+    counts = {"read": 0, "filtered": 0, "duplicate": 0}
+    total = total_bytes(logs_dir)
+    started = last_report = time.monotonic()
+
+    for record, read in _sources(logs_dir):
+        if progress_interval and time.monotonic() - last_report >= progress_interval:
+            last_report = time.monotonic()
+            rate = read / (last_report - started) / 1e6
+            print(f"{read / total if total else 1:.1%} of {total / 1e6:.0f} MB ({rate:.1f} MB/s), "
+                  f"{counts['read']} read, {writer.kept} kept", file=sys.stderr)
+        if record is None:
+            continue
+        counts["read"] += 1
+        if (outcomes is not None and record.get("outcome") not in outcomes) \
+                or (valid_only and not record.get("is_valid_response")) \
+                or (models is not None and record.get("model") not in models):
+            counts["filtered"] += 1
+            continue
+        if dedup:
+            digest = prompt_hash(record)
+            if digest in seen:
+                counts["duplicate"] += 1
+                continue
+            seen.add(digest)
+        writer.write(to_row(record))
+
+    writer.close()
+    counts["written"] = writer.rows
+    counts["files"] = writer.files
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export battle logs as Parquet/Arrow training data")
+    parser.add_argument("--logs", default="battle_logs", help="Directory containing the battle logs")
+    parser.add_argument("--out", default="dataset", help="Output directory")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--outcome", action="append", help="Outcome to keep (repeatable, default: win)")
+    parser.add_argument("--all-outcomes", action="store_true", help="Keep every outcome")
+    parser.add_argument("--include-invalid", action="store_true", help="Keep responses that failed validation")
+    parser.add_argument("--model", action="append", help="Model to keep (repeatable, default: all)")
+    parser.add_argument("--no-dedup", action="store_true", help="Keep duplicate prompts")
+    parser.add_argument("--chunk-rows", type=int, default=10000)
+    parser.add_argument("--rows-per-file", type=int, default=1000000)
+    args = parser.parse_args()
+
+    counts = export(
+        args.logs, args.out,
+        outcomes=None if args.all_outcomes else (args.outcome or ["win"]),
+        valid_only=not args.include_invalid,
+        models=args.model,
+        dedup=not args.no_dedup,
+        file_format=args.format,
+        chunk_rows=args.chunk_rows,
+        rows_per_file=args.rows_per_file,
+    )
+    print(f"Read {counts['read']} records: {counts['filtered']} filtered, {counts['duplicate']} duplicate, "
+          f"{counts['written']} written to {len(counts['files'])} file(s) in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
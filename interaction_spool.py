@@ -0,0 +1,210 @@
+import glob
+import json
+import os
+import re
+from utils import log_battle_interaction
+
+DEFAULT_SPOOL_DIR = os.path.join("battle_logs", "spool")
+
+# Spool directories already recovered by this process
+_recovered = set()
+
+
+def _safe_name(name):
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class InteractionSpool:
+    """
+    Per-battle spool files for a player's interactions.
+
+    Interactions are appended to <directory>/<pid>-<player>-<battle>.jsonl as they are
+    completed, so an in-flight battle costs a file handle instead of every prompt it has
+    seen. The first line of each file is a header (model, battle, opponent) that lets
+    recover_spools log the interactions of battles a crashed process never finished.
+
+    With a writer (BatchedLogWriter), every file operation (encoding and appending turns,
+    replaying a finished battle and deleting its spool) runs on the writer thread in
+    submission order, so the event loop never touches the disk.
+    """
+
+    def __init__(self, directory: str = DEFAULT_SPOOL_DIR, owner: str = "", writer=None):
+        self.directory = directory
+        self.owner = _safe_name(owner)
+        self.writer = writer
+        self._files = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, battle_tag):
+        return os.path.join(self.directory, f"{os.getpid()}-{self.owner}-{_safe_name(battle_tag)}.jsonl")
+
+    def _submit(self, task, on_written=None):
+        if self.writer is not None:
+            self.writer.submit(task, on_written)
+            return
+        task(None)
+        if on_written is not None:
+            on_written()
+
+    def _close_file(self, battle_tag):
+        handle = self._files.pop(battle_tag, None)
+        if handle is not None:
+            handle.close()
+
+    def _append(self, battle_tag, interaction, header):
+        handle = self._files.get(battle_tag)
+        if handle is None:
+            handle = self._files[battle_tag] = open(self._path(battle_tag), "a", encoding="utf-8")
+            if handle.tell() == 0:
+                handle.write(json.dumps({"spool_header": header or {}}, ensure_ascii=False) + "\n")
+        handle.write(json.dumps(interaction, ensure_ascii=False) + "\n")
+        # Flushed per interaction so a crash loses at most the line being written
+        handle.flush()
+
+    def append(self, battle_tag: str, interaction: dict, header: dict = None):
+        """
+        Append a completed interaction; header is written first when the battle's spool is created.
+        The interaction must not be modified afterwards (it is encoded later on the writer thread).
+        """
+        self._submit(lambda _: self._append(battle_tag, interaction, header))
+
+    def finish(self, battle_tag: str, log, interactions: list = ()):
+        """
+        Log the battle's spooled interactions, then the given in-memory ones, and delete its spool.
+
+        Args:
+            log: log(interaction, writer) logging one interaction; writer collects the entries
+                (None when the spool has no writer)
+            interactions: Interactions that were never spooled, logged after the spooled ones
+        """
+        path = self._path(battle_tag)
+
+        def replay(entries):
+            self._close_file(battle_tag)
+            if os.path.exists(path):
+                for record in _read_spool(path):
+                    if "spool_header" not in record:
+                        log(record, entries)
+            for interaction in interactions:
+                log(interaction, entries)
+
+        self._submit(replay, on_written=lambda: _remove(path))
+
+    def close(self):
+        def close_files(_):
+            for battle_tag in list(self._files):
+                self._close_file(battle_tag)
+
+        self._submit(close_files)
+
+
+def _read_spool(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # Torn final write
+            yield json.loads(line)
+
+
+def log_interaction(model: str, interaction: dict, outcome: str, battle_tag: str, opponent: str, writer=None):
+    """Log one recorded interaction with its battle context."""
+    log_battle_interaction(
+        model_name=model,
+        messages=interaction["messages"],
+        response=interaction["response"],
+        outcome=outcome,
+        is_valid_response=interaction["is_valid_response"],
+        latency=interaction.get("latency"),
+        extra={"battle_tag": battle_tag,
+               "turn": interaction.get("turn"),
+               "opponent": opponent,
+               "timestamp": interaction.get("timestamp"),
+               "prefix_stability": interaction.get("prefix_stability"),
+               "token_counts": interaction.get("token_counts")},
+        writer=writer
+    )
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _claim(path):
+    """Rename a spool to <path>.<pid>.recovering so no other process recovers it too (None if one already did)."""
+    claimed = f"{path.rsplit('.', 2)[0] if path.endswith('.recovering') else path}.{os.getpid()}.recovering"
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        return None
+    return claimed
+
+
+def _replay(path, entries):
+    header = {}
+    for record in _read_spool(path):
+        if "spool_header" in record:
+            header = record["spool_header"]
+            continue
+        log_interaction(header.get("model", "unknown"), record, "unfinished",
+                        header.get("battle_tag"), header.get("opponent"), entries)
+
+
+def recover_spools(directory: str = DEFAULT_SPOOL_DIR, action: str = "log", writer=None) -> int:
+    """
+    Handle spools left by processes that exited before their battles finished.
+
+    Each spool is first claimed by renaming it, so processes starting at the same time never
+    recover the same file, and a claimed spool is only deleted once its entries are written.
+    Claims left by a process that died while recovering are picked up again.
+
+    Args:
+        directory: Spool directory
+        action: "log" writes the interactions with outcome "unfinished" (invalid responses still
+            go to the invalid log), "discard" deletes them
+        writer: Optional BatchedLogWriter; the recovered entries are read, written and the
+            spool deleted on its thread
+
+    Returns:
+        Number of spool files claimed. Spools of live processes are left alone, and each
+        directory is only recovered once per process.
+    """
+    if action not in ("log", "discard"):
+        raise ValueError(f"Unknown spool recovery action: {action}")
+    directory = os.path.abspath(directory)
+    if directory in _recovered:
+        return 0
+    _recovered.add(directory)
+
+    handled = 0
+    paths = glob.glob(os.path.join(directory, "*.jsonl")) + glob.glob(os.path.join(directory, "*.recovering"))
+    for path in paths:
+        # Owner: the process that wrote the spool, or the one that claimed it for recovery
+        pid = path.rsplit(".", 2)[1] if path.endswith(".recovering") else os.path.basename(path).split("-", 1)[0]
+        if not pid.isdigit() or int(pid) == os.getpid() or _pid_alive(int(pid)):
+            continue
+        claimed = _claim(path)
+        if claimed is None:
+            continue
+        handled += 1
+        if action == "discard":
+            _remove(claimed)
+        elif writer is not None:
+            writer.submit(lambda entries, claimed=claimed: _replay(claimed, entries),
+                          on_written=lambda claimed=claimed: _remove(claimed))
+        else:
+            _replay(claimed, None)
+            _remove(claimed)
+    return handled
@@ -0,0 +1,256 @@
+import math
+from typing import List, Dict
+from tabulate import tabulate
+from decision_cache import DecisionCache
+from matchup_scheduler import MatchupScheduler, matchup_providers
+from random_team_builder import RandomTeamBuilder
+from ratings import RatingStore
+from tournament import PlayerFactory, PlayerPool, play_series
+
+
+async def _play_pairs(pairs, pool, team_builder, team_size, n_challenges, ratings, max_concurrent_matchups,
+                      provider_limits, label):
+    """Play an n_challenges series for every (config1, config2) pair concurrently; returns their battle outcomes."""
+    outcomes = [[] for _ in pairs]
+
+    async def play(index, config1, config2):
+        teams = [team_builder.generate_random_team(team_size=team_size) for _ in range(2)]
+        battles = outcomes[index]
+        await play_series(pool, config1, config2, teams, lambda: len(battles) < n_challenges, battles.append)
+        ratings.record_series(config1["username"], config2["username"], battles)
+        print(f"\n[{label}] {config1['username']} vs {config2['username']}: "
+              f"{battles.count('p1')}-{battles.count('p2')}"
+              f" | {config1['username']} {ratings.rating(config1['username']):.0f}"
+              f", {config2['username']} {ratings.rating(config2['username']):.0f}")
+
+    scheduler = MatchupScheduler(max_concurrent_matchups, provider_limits)
+    await scheduler.run_all([
+        (f"{config1['username']} vs {config2['username']}", matchup_providers(config1, config2),
+         lambda index=index, config1=config1, config2=config2: play(index, config1, config2))
+        for index, (config1, config2) in enumerate(pairs)
+    ])
+    return outcomes
+
+
+def swiss_pairings(usernames: List[str], scores: Dict[str, float], ratings: RatingStore, played: Dict[str, set],
+                   byes: set) -> tuple:
+    """
+    Pair players for one Swiss round.
+
+    Players are ranked by score, then rating. With an odd count, the lowest-ranked player
+    who hasn't had a bye sits out. Each player is then paired with the highest-ranked
+    remaining player they haven't met yet (or the highest-ranked one if they've met all).
+
+    Returns:
+        (list of (username1, username2) pairs, username with the bye or None)
+    """
+    standings = sorted(usernames, key=lambda username: (-scores[username], -ratings.rating(username), username))
+    bye = None
+    if len(standings) % 2:
+        bye = next((username for username in reversed(standings) if username not in byes), standings[-1])
+        standings.remove(bye)
+
+    pairs = []
+    while standings:
+        username = standings.pop(0)
+        opponent = next((other for other in standings if other not in played[username]), standings[0])
+        standings.remove(opponent)
+        pairs.append((username, opponent))
+    return pairs, bye
+
+
+async def swiss_tournament(
+    player_configs: List[dict],
+    team_builder: RandomTeamBuilder,
+    ratings: RatingStore,
+    rounds: int = None,
+    n_challenges: int = 3,
+    battle_format: str = "gen3ubers",
+    team_size: int = 4,
+    decision_cache: DecisionCache = None,
+    max_concurrent_matchups: int = 4,
+    provider_limits: Dict[str, int] = None
+) -> Dict[str, float]:
+    """
+    Swiss-system tournament: each round pairs players with similar scores.
+
+    A series win scores 1, a drawn series 0.5 and a bye 1. Ratings are updated after
+    every series and persist in the RatingStore, so they carry over between runs.
+
+    Args:
+        player_configs: List of player configuration dictionaries
+        team_builder: RandomTeamBuilder instance
+        ratings: RatingStore updated with every series
+        rounds: Number of rounds (default: ceil(log2(players)), enough to separate a single winner)
+        n_challenges: Battles per series
+        battle_format: Battle format to use
+        team_size: Number of Pokemon per team
+        decision_cache: Optional DecisionCache shared by all AI players
+        max_concurrent_matchups: Series running at once within a round
+        provider_limits: Per-provider caps, overriding matchup_scheduler.DEFAULT_PROVIDER_LIMITS
+
+    Returns:
+        Dictionary with the Swiss score of each player
+    """
+    configs = {config["username"]: config for config in player_configs}
+    usernames = list(configs)
+    rounds = rounds or max(1, math.ceil(math.log2(len(usernames))))
+    scores = {username: 0.0 for username in usernames}
+    played = {username: set() for username in usernames}
+    byes = set()
+    ratings.new_run()
+
+    print(f"\n{'='*80}")
+    print("Starting Swiss Tournament")
+    print(f"{'='*80}")
+    print(f"Players: {len(usernames)}")
+    print(f"Rounds: {rounds}")
+    print(f"Battles per series: {n_challenges}")
+    print(f"{'='*80}\n")
+
+    pool = PlayerPool(PlayerFactory(team_builder, battle_format, team_size, decision_cache))
+    try:
+        for round_number in range(1, rounds + 1):
+            pairs, bye = swiss_pairings(usernames, scores, ratings, played, byes)
+            if bye is not None:
+                byes.add(bye)
+                scores[bye] += 1
+                print(f"\n[Round {round_number}/{rounds}] {bye} has a bye")
+
+            outcomes = await _play_pairs([(configs[u1], configs[u2]) for u1, u2 in pairs], pool, team_builder,
+                                         team_size, n_challenges, ratings, max_concurrent_matchups,
+                                         provider_limits, f"Round {round_number}/{rounds}")
+            for (username1, username2), battles in zip(pairs, outcomes):
+                played[username1].add(username2)
+                played[username2].add(username1)
+                margin = battles.count("p1") - battles.count("p2")
+                scores[username1] += 1 if margin > 0 else 0.5 if margin == 0 else 0
+                scores[username2] += 1 if margin < 0 else 0.5 if margin == 0 else 0
+    finally:
+        await pool.close()
+
+    return scores
+
+
+def ladder_pairings(usernames: List[str], ratings: RatingStore, target_rd: float, last_opponent: Dict[str, str]) -> list:
+    """
+    Pair the players whose ratings are still uncertain with similarly rated opponents.
+
+    Players with RD above target_rd are taken most uncertain first; each is paired with the
+    closest-rated player not yet paired this batch (avoiding the opponent they just played
+    when there is another choice). Players already at target_rd only play as opponents.
+    """
+    available = set(usernames)
+    pairs = []
+    for username in sorted(usernames, key=lambda username: -ratings.rd(username)):
+        if ratings.rd(username) <= target_rd:
+            break
+        if username not in available:
+            continue
+        candidates = sorted((other for other in available if other != username),
+                            key=lambda other: (other == last_opponent.get(username),
+                                               abs(ratings.rating(other) - ratings.rating(username))))
+        if not candidates:
+            break
+        available -= {username, candidates[0]}
+        pairs.append((username, candidates[0]))
+    return pairs
+
+
+async def rating_ladder(
+    player_configs: List[dict],
+    team_builder: RandomTeamBuilder,
+    ratings: RatingStore,
+    target_rd: float = 75.0,
+    max_series: int = None,
+    n_challenges: int = 3,
+    battle_format: str = "gen3ubers",
+    team_size: int = 4,
+    decision_cache: DecisionCache = None,
+    max_concurrent_matchups: int = 4,
+    provider_limits: Dict[str, int] = None
+) -> RatingStore:
+    """
+    Continuous Glicko ladder: keep pairing uncertain players with similarly rated ones.
+
+    Series are played in batches of disjoint pairs until every player's rating deviation
+    is at most target_rd. Ratings persist in the RatingStore, so after a first run only
+    new (or long idle) players are uncertain: a newcomer plays a handful of series against
+    opponents near its current estimate, a binary search over the existing ranking,
+    instead of the whole field.
+
+    Args:
+        player_configs: List of player configuration dictionaries
+        team_builder: RandomTeamBuilder instance
+        ratings: RatingStore to read and update
+        target_rd: Rating deviation at which a player stops seeking series
+        max_series: Upper bound on series played (default: 4 per player)
+        n_challenges: Battles per series
+        battle_format: Battle format to use
+        team_size: Number of Pokemon per team
+        decision_cache: Optional DecisionCache shared by all AI players
+        max_concurrent_matchups: Series running at once within a batch
+        provider_limits: Per-provider caps, overriding matchup_scheduler.DEFAULT_PROVIDER_LIMITS
+
+    Returns:
+        The updated RatingStore
+    """
+    configs = {config["username"]: config for config in player_configs}
+    usernames = list(configs)
+    max_series = max_series or 4 * len(usernames)
+    last_opponent = {}
+    played = 0
+    ratings.new_run()
+
+    print(f"\n{'='*80}")
+    print("Starting Rating Ladder")
+    print(f"{'='*80}")
+    print(f"Players: {len(usernames)} ({sum(ratings.rd(u) > target_rd for u in usernames)} with RD above {target_rd:.0f})")
+    print(f"Battles per series: {n_challenges}")
+    print(f"Series limit: {max_series}")
+    print(f"{'='*80}\n")
+
+    pool = PlayerPool(PlayerFactory(team_builder, battle_format, team_size, decision_cache))
+    try:
+        while played < max_series:
+            pairs = ladder_pairings(usernames, ratings, target_rd, last_opponent)[:max_series - played]
+            if not pairs:
+                break
+            await _play_pairs([(configs[u1], configs[u2]) for u1, u2 in pairs], pool, team_builder, team_size,
+                              n_challenges, ratings, max_concurrent_matchups, provider_limits,
+                              f"Series {played + 1}-{played + len(pairs)}")
+            for username1, username2 in pairs:
+                last_opponent[username1] = username2
+                last_opponent[username2] = username1
+            played += len(pairs)
+    finally:
+        await pool.close()
+
+    print(f"\nLadder finished after {played} series")
+    return ratings
+
+
+def print_ratings(ratings: RatingStore, usernames: List[str] = None, scores: Dict[str, float] = None):
+    """
+    Print the rating table, best conservative rating (rating - 2 RD) first.
+
+    Args:
+        ratings: RatingStore to print
+        usernames: Players to include (default: every rated player)
+        scores: Optional Swiss scores to add as a column
+    """
+    print(f"\n\n{'='*80}")
+    print("RATINGS")
+    print(f"{'='*80}\n")
+
+    headers = ["Rank", "Player", "Rating", "RD", "Series", "W-L-T"] + (["Score"] if scores is not None else [])
+    table = []
+    for rank, (username, player) in enumerate(ratings.ranking(usernames), start=1):
+        row = [rank, username, f"{player['rating']:.0f}", f"{player['rd']:.0f}", player["series"],
+               f"{player['wins']}-{player['losses']}-{player['ties']}"]
+        if scores is not None:
+            row.append(scores.get(username, 0))
+        table.append(row)
+
+    print(tabulate(table, headers=headers, tablefmt="grid"))
+    print(f"\n{'='*80}\n")
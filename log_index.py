@@ -0,0 +1,243 @@
+"""
+Incrementally built SQLite index over the battle logs.
+
+Each indexed record keeps where it lives (file and byte offset for the JSONL files, or
+segment and line number for a log store) plus the fields used to select records: battle,
+turn, model, opponent, validity, log outcome ("invalid" for invalid responses), battle
+outcome and latency. Updating the index only reads what was appended since the last
+update (for store segments, the members completed since then), and queries read back just
+the matching records.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+from tabulate import tabulate
+from log_store import LogStoreReader
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    length INTEGER,
+    battle_tag TEXT,
+    turn INTEGER,
+    model TEXT,
+    opponent TEXT,
+    is_valid INTEGER,
+    outcome TEXT,
+    latency REAL,
+    timestamp REAL,
+    battle_outcome TEXT
+);
+CREATE INDEX IF NOT EXISTS records_battle ON records (battle_tag, turn);
+CREATE INDEX IF NOT EXISTS records_model ON records (model, turn);
+CREATE INDEX IF NOT EXISTS records_opponent ON records (opponent);
+CREATE INDEX IF NOT EXISTS records_path ON records (path, position);
+CREATE INDEX IF NOT EXISTS records_battle_outcome ON records (battle_outcome, is_valid);
+"""
+
+COLUMNS = ("path, position, length, battle_tag, turn, model, opponent, is_valid, outcome, latency, timestamp, "
+           "battle_outcome")
+INSERT = f"INSERT INTO records ({COLUMNS}) VALUES ({', '.join('?' * len(COLUMNS.split(', ')))})"
+
+# Query filters: CLI option -> indexed column
+FILTERS = {
+    "battle": "battle_tag",
+    "turn": "turn",
+    "model": "model",
+    "opponent": "opponent",
+    "outcome": "outcome",
+    "battle_outcome": "battle_outcome",
+}
+
+
+def _latency(record):
+    latency = record.get("latency") or {}
+    return latency.get("total", latency.get("inference"))
+
+
+def _battle_outcome(record):
+    if "battle_outcome" in record:
+        return record["battle_outcome"]
+    # Older entries only kept the battle's outcome when the response was valid
+    return record.get("outcome") if record.get("outcome") != "invalid" else None
+
+
+def _row(path, position, length, record):
+    return (path, position, length, record.get("battle_tag"), record.get("turn"), record.get("model"),
+            record.get("opponent"), int(bool(record.get("is_valid_response"))), record.get("outcome"),
+            _latency(record), record.get("timestamp"), _battle_outcome(record))
+
+
+class LogIndex:
+    """SQLite index of the records under a battle logs directory."""
+
+    def __init__(self, logs_dir: str = "battle_logs", db_path: str = None):
+        self.logs_dir = logs_dir
+        self._db = sqlite3.connect(db_path or os.path.join(logs_dir, "index.sqlite"))
+        self._db.executescript(SCHEMA)
+
+    def _indexed(self, path):
+        row = self._db.execute("SELECT size, position FROM files WHERE path = ?", (path,)).fetchone()
+        return row if row is not None else (0, 0)
+
+    def _reset(self, path):
+        self._db.execute("DELETE FROM records WHERE path = ?", (path,))
+        self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def _index_jsonl(self, path):
+        """Index lines appended since the last update; position is the byte offset of the line."""
+        size = os.path.getsize(path)
+        indexed_size, offset = self._indexed(path)
+        if size < indexed_size:
+            # Truncated or replaced: start over
+            self._reset(path)
+            offset = 0
+        if size == offset:
+            return 0
+        rows = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partially written line, picked up next time
+                rows.append(_row(path, offset, len(line), json.loads(line)))
+                offset += len(line)
+        self._db.executemany(INSERT, rows)
+        self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (path, offset, offset))
+        return len(rows)
+
+    def _index_segment(self, reader, path):
+        """
+        Index members completed in a store segment since the last update; position is the record's
+        line number. The files table keeps the compressed offset indexed so far and the record count.
+        """
+        size = os.path.getsize(path)
+        offset, count = self._indexed(path)
+        if size == offset:
+            return 0
+        if size < offset:
+            self._reset(path)
+            offset, count = 0, 0
+        rows = []
+        for offset, records in reader.segment_records_from(path, offset, rehydrate=False):
+            for record in records:
+                rows.append(_row(path, count + len(rows), None, record))
+        self._db.executemany(INSERT, rows)
+        self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (path, offset, count + len(rows)))
+        return len(rows)
+
+    def update(self) -> int:
+        """Index everything appended to the logs since the last update; returns the number of new records."""
+        added = 0
+        with self._db:
+            for path in sorted(glob.glob(os.path.join(self.logs_dir, "*.jsonl"))):
+                added += self._index_jsonl(path)
+            store_dir = os.path.join(self.logs_dir, "store")
+            if os.path.isdir(store_dir):
+                reader = LogStoreReader(store_dir)
+                for path in reader.segments():
+                    added += self._index_segment(reader, path)
+        return added
+
+    def _where(self, filters, valid):
+        clauses, params = [], []
+        for name, value in filters.items():
+            if value is not None:
+                clauses.append(f"{FILTERS[name]} = ?")
+                params.append(value)
+        if valid is not None:
+            clauses.append("is_valid = ?")
+            params.append(int(valid))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def find(self, valid: bool = None, limit: int = None, **filters) -> list:
+        """(path, position, length) of matching records, in log order."""
+        where, params = self._where(filters, valid)
+        sql = f"SELECT path, position, length FROM records{where} ORDER BY timestamp, rowid"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._db.execute(sql, params).fetchall()
+
+    def records(self, valid: bool = None, limit: int = None, **filters):
+        """Yield the matching records, reading each from its offset rather than scanning the files."""
+        locations = self.find(valid=valid, limit=limit, **filters)
+        segment_lines = {}
+        reader = None
+        for path, position, length in locations:
+            if length is not None:
+                with open(path, "rb") as f:
+                    f.seek(position)
+                    yield json.loads(f.read(length))
+                continue
+            # Compressed segments can only be read from the start; each is decompressed at most once
+            if path not in segment_lines:
+                reader = reader or LogStoreReader(os.path.join(self.logs_dir, "store"))
+                wanted = {p for candidate, p, _ in locations if candidate == path}
+                segment_lines[path] = {number: record for number, record in enumerate(reader.segment_records(path))
+                                       if number in wanted}
+            yield segment_lines[path][position]
+
+    def invalid_rate(self, by_turn: bool = True) -> list:
+        """(model, turn, decisions, invalid, invalid rate) straight from the index."""
+        group = "model, turn" if by_turn else "model, NULL"
+        return self._db.execute(
+            f"SELECT {group}, COUNT(*), SUM(1 - is_valid), AVG(1.0 - is_valid) FROM records "
+            f"GROUP BY {group} ORDER BY {group}"
+        ).fetchall()
+
+    def close(self):
+        self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index and query battle logs")
+    parser.add_argument("--logs", default="battle_logs", help="Directory containing the battle logs")
+    parser.add_argument("--db", default=None, help="Index database (default: <logs>/index.sqlite)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("update", help="Index records appended since the last update")
+
+    query = subparsers.add_parser("query", help="Print matching records as JSONL")
+    query.add_argument("--battle", help="Battle tag")
+    query.add_argument("--turn", type=int)
+    query.add_argument("--model")
+    query.add_argument("--opponent")
+    query.add_argument("--outcome", choices=["win", "loss", "invalid", "unfinished"],
+                       help="Log outcome (invalid responses are logged as \"invalid\")")
+    query.add_argument("--battle-outcome", choices=["win", "loss", "unfinished"],
+                       help="Outcome of the battle, also for invalid responses")
+    query.add_argument("--valid", dest="valid", action="store_true", default=None, help="Only valid responses")
+    query.add_argument("--invalid", dest="valid", action="store_false", help="Only invalid responses")
+    query.add_argument("--limit", type=int)
+
+    rates = subparsers.add_parser("invalid-rate", help="Invalid action rate per model (and turn)")
+    rates.add_argument("--overall", action="store_true", help="One row per model instead of per model and turn")
+
+    args = parser.parse_args()
+    index = LogIndex(args.logs, args.db)
+    added = index.update()
+
+    if args.command == "update":
+        print(f"Indexed {added} new records")
+    elif args.command == "query":
+        filters = {name: getattr(args, name) for name in FILTERS}
+        for record in index.records(valid=args.valid, limit=args.limit, **filters):
+            print(json.dumps(record, ensure_ascii=False))
+    else:
+        rows = [[model, turn if turn is not None else "-", decisions, invalid, f"{rate:.1%}"]
+                for model, turn, decisions, invalid, rate in index.invalid_rate(by_turn=not args.overall)]
+        print(tabulate(rows, headers=["Model", "Turn", "Decisions", "Invalid", "Invalid rate"], tablefmt="grid"))
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
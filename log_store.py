@@ -0,0 +1,378 @@
+"""
+Content-addressed, compressed storage for battle interaction logs.
+
+Each interaction repeats the multi-kilobyte system prompt, and consecutive turns of a
+battle repeat prompt sections such as the team sets. Message contents are split into
+blocks at the prompt section titles; system prompts, and any other block seen a second
+time, are stored once in a blocks file keyed by their sha256 and referenced from the
+records. Records go into compressed segment files per log stream (the stem of today's
+JSONL file, e.g. "model_wins"), rotated by size. LogStoreReader rehydrates the records
+into the exact JSONL entries log_battle_interaction writes.
+
+Every flush ends the compressed member (gzip) or frame (zstd) of each segment it wrote
+to, so readers such as log_index can resume a growing segment at the end of its last
+complete member instead of decompressing it from the start.
+
+Layout under the store root:
+    blocks-<n>.jsonl.gz              {"hash": ..., "text": ...} per stored block
+    segments/<stream>.<n>.jsonl.gz   one record per interaction
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import zlib
+from collections import OrderedDict
+from prompt_layout import SECTION_TITLES
+
+
+DEFAULT_STORE_DIR = os.path.join("battle_logs", "store")
+COMPRESSIONS = ("gzip", "zstd")
+
+# Blocks are split off at lines that are prompt section titles
+_SECTION_SPLIT = re.compile(
+    r"(?=^(?:" + "|".join(re.escape(title) for title in sorted(set(SECTION_TITLES.values()))) + r")$)",
+    re.MULTILINE,
+)
+
+
+def _extension(compression):
+    return ".jsonl.gz" if compression == "gzip" else ".jsonl.zst"
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compression requires the zstandard package: pip install zstandard") from None
+    return zstandard
+
+
+def _open_append(path, compression, level):
+    """Open a new compressed text stream for appending."""
+    if compression == "gzip":
+        return gzip.open(path, "at", encoding="utf-8", compresslevel=level)
+    zstandard = _zstandard()
+    raw = open(path, "ab")
+    writer = zstandard.ZstdCompressor(level=level).stream_writer(raw, closefd=True)
+    return io.TextIOWrapper(writer, encoding="utf-8")
+
+
+def _open_read(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    zstandard = _zstandard()
+    # read_across_frames: a file appended to by several writers holds one frame per writer
+    reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+    return io.TextIOWrapper(reader, encoding="utf-8")
+
+
+def _read_lines(path):
+    """JSON lines of a compressed file, stopping quietly at a truncated tail (e.g. after a crash)."""
+    try:
+        with _open_read(path) as f:
+            for line in f:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+    except (EOFError, OSError):
+        return
+
+
+def _decompressor(path):
+    if path.endswith(".gz"):
+        return zlib.decompressobj(wbits=31)
+    return _zstandard().ZstdDecompressor().decompressobj()
+
+
+def complete_members(path: str, offset: int = 0, chunk_size: int = 1 << 20):
+    """
+    Yield (end offset, text) for each complete gzip member / zstd frame of a file after offset.
+
+    A member still being written (or cut short by a crash) is not yielded, so the last end
+    offset is where a later read can resume.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        decompressor = _decompressor(path)
+        parts = []
+        pending = b""
+        while True:
+            data = pending or f.read(chunk_size)
+            pending = b""
+            if not data:
+                return
+            start = offset
+            parts.append(decompressor.decompress(data))
+            if not decompressor.eof:
+                offset += len(data)
+                continue
+            unused = decompressor.unused_data
+            offset = start + len(data) - len(unused)
+            yield offset, b"".join(parts).decode("utf-8")
+            decompressor = _decompressor(path)
+            parts = []
+            pending = unused
+
+
+def block_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def split_blocks(content: str) -> list:
+    """Split message content into blocks at section title lines; "".join(blocks) == content."""
+    return [block for block in _SECTION_SPLIT.split(content) if block]
+
+
+_FILE_NAME = re.compile(r"^(?:blocks-|(?P<stream>.+)\.)(?P<number>\d{6})\.jsonl\.(?:gz|zst)$")
+
+
+def _segment_number(path):
+    return int(_FILE_NAME.match(os.path.basename(path)).group("number"))
+
+
+def _segment_stream(path):
+    return _FILE_NAME.match(os.path.basename(path)).group("stream")
+
+
+class SegmentStore:
+    """
+    Writer side of the store. Not thread-safe: use it from one thread, e.g. as the
+    store of a BatchedLogWriter.
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR, compression: str = "gzip", level: int = None,
+                 segment_bytes: int = 64 * 1024 * 1024, min_block_chars: int = 200, seen_blocks: int = 65536):
+        """
+        Args:
+            root: Store directory
+            compression: "gzip" or "zstd" (requires the zstandard package)
+            level: Compression level (default 6 for gzip, 10 for zstd)
+            segment_bytes: Uncompressed size after which a segment is closed and the next one started
+            min_block_chars: Shorter blocks are always kept inline
+            seen_blocks: Hashes of inline blocks remembered to detect a second occurrence
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd":
+            _zstandard()
+        self.root = root
+        self.compression = compression
+        self.level = level if level is not None else (6 if compression == "gzip" else 10)
+        self.segment_bytes = segment_bytes
+        self.min_block_chars = min_block_chars
+        self.seen_blocks = seen_blocks
+        os.makedirs(os.path.join(root, "segments"), exist_ok=True)
+
+        # Hashes of stored blocks, and of blocks seen once (inline) that get stored on the next sighting
+        self._stored = set()
+        for path in glob.glob(os.path.join(root, "blocks-*")):
+            self._stored.update(block["hash"] for block in _read_lines(path))
+        self._seen = OrderedDict()
+
+        # Every writer appends to fresh files, so files from earlier runs are never reopened
+        existing = glob.glob(os.path.join(root, "blocks-*")) + glob.glob(os.path.join(root, "segments", "*"))
+        self._next_number = max((_segment_number(path) for path in existing
+                                 if _FILE_NAME.match(os.path.basename(path))), default=-1) + 1
+        self._blocks = None
+        self._segments = {}
+        self.records = 0
+        self.bytes_in = 0
+
+    def _new_number(self):
+        number = self._next_number
+        self._next_number += 1
+        return number
+
+    def _store_block(self, digest, text):
+        if self._blocks is None:
+            path = os.path.join(self.root, f"blocks-{self._new_number():06d}{_extension(self.compression)}")
+            self._blocks = _open_append(path, self.compression, self.level)
+        self._blocks.write(json.dumps({"hash": digest, "text": text}, ensure_ascii=False) + "\n")
+        self._stored.add(digest)
+
+    def _encode_block(self, block, always_store):
+        if len(block) < self.min_block_chars:
+            return block
+        digest = block_hash(block)
+        if digest in self._stored:
+            return {"ref": digest}
+        if always_store or digest in self._seen:
+            self._seen.pop(digest, None)
+            self._store_block(digest, block)
+            return {"ref": digest}
+        self._seen[digest] = None
+        if len(self._seen) > self.seen_blocks:
+            self._seen.popitem(last=False)
+        return block
+
+    def _encode_message(self, message):
+        content = message.get("content")
+        if not isinstance(content, str):
+            return message
+        # System prompts repeat across every interaction, so they are stored on first sight
+        always_store = message.get("role") == "system"
+        blocks = [self._encode_block(block, always_store) for block in split_blocks(content)]
+        if len(blocks) == 1 and isinstance(blocks[0], str):
+            return message
+        return {("blocks" if key == "content" else key): (blocks if key == "content" else value)
+                for key, value in message.items()}
+
+    def encode(self, entry: dict) -> dict:
+        """The stored form of a log entry: message contents replaced by blocks and block references."""
+        record = dict(entry)
+        if isinstance(record.get("messages"), list):
+            record["messages"] = [self._encode_message(message) for message in record["messages"]]
+        return record
+
+    def _segment(self, stream):
+        segment = self._segments.get(stream)
+        if segment is not None and segment[1] < self.segment_bytes:
+            return segment
+        if segment is not None:
+            segment[0].close()
+        path = os.path.join(self.root, "segments",
+                            f"{stream}.{self._new_number():06d}{_extension(self.compression)}")
+        # [handle, uncompressed bytes, path, written since the last flush]
+        segment = [_open_append(path, self.compression, self.level), 0, path, False]
+        self._segments[stream] = segment
+        return segment
+
+    def append(self, stream: str, entries: list):
+        """Append log entries (today's JSONL shape) to a stream."""
+        lines = "".join(json.dumps(self.encode(entry), ensure_ascii=False) + "\n" for entry in entries)
+        segment = self._segment(stream)
+        segment[0].write(lines)
+        segment[1] += len(lines)
+        segment[3] = True
+        self.records += len(entries)
+        self.bytes_in += len(lines)
+
+    def flush(self, fsync: bool = False):
+        """
+        Flush blocks before segments, so a flushed record never references an unflushed block.
+        Segments written to since the last flush get their member/frame ended (see complete_members).
+        """
+        if self._blocks is not None:
+            self._blocks.flush()
+            if fsync:
+                os.fsync(self._blocks.fileno())
+        for segment in self._segments.values():
+            if not segment[3]:
+                continue
+            segment[0].close()
+            if fsync:
+                with open(segment[2], "rb") as f:
+                    os.fsync(f.fileno())
+            segment[0] = _open_append(segment[2], self.compression, self.level)
+            segment[3] = False
+
+    def close(self):
+        self.flush()
+        for segment in self._segments.values():
+            segment[0].close()
+        self._segments.clear()
+        if self._blocks is not None:
+            self._blocks.close()
+            self._blocks = None
+
+
+def stream_for_path(path: str) -> str:
+    """Log stream name for a JSONL path written by log_battle_interaction."""
+    name = os.path.basename(path)
+    return name[:-len(".jsonl")] if name.endswith(".jsonl") else name
+
+
+class LogStoreReader:
+    """Reads a store back into today's JSONL entries."""
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = root
+        self._blocks = {}
+        for path in sorted(glob.glob(os.path.join(root, "blocks-*"))):
+            for block in _read_lines(path):
+                self._blocks[block["hash"]] = block["text"]
+
+    def segments(self, stream: str = None) -> list:
+        """Segment file paths of one stream (or all streams), oldest first."""
+        paths = [path for path in glob.glob(os.path.join(self.root, "segments", "*"))
+                 if _FILE_NAME.match(os.path.basename(path)) and (stream is None or _segment_stream(path) == stream)]
+        return sorted(paths, key=_segment_number)
+
+    def streams(self) -> list:
+        return sorted({_segment_stream(path) for path in self.segments()})
+
+    def _join(self, blocks):
+        return "".join(block if isinstance(block, str) else self._blocks[block["ref"]] for block in blocks)
+
+    def rehydrate(self, record: dict) -> dict:
+        """The JSONL entry a stored record was encoded from."""
+        entry = dict(record)
+        if isinstance(entry.get("messages"), list):
+            messages = []
+            for message in entry["messages"]:
+                if "blocks" in message:
+                    message = {("content" if key == "blocks" else key):
+                               (self._join(value) if key == "blocks" else value)
+                               for key, value in message.items()}
+                messages.append(message)
+            entry["messages"] = messages
+        return entry
+
+    def segment_records_from(self, path: str, offset: int = 0, rehydrate: bool = True):
+        """
+        Yield (end offset, entries) per complete member of a segment after the compressed offset,
+        to resume reading a segment that is still growing.
+        """
+        for end, text in complete_members(path, offset):
+            records = [json.loads(line) for line in text.splitlines() if line]
+            yield end, [self.rehydrate(record) for record in records] if rehydrate else records
+
+    def segment_records(self, path: str, rehydrate: bool = True):
+        """Yield the entries of one segment file (as stored, if rehydrate is False)."""
+        for record in _read_lines(path):
+            yield self.rehydrate(record) if rehydrate else record
+
+    def records(self, stream: str = None):
+        """Yield rehydrated entries of one stream (or all streams), oldest segment first."""
+        for path in self.segments(stream):
+            yield from self.segment_records(path)
+
+    def export_jsonl(self, out_dir: str):
+        """Write every stream back out as <stream>.jsonl, as log_battle_interaction would have."""
+        os.makedirs(out_dir, exist_ok=True)
+        for stream in self.streams():
+            with open(os.path.join(out_dir, f"{stream}.jsonl"), "w", encoding="utf-8") as f:
+                for entry in self.records(stream):
+                    json.dump(entry, f, ensure_ascii=False)
+                    f.write("\n")
+
+
+def iter_log_records(logs_dir: str = "battle_logs"):
+    """All interaction entries under logs_dir: plain JSONL files, then the store if there is one."""
+    for path in sorted(glob.glob(os.path.join(logs_dir, "*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    store_dir = os.path.join(logs_dir, "store")
+    if os.path.isdir(store_dir):
+        yield from LogStoreReader(store_dir).records()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rehydrate a compressed battle log store into JSONL files")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="Store directory")
+    parser.add_argument("--out", default="battle_logs_export", help="Directory for the <stream>.jsonl files")
+    args = parser.parse_args()
+
+    reader = LogStoreReader(args.store)
+    reader.export_jsonl(args.out)
+    print(f"Exported {len(reader.streams())} streams to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from log_store import stream_for_path
+
+# Sentinel telling the writer thread to drain and exit
+_STOP = object()
+# Marks a queued task (see BatchedLogWriter.submit)
+_TASK = object()
+
+
+class _TaskEntries:
+    """Collects the entries a task writes, so the writer thread can write them as one batch."""
+
+    def __init__(self):
+        self.batch = []
+
+    def write(self, path, entry):
+        self.batch.append((path, entry, time.monotonic()))
+
+
+class BatchedLogWriter:
+    """
+    Background JSONL writer for battle interaction logs.
+
+    write() only enqueues the entry, so callers on the event loop never touch the disk.
+    A dedicated thread drains the queue in batches, serializes the entries, appends them
+    through file handles it keeps open per target file, and flushes on the configured
+    policy. close() drains everything still queued before returning.
+
+    With a store (log_store.SegmentStore), entries go to its compressed segments instead,
+    one stream per target file name.
+
+    submit() runs other file work (e.g. spool files) on the same thread, in order with the
+    queued entries.
+    """
+
+    def __init__(self, max_batch: int = 256, flush_interval: float = 1.0, fsync: bool = False,
+                 max_open_files: int = 64, latency_window: int = 1024, store=None):
+        """
+        Args:
+            max_batch: Most entries written per batch
+            flush_interval: Seconds between flushes of open files (0 = flush after every batch)
+            fsync: Also fsync files whenever they are flushed
+            max_open_files: Open handles kept (least recently used are closed)
+            latency_window: Recent entries used for the write latency percentiles
+            store: Optional SegmentStore the entries are appended to instead of JSONL files
+        """
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_open_files = max_open_files
+        self.store = store
+        self._queue = queue.Queue()
+        self._files = OrderedDict()
+        self._dirty = set()
+        self._store_dirty = False
+        self._last_flush = time.monotonic()
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="battle-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, path: str, entry: dict):
+        """Queue one JSON entry to be appended to path as a line."""
+        if self._closed:
+            raise RuntimeError("Log writer is closed")
+        self._queue.put((path, entry, time.monotonic()))
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def submit(self, task, on_written=None):
+        """
+        Run task(entries) on the writer thread, after everything queued before it.
+
+        Entries the task writes with entries.write(path, entry) are written as one batch.
+        on_written() is then called once they are flushed (and not at all if the task or a
+        write failed), so it can safely delete the data they came from.
+        """
+        if self._closed:
+            raise RuntimeError("Log writer is closed")
+        self._queue.put((_TASK, (task, on_written), time.monotonic()))
+
+    def _run_task(self, task, on_written):
+        entries = _TaskEntries()
+        errors = self.errors
+        try:
+            task(entries)
+        except Exception as e:
+            self.errors += 1
+            print(f"Battle log task failed: {e!r}")
+            return
+        if entries.batch:
+            self._write_batch(entries.batch)
+        if on_written is None or self.errors != errors:
+            return
+        self._flush()
+        try:
+            on_written()
+        except OSError as e:
+            print(f"Battle log task cleanup failed: {e}")
+
+    def _handle(self, path):
+        handle = self._files.get(path)
+        if handle is not None:
+            self._files.move_to_end(path)
+            return handle
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handle = open(path, "a", encoding="utf-8")
+        self._files[path] = handle
+        while len(self._files) > self.max_open_files:
+            old_path, old_handle = self._files.popitem(last=False)
+            self._flush_file(old_path, old_handle)
+            old_handle.close()
+        return handle
+
+    def _flush_file(self, path, handle):
+        handle.flush()
+        if self.fsync:
+            os.fsync(handle.fileno())
+        self._dirty.discard(path)
+
+    def _flush(self):
+        if self._store_dirty:
+            self.store.flush(fsync=self.fsync)
+            self._store_dirty = False
+        for path in list(self._dirty):
+            self._flush_file(path, self._files[path])
+        self._last_flush = time.monotonic()
+
+    def _write_store_batch(self, batch):
+        entries = {}
+        for path, entry, _ in batch:
+            entries.setdefault(stream_for_path(path), []).append(entry)
+        for stream, stream_entries in entries.items():
+            try:
+                self.store.append(stream, stream_entries)
+                self._store_dirty = True
+            except OSError as e:
+                self.errors += len(stream_entries)
+                print(f"Failed to write battle log stream {stream}: {e}")
+
+    def _write_batch(self, batch):
+        if self.store is not None:
+            self._write_store_batch(batch)
+            self._finish_batch(batch)
+            return
+
+        # Group by file so each file gets a single write call per batch
+        lines = {}
+        for path, entry, _ in batch:
+            lines.setdefault(path, []).append(json.dumps(entry, ensure_ascii=False) + "\n")
+        for path, path_lines in lines.items():
+            try:
+                self._handle(path).write("".join(path_lines))
+                self._dirty.add(path)
+            except OSError as e:
+                self.errors += len(path_lines)
+                print(f"Failed to write battle log {path}: {e}")
+        self._finish_batch(batch)
+
+    def _finish_batch(self, batch):
+        if self.flush_interval <= 0 or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+        done = time.monotonic()
+        with self._lock:
+            self._latencies.extend(done - queued_at for _, _, queued_at in batch)
+            self.written += len(batch)
+            self.batches += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                # Wake up at least once per flush interval so idle files still get flushed
+                item = self._queue.get(timeout=self.flush_interval or None)
+            except queue.Empty:
+                if self._dirty or self._store_dirty:
+                    self._flush()
+                continue
+            batch = []
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif item[0] is _TASK:
+                    if batch:
+                        self._write_batch(batch)
+                        batch = []
+                    self._run_task(*item[1])
+                else:
+                    batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+
+        self._flush()
+        for handle in self._files.values():
+            handle.close()
+        self._files.clear()
+        if self.store is not None:
+            self.store.close()
+
+    def close(self, timeout: float = None):
+        """Write everything still queued, flush and close all files."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        """Queue depth and write latency (enqueue to written, seconds) metrics."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        count = len(latencies)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "written": self.written,
+            "batches": self.batches,
+            "errors": self.errors,
+            "open_files": len(self._files),
+            "latency_p50": latencies[count // 2] if count else 0.0,
+            "latency_p95": latencies[min(count - 1, int(count * 0.95))] if count else 0.0,
+            "latency_max": latencies[-1] if count else 0.0,
+        }
+
+
+_default_writer = None
+
+
+def get_default_writer() -> BatchedLogWriter:
+    """Return the process-wide log writer, creating it on first use (drained at exit)."""
+    global _default_writer
+    if _default_writer is None:
+        _default_writer = BatchedLogWriter()
+        atexit.register(close_default_writer)
+    return _default_writer
+
+
+def close_default_writer():
+    """Shutdown hook: drain and close the process-wide log writer if one was created."""
+    global _default_writer
+    if _default_writer is not None:
+        _default_writer.close()
+        _default_writer = None
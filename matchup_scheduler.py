@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+# Matchups running at once per provider when no limit is given (a local Ollama host usually serves one model)
+DEFAULT_PROVIDER_LIMITS = {"local": 1, "router": 4}
+
+# Player types that call a model provider; the others (random, simple, max) run locally and are uncapped
+PROVIDER_TYPES = ("local", "router")
+
+
+def matchup_providers(*configs) -> list:
+    """Providers a matchup between these player configs uses, e.g. ["local", "router"]."""
+    return sorted({config["type"] for config in configs if config["type"] in PROVIDER_TYPES})
+
+
+class MatchupScheduler:
+    """
+    Runs matchups concurrently under a global cap and per-provider caps.
+
+    A matchup holds one slot of the global cap and one slot of every provider it uses
+    for as long as it runs. Provider slots are acquired first, in a fixed order (so
+    matchups that share providers can't deadlock), and the global slot last, so matchups
+    queued behind a busy provider don't keep matchups on other providers from starting.
+    The set of matchups in flight is printed whenever one starts or finishes.
+    """
+
+    def __init__(self, max_concurrent: int = 4, provider_limits: dict = None, verbose: bool = True):
+        """
+        Args:
+            max_concurrent: Matchups running at once overall
+            provider_limits: Provider -> matchups running at once that use it (defaults to DEFAULT_PROVIDER_LIMITS)
+            verbose: Print the in-flight matchups as they change
+        """
+        limits = dict(DEFAULT_PROVIDER_LIMITS)
+        limits.update(provider_limits or {})
+        self._global = asyncio.Semaphore(max_concurrent)
+        self._providers = {provider: asyncio.Semaphore(limit) for provider, limit in limits.items()}
+        self.verbose = verbose
+        self.in_flight = {}
+        self.completed = 0
+        self.total = 0
+
+    def _progress(self, event, label):
+        if not self.verbose:
+            return
+        now = time.monotonic()
+        running = ", ".join(f"{name} ({now - started:.0f}s)" for name, started in self.in_flight.items())
+        print(f"  [{self.completed}/{self.total} done] {event}: {label} | in flight: {running or '-'}")
+
+    async def _run(self, label, providers, run):
+        semaphores = [self._providers[provider] for provider in sorted(providers) if provider in self._providers]
+        acquired = []
+        try:
+            for semaphore in semaphores:
+                await semaphore.acquire()
+                acquired.append(semaphore)
+            async with self._global:
+                self.in_flight[label] = time.monotonic()
+                self._progress("started", label)
+                try:
+                    return await run()
+                finally:
+                    del self.in_flight[label]
+                    self.completed += 1
+                    self._progress("finished", label)
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+    async def run_all(self, matchups: list) -> list:
+        """
+        Run every matchup and return their results in order.
+
+        If a matchup fails, the others still run to completion (so their battles are recorded and
+        their players are idle before the caller cleans up), then the first error is raised.
+
+        Args:
+            matchups: List of (label, providers, run) where run is a no-argument coroutine function
+        """
+        self.total += len(matchups)
+        results = await asyncio.gather(*(self._run(label, providers, run) for label, providers, run in matchups),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
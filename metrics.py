@@ -0,0 +1,288 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prefix of every exported metric name
+NAMESPACE = "chatot"
+
+# Latency quantiles reported for LLM requests
+QUANTILES = (0.5, 0.95, 0.99)
+
+DEFAULT_METRICS_PORT = 9108
+DEFAULT_SNAPSHOT_DIR = os.path.join("battle_logs", "metrics")
+
+
+def _quantile(ordered, q):
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class _Request:
+    """Context manager timing one LLM request and counting it as in flight."""
+
+    __slots__ = ("metrics", "model", "start")
+
+    def __init__(self, metrics, model):
+        self.metrics = metrics
+        self.model = model
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        with self.metrics._lock:
+            self.metrics._add("requests_in_flight", self.model, 1)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        latency = time.perf_counter() - self.start
+        with self.metrics._lock:
+            self.metrics._add("requests_in_flight", self.model, -1)
+            self.metrics._add("requests", self.model, 1)
+            if exc_type is not None:
+                self.metrics._add("request_errors", self.model, 1)
+            window = self.metrics._latencies.get(self.model)
+            if window is None:
+                window = self.metrics._latencies[self.model] = deque(maxlen=self.metrics.latency_window)
+            window.append(latency)
+            self.metrics._add("latency_sum", self.model, latency)
+        return False
+
+
+class Metrics:
+    """
+    In-process battle and LLM request metrics.
+
+    Counters and gauges are plain dict entries per model, updated under one lock; each
+    update costs about a microsecond, so collection stays on during tournaments. Battles
+    are counted per AI player, so a battle between two AI players counts for both models.
+    Latency quantiles come from the last latency_window requests per model, and the
+    battle and turn rates from event times within the last rate_window seconds.
+    """
+
+    def __init__(self, latency_window: int = 2048, rate_window: float = 60.0):
+        self.latency_window = latency_window
+        self.rate_window = rate_window
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._values = {}
+        self._latencies = {}
+        self._battle_times = deque(maxlen=100000)
+        self._turn_times = deque(maxlen=100000)
+
+    def _add(self, name, model, amount):
+        values = self._values.get(name)
+        if values is None:
+            values = self._values[name] = {}
+        values[model] = values.get(model, 0) + amount
+
+    def battle_started(self, model: str):
+        with self._lock:
+            self._add("battles_started", model, 1)
+            self._add("battles_in_flight", model, 1)
+
+    def battle_finished(self, model: str, outcome: str):
+        """Count a finished battle; outcome is "win", "loss" or "tie"."""
+        with self._lock:
+            self._add("battles_in_flight", model, -1)
+            self._add(f"battles_{outcome}", model, 1)
+            self._battle_times.append(time.monotonic())
+
+    def turn(self, model: str):
+        with self._lock:
+            self._add("turns", model, 1)
+            self._turn_times.append(time.monotonic())
+
+    def invalid_action(self, model: str):
+        with self._lock:
+            self._add("invalid_actions", model, 1)
+
+    def random_fallback(self, model: str):
+        with self._lock:
+            self._add("random_fallbacks", model, 1)
+
+    def request_error(self, model: str):
+        """Count a failed LLM request whose exception was handled by the caller."""
+        with self._lock:
+            self._add("request_errors", model, 1)
+
+    def request(self, model: str) -> _Request:
+        """Time an LLM request: `with metrics.request(model): ...`"""
+        return _Request(self, model)
+
+    def _rate(self, times, now):
+        cutoff = now - self.rate_window
+        return sum(1 for t in reversed(times) if t >= cutoff) if times else 0
+
+    def snapshot(self) -> dict:
+        """Every metric as plain JSON: totals, per-model values, rates and latency quantiles."""
+        now = time.monotonic()
+        with self._lock:
+            values = {name: dict(per_model) for name, per_model in self._values.items()}
+            latencies = {model: sorted(window) for model, window in self._latencies.items()}
+            battles_recent = self._rate(self._battle_times, now)
+            turns_recent = self._rate(self._turn_times, now)
+        # Rates over the window, or over the uptime while it is shorter than the window
+        span = min(self.rate_window, max(time.time() - self.started, 1e-9))
+        latency = {
+            model: {f"p{round(q * 100)}": _quantile(ordered, q) for q in QUANTILES}
+            for model, ordered in latencies.items() if ordered
+        }
+        return {
+            "timestamp": time.time(),
+            "uptime": time.time() - self.started,
+            "battles_per_minute": battles_recent / span * 60,
+            "turns_per_second": turns_recent / span,
+            "battles_in_flight": sum(values.get("battles_in_flight", {}).values()),
+            "requests_in_flight": sum(values.get("requests_in_flight", {}).values()),
+            "models": values,
+            "latency": latency,
+        }
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        values = snapshot["models"]
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {NAMESPACE}_{name} {help_text}")
+            lines.append(f"# TYPE {NAMESPACE}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                lines.append(f"{NAMESPACE}_{name}{{{label_text}}} {value}" if label_text
+                             else f"{NAMESPACE}_{name} {value}")
+
+        def per_model(name):
+            return [({"model": model}, value) for model, value in sorted(values.get(name, {}).items())]
+
+        family("battles_per_minute", "gauge", f"Battles finished per minute over the last {self.rate_window:.0f}s",
+               [({}, snapshot["battles_per_minute"])])
+        family("turns_per_second", "gauge", f"Turns decided per second over the last {self.rate_window:.0f}s",
+               [({}, snapshot["turns_per_second"])])
+        family("battles_started_total", "counter", "Battles started", per_model("battles_started"))
+        family("battles_finished_total", "counter", "Battles finished by outcome",
+               [({"model": model, "outcome": outcome}, value)
+                for outcome in ("win", "loss", "tie")
+                for model, value in sorted(values.get(f"battles_{outcome}", {}).items())])
+        family("battles_in_flight", "gauge", "Battles in progress", per_model("battles_in_flight"))
+        family("turns_total", "counter", "Turns decided", per_model("turns"))
+        family("invalid_actions_total", "counter", "Model decisions naming an unavailable action",
+               per_model("invalid_actions"))
+        family("random_fallbacks_total", "counter", "Turns played with a random move instead of the model's",
+               per_model("random_fallbacks"))
+        family("llm_requests_in_flight", "gauge", "LLM requests in progress", per_model("requests_in_flight"))
+        family("llm_request_errors_total", "counter", "LLM requests that failed", per_model("request_errors"))
+        summary = []
+        for model, quantiles in sorted(snapshot["latency"].items()):
+            for q in QUANTILES:
+                summary.append(({"model": model, "quantile": str(q)}, quantiles[f"p{round(q * 100)}"]))
+        lines.append(f"# HELP {NAMESPACE}_llm_request_seconds LLM request latency "
+                     f"(quantiles over the last {self.latency_window} requests)")
+        lines.append(f"# TYPE {NAMESPACE}_llm_request_seconds summary")
+        for labels, value in summary:
+            lines.append(f'{NAMESPACE}_llm_request_seconds{{model="{_escape(labels["model"])}",'
+                         f'quantile="{labels["quantile"]}"}} {value}')
+        for model, value in sorted(values.get("latency_sum", {}).items()):
+            lines.append(f'{NAMESPACE}_llm_request_seconds_sum{{model="{_escape(model)}"}} {value}')
+            lines.append(f'{NAMESPACE}_llm_request_seconds_count{{model="{_escape(model)}"}} '
+                         f'{values.get("requests", {}).get(model, 0)}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsServer:
+    """Serves Metrics.prometheus() at http://<host>:<port>/metrics from a daemon thread."""
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = DEFAULT_METRICS_PORT):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class SnapshotWriter:
+    """Appends a Metrics.snapshot() line to <directory>/metrics-<pid>.jsonl every interval seconds."""
+
+    def __init__(self, metrics: Metrics, directory: str = DEFAULT_SNAPSHOT_DIR, interval: float = 30.0):
+        self.metrics = metrics
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"metrics-{os.getpid()}.jsonl")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshots", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.metrics.snapshot()) + "\n")
+
+    def close(self):
+        """Stop the thread and write a final snapshot."""
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+
+_default_metrics = Metrics()
+_exporters = []
+
+
+def get_metrics() -> Metrics:
+    """Process-wide metrics registry that AIPlayer reports to."""
+    return _default_metrics
+
+
+def start_metrics(port: int = DEFAULT_METRICS_PORT, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR,
+                  interval: float = 30.0, host: str = "127.0.0.1") -> Metrics:
+    """
+    Expose the process-wide metrics.
+
+    Args:
+        port: Port of the Prometheus endpoint (None disables it; if it can't be bound, a warning
+            is printed and the run continues without it)
+        snapshot_dir: Directory of the periodic snapshot files (None disables them)
+        interval: Seconds between snapshots
+        host: Interface the endpoint listens on
+    """
+    if port is not None:
+        try:
+            _exporters.append(MetricsServer(_default_metrics, host, port))
+        except OSError as e:
+            # A busy port (e.g. another tournament on this machine) must not stop the run
+            print(f"Warning: metrics endpoint not started on {host}:{port}: {e}")
+    if snapshot_dir is not None:
+        _exporters.append(SnapshotWriter(_default_metrics, snapshot_dir, interval))
+    return _default_metrics
+
+
+def stop_metrics():
+    """Stop the endpoint and snapshot thread started by start_metrics (writing a last snapshot)."""
+    while _exporters:
+        _exporters.pop().close()
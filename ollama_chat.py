@@ -1,33 +1,145 @@
 import asyncio
+import time
 from ollama import AsyncClient
+from streaming_decision import action_first
 
-async def local_choose_action(battle_messages: list, model: str) -> str:
-    client = AsyncClient()
-    response = await client.chat(
-        messages=battle_messages,
-        model=model,
-        format={
-            'properties': {
-                'reasoning': {
-                    'description': 'Explanation of why this action was chosen',
-                    'title': 'Reasoning',
-                    'type': 'string'
-                },
-                'action': {
-                    'description': 'The action to take - either use a move name or the name of the Pokemon to switch to',
-                    'title': 'Action',
-                    'type': 'string'
-                },
-                'scratchpad': {
-                    'description': 'Private notes and strategic considerations for future turns. This content will be provided back in subsequent turns.',
-                    'title': 'Scratchpad',
-                    'type': 'string'
-                }
-            },
-            'required': ['reasoning', 'action'],
-            'title': 'BattleDecision',
-            'type': 'object',
-            'additionalProperties': False
+# How long Ollama keeps a model loaded after the last request (duration string or seconds, -1 = forever)
+DEFAULT_KEEP_ALIVE = "30m"
+# Default number of in-flight requests per model, per host
+DEFAULT_MODEL_CONCURRENCY = 1
+
+BATTLE_DECISION_FORMAT = {
+    'properties': {
+        'reasoning': {
+            'description': 'Explanation of why this action was chosen',
+            'title': 'Reasoning',
+            'type': 'string'
+        },
+        'action': {
+            'description': 'The action to take - either use a move name or the name of the Pokemon to switch to',
+            'title': 'Action',
+            'type': 'string'
         },
-    )
+        'scratchpad': {
+            'description': 'Private notes and strategic considerations for future turns. This content will be provided back in subsequent turns.',
+            'title': 'Scratchpad',
+            'type': 'string'
+        }
+    },
+    'required': ['reasoning', 'action'],
+    'title': 'BattleDecision',
+    'type': 'object',
+    'additionalProperties': False
+}
+
+# Same schema with the action generated first, used in streaming mode
+ACTION_FIRST_FORMAT = action_first(BATTLE_DECISION_FORMAT)
+
+# One client per host and one semaphore per (host, model), shared by every player in the process
+_clients = {}
+_semaphores = {}
+_model_concurrency = {}
+
+
+def get_client(host: str = None) -> AsyncClient:
+    """Return the shared Ollama client for a host (None = OLLAMA_HOST or the local default)."""
+    if host not in _clients:
+        _clients[host] = AsyncClient(host=host)
+    return _clients[host]
+
+
+def set_model_concurrency(model: str, limit: int, host: str = None):
+    """
+    Set how many requests for a model may run at once on a host.
+    Must be called before the model's first request.
+    """
+    _model_concurrency[(host, model)] = limit
+
+
+def _get_semaphore(model: str, host: str = None) -> asyncio.Semaphore:
+    key = (host, model)
+    if key not in _semaphores:
+        _semaphores[key] = asyncio.Semaphore(_model_concurrency.get(key, DEFAULT_MODEL_CONCURRENCY))
+    return _semaphores[key]
+
+
+def _options(temperature):
+    return {"temperature": temperature} if temperature is not None else None
+
+
+async def warm_up(model: str, host: str = None, keep_alive=DEFAULT_KEEP_ALIVE):
+    """Load a model into memory ahead of the first turn (an empty prompt only loads the model)."""
+    await get_client(host).generate(model=model, prompt="", keep_alive=keep_alive)
+
+
+async def close_clients():
+    """Shutdown hook: close every shared Ollama client."""
+    for client in _clients.values():
+        await client.close()
+    _clients.clear()
+    _semaphores.clear()
+
+
+async def local_choose_action(battle_messages: list, model: str, host: str = None,
+                              keep_alive=DEFAULT_KEEP_ALIVE, temperature: float = None,
+                              timing: dict = None) -> str:
+    """
+    Request a battle decision from a local Ollama model.
+
+    If timing is a dict, it is filled with "queue_wait" (time spent waiting for the
+    model's concurrency slot), "inference" (the chat request itself) and "load"
+    (model load time reported by Ollama), all in seconds.
+    """
+    semaphore = _get_semaphore(model, host)
+
+    queued = time.perf_counter()
+    async with semaphore:
+        started = time.perf_counter()
+        response = await get_client(host).chat(
+            messages=battle_messages,
+            model=model,
+            format=BATTLE_DECISION_FORMAT,
+            keep_alive=keep_alive,
+            options=_options(temperature),
+        )
+        finished = time.perf_counter()
+
+    if timing is not None:
+        timing["queue_wait"] = started - queued
+        timing["inference"] = finished - started
+        timing["load"] = (response.load_duration or 0) / 1e9
     return response.message.content
+
+
+async def local_stream_action(battle_messages: list, model: str, host: str = None,
+                              keep_alive=DEFAULT_KEEP_ALIVE, temperature: float = None,
+                              timing: dict = None):
+    """
+    Stream a battle decision from a local Ollama model using the action-first schema.
+    Yields content chunks as they arrive. timing is filled as in local_choose_action once the stream ends.
+    """
+    semaphore = _get_semaphore(model, host)
+
+    queued = time.perf_counter()
+    async with semaphore:
+        started = time.perf_counter()
+        load_duration = 0
+        stream = await get_client(host).chat(
+            messages=battle_messages,
+            model=model,
+            format=ACTION_FIRST_FORMAT,
+            keep_alive=keep_alive,
+            options=_options(temperature),
+            stream=True,
+        )
+        async for part in stream:
+            if part.message.content:
+                yield part.message.content
+            if part.done:
+                load_duration = part.load_duration or 0
+        finished = time.perf_counter()
+
+    if timing is not None:
+        timing["queue_wait"] = started - queued
+        timing["inference"] = finished - started
+        timing["load"] = load_duration / 1e9
@@ -1,51 +1,207 @@
 import asyncio
 import httpx
 import json
+import time
 from dotenv import load_dotenv
 import os
+from streaming_decision import action_first
 
 load_dotenv()
 
-async def router_choose_action(battle_messages: list, model: str) -> str:
-    async with httpx.AsyncClient(timeout=None) as client:
-        response = await client.post(
-            "https://openrouter.ai/api/v1/chat/completions",
+OPEN_ROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "action_response",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "reasoning": {
+                    "type": "string",
+                    "description": "Explanation of why this action was chosen"
+                },
+                "action": {
+                    "type": "string",
+                    "description": "The action to take - either use a move name or the name of the Pokemon to switch to"
+                },
+                "scratchpad": {
+                    "type": "string",
+                    "description": "Private notes and strategic considerations for future turns. This content will be provided back in subsequent turns."
+                }
+            },
+            "required": ["reasoning", "action"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Same schema with the action generated first, used in streaming mode
+ACTION_FIRST_RESPONSE_FORMAT = {
+    **RESPONSE_FORMAT,
+    "json_schema": {
+        **RESPONSE_FORMAT["json_schema"],
+        "schema": action_first(RESPONSE_FORMAT["json_schema"]["schema"])
+    }
+}
+
+
+class RouterClient:
+    """
+    Long-lived, pooled HTTP client for OpenRouter.
+
+    Connections are kept alive between decisions so only the first request to a host
+    pays connection setup and the TLS handshake. Call aclose() when done.
+    """
+
+    def __init__(self, url: str = OPEN_ROUTER_URL, api_key: str = None, http2: bool = False,
+                 connect_timeout: float = 10.0, read_timeout: float = 120.0,
+                 max_connections: int = 100, max_keepalive_connections: int = 20):
+        """
+        Args:
+            url: Chat completions endpoint (override to point at a local stub server)
+            api_key: OpenRouter API key. Defaults to the OPEN_ROUTER_KEY environment variable.
+            http2: Enable HTTP/2 (requires the 'h2' package)
+            connect_timeout: Seconds allowed to establish a connection
+            read_timeout: Seconds allowed between bytes of the response
+            max_connections: Maximum number of open connections in the pool
+            max_keepalive_connections: Maximum number of idle connections kept alive
+        """
+        self.url = url
+        self.api_key = api_key if api_key is not None else os.getenv("OPEN_ROUTER_KEY")
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_keepalive_connections),
             headers={
-                "Authorization": f"Bearer {os.getenv("OPEN_ROUTER_KEY")}",
+                "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json",
             },
-            json={
-                "model": model,
-                "messages": battle_messages,
-                "response_format": {
-                    "type": "json_schema",
-                    "json_schema": {
-                        "name": "action_response",
-                        "strict": True,
-                        "schema": {
-                            "type": "object",
-                            "properties": {
-                                "reasoning": {
-                                    "type": "string",
-                                    "description": "Explanation of why this action was chosen"
-                                },
-                                "action": {
-                                    "type": "string",
-                                    "description": "The action to take - either use a move name or the name of the Pokemon to switch to"
-                                },
-                                "scratchpad": {
-                                    "type": "string",
-                                    "description": "Private notes and strategic considerations for future turns. This content will be provided back in subsequent turns."
-                                }
-                            },
-                            "required": ["reasoning", "action"],
-                            "additionalProperties": False
-                        }
-                    }
-                }
-            }
         )
 
-    response.raise_for_status()
-    return response.json()["choices"][0]["message"]["content"]
+    async def choose_action(self, battle_messages: list, model: str, temperature: float = None,
+                            timing: dict = None) -> str:
+        """
+        Request a battle decision and return the raw JSON content of the reply.
+
+        Args:
+            battle_messages: Chat messages built by AIPlayer.write_prompt
+            model: OpenRouter model name
+            temperature: Sampling temperature (None = provider default)
+            timing: Optional dict filled with latency in seconds: "connect" (0 on a reused
+                    connection), "ttfb" (request sent to response headers received) and "total"
+        """
+        marks = {}
+        start = time.perf_counter()
+        response = await self._client.post(
+            self.url,
+            json=self._payload(battle_messages, model, RESPONSE_FORMAT, temperature),
+            extensions={"trace": self._tracer(marks)}
+        )
+        end = time.perf_counter()
+
+        if timing is not None:
+            self._fill_timing(timing, marks, start, end)
+
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def stream_action(self, battle_messages: list, model: str, temperature: float = None,
+                            timing: dict = None):
+        """
+        Request a battle decision as a server-sent event stream, using the action-first schema.
+        Yields content chunks as they arrive. timing is filled as in choose_action once the stream ends.
+        """
+        marks = {}
+        start = time.perf_counter()
+        async with self._client.stream(
+            "POST",
+            self.url,
+            json={**self._payload(battle_messages, model, ACTION_FIRST_RESPONSE_FORMAT, temperature),
+                  "stream": True},
+            extensions={"trace": self._tracer(marks)}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                # Skip keep-alive comments (": OPENROUTER PROCESSING") and blank separators
+                if not line.startswith("data: "):
+                    continue
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                if "error" in event:
+                    raise RuntimeError(f"OpenRouter stream error: {event['error']}")
+                content = event["choices"][0]["delta"].get("content")
+                if content:
+                    yield content
+        end = time.perf_counter()
+
+        if timing is not None:
+            self._fill_timing(timing, marks, start, end)
+
+    @staticmethod
+    def _payload(battle_messages: list, model: str, response_format: dict, temperature: float = None):
+        payload = {
+            "model": model,
+            "messages": battle_messages,
+            "response_format": response_format
+        }
+        if temperature is not None:
+            payload["temperature"] = temperature
+        return payload
+
+    @staticmethod
+    def _tracer(marks: dict):
+        async def trace(event_name, info):
+            # Event names look like "connection.connect_tcp.started" or "http11.receive_response_headers.complete"
+            marks.setdefault(event_name.split(".", 1)[1], time.perf_counter())
+        return trace
+
+    @staticmethod
+    def _fill_timing(timing: dict, marks: dict, start: float, end: float):
+        connect_end = marks.get("start_tls.complete", marks.get("connect_tcp.complete"))
+        connect_start = marks.get("connect_tcp.started")
+        request_start = marks.get("send_request_headers.started", start)
+        headers_end = marks.get("receive_response_headers.complete", end)
+        timing["connect"] = connect_end - connect_start if connect_start and connect_end else 0.0
+        timing["ttfb"] = headers_end - request_start
+        timing["total"] = end - start
+
+    async def aclose(self):
+        """Close all pooled connections."""
+        await self._client.aclose()
+
+
+_default_client = None
+
+
+def get_default_client() -> RouterClient:
+    """Return the process-wide RouterClient, creating it on first use."""
+    global _default_client
+    if _default_client is None:
+        _default_client = RouterClient()
+    return _default_client
+
+
+async def close_default_client():
+    """Shutdown hook: close the process-wide RouterClient if one was created."""
+    global _default_client
+    if _default_client is not None:
+        await _default_client.aclose()
+        _default_client = None
+
+
+async def router_choose_action(battle_messages: list, model: str, client: RouterClient = None,
+                               temperature: float = None, timing: dict = None) -> str:
+    client = client if client is not None else get_default_client()
+    return await client.choose_action(battle_messages, model, temperature=temperature, timing=timing)
+
 
+async def router_stream_action(battle_messages: list, model: str, client: RouterClient = None,
+                               temperature: float = None, timing: dict = None):
+    client = client if client is not None else get_default_client()
+    async for chunk in client.stream_action(battle_messages, model, temperature=temperature, timing=timing):
+        yield chunk
@@ -0,0 +1,60 @@
+import argparse
+from collections import defaultdict
+from tabulate import tabulate
+from log_store import iter_log_records
+
+# Turns whose shared prefix covers at least this fraction of the prompt count as likely cache hits
+CACHE_HIT_RATIO = 0.5
+
+
+def summarize(records):
+    """
+    Aggregate the prefix_stability measurements recorded in battle logs, per model.
+    Records logged before prefix tracking existed are skipped.
+    """
+    stats = defaultdict(lambda: {"turns": 0, "prefix_tokens": 0, "total_tokens": 0, "ratio_sum": 0.0,
+                                 "hit_latency": [], "miss_latency": []})
+    for record in records:
+        prefix = record.get("prefix_stability")
+        # The first turn of each battle has nothing to share a prefix with
+        if not prefix or prefix["prefix_bytes"] == 0:
+            continue
+        model = stats[record["model"]]
+        model["turns"] += 1
+        model["prefix_tokens"] += prefix["prefix_tokens"]
+        model["total_tokens"] += prefix["total_tokens"]
+        model["ratio_sum"] += prefix["prefix_ratio"]
+        total = record.get("latency", {}).get("total", record.get("latency", {}).get("inference"))
+        if total is not None:
+            bucket = "hit_latency" if prefix["prefix_ratio"] >= CACHE_HIT_RATIO else "miss_latency"
+            model[bucket].append(total)
+    return stats
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report prompt prefix stability (cache-hit potential) from battle logs")
+    parser.add_argument("--logs", default="battle_logs", help="Directory containing the JSONL battle logs (and/or a log store)")
+    args = parser.parse_args()
+
+    stats = summarize(iter_log_records(args.logs))
+    table = [["Model", "Turns", "Mean prefix ratio", "Cacheable tokens", f"Latency (ratio >= {CACHE_HIT_RATIO})",
+              f"Latency (ratio < {CACHE_HIT_RATIO})"]]
+    for model, model_stats in sorted(stats.items()):
+        hit, miss = _mean(model_stats["hit_latency"]), _mean(model_stats["miss_latency"])
+        table.append([
+            model,
+            model_stats["turns"],
+            f"{model_stats['ratio_sum'] / model_stats['turns']:.1%}",
+            f"{model_stats['prefix_tokens'] / model_stats['total_tokens']:.1%}" if model_stats["total_tokens"] else "-",
+            f"{hit:.2f}s" if hit is not None else "-",
+            f"{miss:.2f}s" if miss is not None else "-",
+        ])
+    print(tabulate(table, headers="firstrow", tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+from token_counting import approximate_tokens, count_cached
+
+# Section order for the user message, most stable first. Provider-side prompt caching
+# (and local KV caching) only reuses an unchanged prefix, so the static team sets come
+# right after the system prompt and the per-turn battle log goes last.
+STABLE_LAYOUT = ["team_sets", "scratchpad", "team_status", "observations", "actions", "battle_log"]
+
+# Original layout: recent events first, scratchpad last
+RECENT_FIRST_LAYOUT = ["battle_log", "observations", "team", "actions", "scratchpad"]
+
+LAYOUTS = {
+    "stable": STABLE_LAYOUT,
+    "recent_first": RECENT_FIRST_LAYOUT,
+}
+
+SECTION_TITLES = {
+    "battle_log": "Battle Log (Recent Events):",
+    "observations": "Observations:",
+    "team": "Team Status:",
+    "team_sets": "Team Sets:",
+    "team_status": "Team Status:",
+    "actions": "Available Actions:",
+    "scratchpad": "Scratchpad (from previous turn):",
+}
+
+def assemble_prompt(sections: dict, layout: str = "stable") -> str:
+    """
+    Join prompt sections in layout order. Missing or None sections are skipped.
+
+    Args:
+        sections: Section name -> body text (the battle log body is already indented lines)
+        layout: Name of a layout in LAYOUTS
+    """
+    prompt_parts = []
+    for name in LAYOUTS[layout]:
+        body = sections.get(name)
+        if body is None:
+            continue
+        prompt_parts.append(SECTION_TITLES[name])
+        if body:
+            prompt_parts.append(body)
+    return "\n".join(prompt_parts)
+
+
+def section_token_counts(sections: dict, count_tokens) -> dict:
+    """Token count of each present section, including its title line."""
+    return {
+        name: count_cached(count_tokens, SECTION_TITLES[name]) + (count_tokens(body) if body else 0)
+        for name, body in sections.items()
+        if body is not None
+    }
+
+
+def common_prefix_length(previous: str, current: str) -> int:
+    """Length of the longest common prefix of two strings."""
+    limit = min(len(previous), len(current))
+    if previous[:limit] == current[:limit]:
+        return limit
+    # Binary search on prefix equality (string slicing compares in C)
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if previous[:mid] == current[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+class PrefixStabilityTracker:
+    """
+    Measures how much of each battle's prompt is identical to the previous turn's.
+    That shared prefix is what a provider or local KV cache could reuse.
+    """
+
+    def __init__(self):
+        self._previous = {}
+
+    def record(self, battle_tag: str, messages: list) -> dict:
+        """Compare this turn's messages with the battle's previous turn and return the measurement."""
+        text = "\n".join(message["content"] for message in messages)
+        previous = self._previous.get(battle_tag)
+        self._previous[battle_tag] = text
+
+        prefix = common_prefix_length(previous, text) if previous is not None else 0
+        total_bytes = len(text.encode("utf-8"))
+        prefix_bytes = len(text[:prefix].encode("utf-8"))
+        return {
+            "prefix_bytes": prefix_bytes,
+            "total_bytes": total_bytes,
+            "prefix_ratio": prefix_bytes / total_bytes if total_bytes else 0.0,
+            "prefix_tokens": approximate_tokens(text[:prefix]),
+            "total_tokens": approximate_tokens(text),
+        }
+
+    def release(self, battle_tag: str):
+        self._previous.pop(battle_tag, None)
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from utils import load_yaml
+
+DEFAULT_PROMPTS_PATH = "prompts.yaml"
+DEFAULT_VARIANT = "agent"
+
+
+class FrozenMessage(dict):
+    """
+    A chat message dict that can't be modified after creation.
+    Subclasses dict so it still serializes with json and is accepted by the providers.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("FrozenMessage is immutable")
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    clear = _readonly
+    pop = _readonly
+    popitem = _readonly
+    setdefault = _readonly
+    update = _readonly
+    __ior__ = _readonly
+
+
+class PromptRegistry:
+    """
+    Process-wide cache of the prompts in prompts.yaml.
+
+    The file is parsed once and each variant (a top-level key with a system_prompt)
+    is turned into a pre-built system message. The file is only re-parsed when its
+    mtime changes, and the mtime itself is checked at most every check_interval seconds.
+    """
+
+    def __init__(self, yaml_path: str = DEFAULT_PROMPTS_PATH, check_interval: float = 1.0):
+        self.yaml_path = yaml_path
+        self.check_interval = check_interval
+        self._messages = {}
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, mtime):
+        prompts = load_yaml(self.yaml_path) or {}
+        self._messages = {
+            name: FrozenMessage(role="system", content=section["system_prompt"])
+            for name, section in prompts.items()
+            if isinstance(section, dict) and "system_prompt" in section
+        }
+        self._mtime = mtime
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            mtime = os.stat(self.yaml_path).st_mtime_ns
+            if mtime != self._mtime:
+                self._load(mtime)
+
+    def system_message(self, variant: str = DEFAULT_VARIANT) -> FrozenMessage:
+        """Return the pre-built system message for a prompt variant."""
+        self._refresh()
+        try:
+            return self._messages[variant]
+        except KeyError:
+            raise ValueError(f"Unknown prompt variant: {variant}. "
+                             f"Available: {', '.join(self._messages)}") from None
+
+    def variants(self):
+        """Return the names of all available prompt variants."""
+        self._refresh()
+        return list(self._messages)
+
+
+_registries = {}
+
+
+def get_registry(yaml_path: str = DEFAULT_PROMPTS_PATH) -> PromptRegistry:
+    """Return the shared registry for a prompts file, creating it on first use."""
+    key = os.path.abspath(yaml_path)
+    if key not in _registries:
+        _registries[key] = PromptRegistry(yaml_path)
+    return _registries[key]
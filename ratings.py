@@ -0,0 +1,113 @@
+import json
+import math
+import os
+
+DEFAULT_RATINGS_FILE = "ratings.json"
+
+INITIAL_RATING = 1500.0
+INITIAL_RD = 350.0
+# Lowest rating deviation a player can reach, so established ratings still move
+MIN_RD = 30.0
+# RD growth per run a player sits out (Glicko's c): an unplayed rating is uncertain again after ~100 runs
+RD_INFLATION = 34.6
+
+_Q = math.log(10) / 400
+
+
+def _g(rd):
+    return 1 / math.sqrt(1 + 3 * _Q * _Q * rd * rd / (math.pi * math.pi))
+
+
+def expected_score(rating: float, opponent_rating: float, opponent_rd: float) -> float:
+    """Glicko expected score of a player against an opponent."""
+    return 1 / (1 + 10 ** (-_g(opponent_rd) * (rating - opponent_rating) / 400))
+
+
+class RatingStore:
+    """
+    Glicko ratings kept in a JSON file across tournament runs.
+
+    Each player has a rating, a rating deviation (RD) and win/loss/tie counts. A series
+    between two players is one rating period, with each battle a game (ties score 0.5).
+    New players start at 1500 +/- 350, so their first few series move them quickly while
+    established ratings (low RD) barely change. Every call to new_run() widens the RD of
+    players that didn't play in the previous run.
+    """
+
+    def __init__(self, path: str = DEFAULT_RATINGS_FILE):
+        self.path = path
+        self.players = {}
+        self.run = 0
+        if path is not None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.players = state["players"]
+            self.run = state["run"]
+
+    def get(self, username: str) -> dict:
+        player = self.players.get(username)
+        if player is None:
+            player = self.players[username] = {"rating": INITIAL_RATING, "rd": INITIAL_RD, "series": 0,
+                                               "wins": 0, "losses": 0, "ties": 0, "last_run": self.run}
+        return player
+
+    def rating(self, username: str) -> float:
+        return self.get(username)["rating"]
+
+    def rd(self, username: str) -> float:
+        return self.get(username)["rd"]
+
+    def new_run(self):
+        """Start a tournament run, inflating the RD of players by the runs they've sat out."""
+        self.run += 1
+        for player in self.players.values():
+            idle_runs = self.run - player["last_run"] - 1
+            if idle_runs > 0:
+                player["rd"] = min(math.sqrt(player["rd"] ** 2 + RD_INFLATION ** 2 * idle_runs), INITIAL_RD)
+                player["last_run"] = self.run - 1
+
+    def record_series(self, username1: str, username2: str, battles: list):
+        """
+        Update both players from a series' battle outcomes ("p1", "p2", "tie"), then save.
+        """
+        if not battles:
+            return
+        player1 = self.get(username1)
+        player2 = self.get(username2)
+        scores = [{"p1": 1.0, "p2": 0.0}.get(outcome, 0.5) for outcome in battles]
+        update1 = self._update(player1, player2, scores)
+        update2 = self._update(player2, player1, [1 - score for score in scores])
+        for player, (rating, rd), wins, losses in ((player1, update1, "p1", "p2"), (player2, update2, "p2", "p1")):
+            player["rating"] = rating
+            player["rd"] = rd
+            player["series"] += 1
+            player["wins"] += battles.count(wins)
+            player["losses"] += battles.count(losses)
+            player["ties"] += len(battles) - battles.count("p1") - battles.count("p2")
+            player["last_run"] = self.run
+        self.save()
+
+    @staticmethod
+    def _update(player, opponent, scores):
+        """Glicko-1 update of player against one opponent over several games."""
+        g = _g(opponent["rd"])
+        expected = expected_score(player["rating"], opponent["rating"], opponent["rd"])
+        d_squared = 1 / (_Q * _Q * g * g * expected * (1 - expected) * len(scores))
+        denominator = 1 / player["rd"] ** 2 + 1 / d_squared
+        rating = player["rating"] + _Q / denominator * g * sum(score - expected for score in scores)
+        rd = max(math.sqrt(1 / denominator), MIN_RD)
+        return rating, rd
+
+    def ranking(self, usernames: list = None) -> list:
+        """(username, player) pairs sorted by conservative rating (rating - 2 RD), best first."""
+        usernames = usernames if usernames is not None else list(self.players)
+        return sorted(((username, self.get(username)) for username in usernames),
+                      key=lambda item: item[1]["rating"] - 2 * item[1]["rd"], reverse=True)
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"run": self.run, "players": self.players}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,248 @@
+"""
+Tournament results as per-battle records and dense NumPy count matrices.
+
+Battles are stored as three parallel arrays (first player, second player, first player's
+score: 1 win, 0 loss, 0.5 tie). Win/tie/battle matrices are built from them with one
+bincount, and Bradley–Terry strengths (reported on the Elo scale) are fitted with
+vectorized minorization–maximization updates. Bootstrap confidence intervals resample
+the battles and fit every replicate at once as a (replicates, players, players) batch.
+"""
+
+import csv
+import json
+import os
+import numpy as np
+from sequential_testing import wilson_interval
+
+# Elo scale of the Bradley–Terry ratings: 400 points = 10:1 odds, mean rating 1500
+ELO_SCALE = 400 / np.log(10)
+ELO_MEAN = 1500.0
+
+SCORES = {"p1": 1.0, "p2": 0.0, "tie": 0.5}
+
+
+def _fit(wins, prior, iterations, tol, initial=None):
+    """
+    Bradley–Terry MM fit (Hunter 2004) on a batch of score matrices.
+
+    Args:
+        wins: (..., P, P) array, wins[..., i, j] = score of i against j (ties count 0.5 each)
+        prior: Virtual games per player, spread over all opponents and split evenly; keeps
+            undefeated players finite and connects players that never met
+        initial: Optional (P,) log-strengths to start from (e.g. the full-sample fit for bootstrap replicates)
+    Returns:
+        (..., P) log-strengths with mean 0
+    """
+    n_players = wins.shape[-1]
+    if n_players < 2:
+        return np.zeros(wins.shape[:-1])
+    off_diagonal = 1 - np.eye(n_players)
+    wins = wins + prior / (2 * (n_players - 1)) * off_diagonal
+    games = wins + np.swapaxes(wins, -1, -2)
+    total_wins = wins.sum(-1)
+    strength = np.ones(wins.shape[:-1]) if initial is None else np.broadcast_to(np.exp(initial), wins.shape[:-1])
+    for _ in range(iterations):
+        denominator = (games / (strength[..., :, None] + strength[..., None, :])).sum(-1)
+        updated = total_wins / denominator
+        updated /= np.exp(np.log(updated).mean(-1, keepdims=True))
+        converged = np.max(np.abs(np.log(updated) - np.log(strength))) < tol
+        strength = updated
+        if converged:
+            break
+    log_strength = np.log(strength)
+    return log_strength - log_strength.mean(-1, keepdims=True)
+
+
+class TournamentResults:
+    """Per-battle outcomes of a tournament with count matrices and rating fits."""
+
+    def __init__(self, players: list):
+        self.players = list(players)
+        self.index = {player: i for i, player in enumerate(self.players)}
+        self._first = []
+        self._second = []
+        self._score = []
+        self._arrays = None
+        self._fits = {}
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint, players: list = None) -> "TournamentResults":
+        """Results from the battle outcomes of a TournamentCheckpoint."""
+        players = players or [config["username"] for config in checkpoint.state["player_configs"]]
+        results = cls(players)
+        for key, matchup in checkpoint.state["matchups"].items():
+            player1, player2 = key.split(" vs ", 1)
+            for outcome in matchup["battles"]:
+                results.add(player1, player2, SCORES[outcome])
+        return results
+
+    @classmethod
+    def from_win_rates(cls, win_rates: dict, n_battles: int, players: list = None) -> "TournamentResults":
+        """Approximate results from a win-rate matrix, assuming n_battles per pair (the rest are ties)."""
+        players = players or list(win_rates)
+        results = cls(players)
+        for i, player1 in enumerate(players):
+            for player2 in players[i + 1:]:
+                rate1, rate2 = win_rates[player1].get(player2), win_rates[player2].get(player1)
+                if rate1 is None or rate2 is None:
+                    continue
+                wins1, wins2 = round(rate1 * n_battles), round(rate2 * n_battles)
+                for score in [1.0] * wins1 + [0.0] * wins2 + [0.5] * (n_battles - wins1 - wins2):
+                    results.add(player1, player2, score)
+        return results
+
+    def add(self, player1: str, player2: str, score: float):
+        """Record one battle; score is player1's (1 win, 0 loss, 0.5 tie)."""
+        self._first.append(self.index[player1])
+        self._second.append(self.index[player2])
+        self._score.append(score)
+        self._arrays = None
+        self._fits.clear()
+
+    def arrays(self) -> tuple:
+        """(first player indices, second player indices, first player scores) as NumPy arrays."""
+        if self._arrays is None:
+            self._arrays = (np.asarray(self._first, dtype=np.intp), np.asarray(self._second, dtype=np.intp),
+                            np.asarray(self._score, dtype=np.float64))
+        return self._arrays
+
+    def __len__(self):
+        return len(self._score)
+
+    def _counts(self, first, second, weights):
+        n = len(self.players)
+        flat = first * n + second
+        return np.bincount(flat, weights=weights, minlength=n * n).reshape(n, n)
+
+    def counts(self) -> dict:
+        """
+        Dense count matrices: wins[i, j] battles i won against j, ties[i, j] (symmetric) and
+        battles[i, j] = wins[i, j] + wins[j, i] + ties[i, j].
+        """
+        first, second, score = self.arrays()
+        won = self._counts(first, second, (score == 1.0).astype(float)) \
+            + self._counts(second, first, (score == 0.0).astype(float))
+        tied = self._counts(first, second, (score == 0.5).astype(float))
+        tied = tied + tied.T
+        return {"wins": won, "ties": tied, "battles": won + won.T + tied}
+
+    def win_rates(self) -> np.ndarray:
+        """wins / battles for every pair (NaN where they haven't played)."""
+        counts = self.counts()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts["battles"] > 0, counts["wins"] / counts["battles"], np.nan)
+
+    def _score_matrix(self, first, second, score):
+        return self._counts(first, second, score) + self._counts(second, first, 1 - score)
+
+    def bradley_terry(self, prior: float = 1.0, n_bootstrap: int = 200, confidence: float = 0.95,
+                      seed: int = 0, iterations: int = 500, tol: float = 1e-6) -> dict:
+        """
+        Bradley–Terry ratings on the Elo scale with bootstrap confidence intervals.
+
+        Args:
+            prior: Virtual games per player (see _fit)
+            n_bootstrap: Replicates resampling the battles with replacement (0 skips the intervals)
+            confidence: Confidence level of the percentile intervals
+            seed: Seed of the bootstrap resampling
+
+        Returns:
+            {"rating": (P,), "low": (P,), "high": (P,)} arrays; low/high are None without bootstrap.
+            Fits are cached until the next add(), so e.g. printing and exporting fit once.
+        """
+        options = (prior, n_bootstrap, confidence, seed, iterations, tol)
+        if options not in self._fits:
+            self._fits[options] = self._bradley_terry(*options)
+        return self._fits[options]
+
+    def _bradley_terry(self, prior, n_bootstrap, confidence, seed, iterations, tol):
+        first, second, score = self.arrays()
+        log_strength = _fit(self._score_matrix(first, second, score), prior, iterations, tol)
+        rating = ELO_MEAN + ELO_SCALE * log_strength
+        low = high = None
+        if n_bootstrap and len(score):
+            n = len(self.players)
+            rng = np.random.default_rng(seed)
+            samples = rng.integers(0, len(score), size=(n_bootstrap, len(score)))
+            # One bincount for every replicate: offset each replicate's cells by its index
+            offsets = (np.arange(n_bootstrap) * n * n)[:, None]
+            cells = first[samples] * n + second[samples] + offsets
+            reverse = second[samples] * n + first[samples] + offsets
+            size = n_bootstrap * n * n
+            batch = (np.bincount(cells.ravel(), weights=score[samples].ravel(), minlength=size)
+                     + np.bincount(reverse.ravel(), weights=(1 - score[samples]).ravel(), minlength=size))
+            replicates = ELO_MEAN + ELO_SCALE * _fit(batch.reshape(n_bootstrap, n, n), prior, iterations, tol,
+                                                     initial=log_strength)
+            alpha = (1 - confidence) / 2
+            low, high = np.quantile(replicates, [alpha, 1 - alpha], axis=0)
+        return {"rating": rating, "low": low, "high": high}
+
+    def summary(self, confidence: float = 0.95, **fit_options) -> list:
+        """Per-player rows (best rating first): rating, interval, wins, losses, ties, battles, win rate."""
+        fit = self.bradley_terry(confidence=confidence, **fit_options)
+        counts = self.counts()
+        wins = counts["wins"].sum(1)
+        losses = counts["wins"].sum(0)
+        ties = counts["ties"].sum(1)
+        battles = counts["battles"].sum(1)
+        rows = []
+        for i in np.argsort(-fit["rating"]):
+            rows.append({
+                "player": self.players[i],
+                "rating": float(fit["rating"][i]),
+                "rating_low": float(fit["low"][i]) if fit["low"] is not None else None,
+                "rating_high": float(fit["high"][i]) if fit["high"] is not None else None,
+                "wins": int(wins[i]),
+                "losses": int(losses[i]),
+                "ties": int(ties[i]),
+                "battles": int(battles[i]),
+                "win_rate": float(wins[i] / battles[i]) if battles[i] else None,
+            })
+        return rows
+
+    def pair_intervals(self, confidence: float = 0.95) -> dict:
+        """(player, opponent) -> Wilson interval of player's win rate, for every pair that played."""
+        counts = self.counts()
+        intervals = {}
+        for i, j in zip(*np.nonzero(counts["battles"])):
+            intervals[self.players[i], self.players[j]] = wilson_interval(
+                int(counts["wins"][i, j]), int(counts["battles"][i, j]), confidence)
+        return intervals
+
+    def export(self, out_dir: str, confidence: float = 0.95, **fit_options) -> list:
+        """
+        Write battles.csv, win_matrix.csv, ratings.csv and results.json to out_dir.
+
+        Returns:
+            Paths written
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        first, second, score = self.arrays()
+        rows = self.summary(confidence=confidence, **fit_options)
+        counts = self.counts()
+        paths = [os.path.join(out_dir, name) for name in
+                 ("battles.csv", "win_matrix.csv", "ratings.csv", "results.json")]
+
+        with open(paths[0], "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["player1", "player2", "score"])
+            writer.writerows(zip(np.asarray(self.players)[first], np.asarray(self.players)[second], score))
+        with open(paths[1], "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["player"] + self.players)
+            for player, row in zip(self.players, counts["wins"]):
+                writer.writerow([player] + [int(value) for value in row])
+        with open(paths[2], "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["player"])
+            writer.writeheader()
+            writer.writerows(rows)
+        with open(paths[3], "w", encoding="utf-8") as f:
+            json.dump({
+                "players": self.players,
+                "confidence": confidence,
+                "ratings": rows,
+                "wins": counts["wins"].astype(int).tolist(),
+                "ties": counts["ties"].astype(int).tolist(),
+                "battles": counts["battles"].astype(int).tolist(),
+            }, f, indent=2, ensure_ascii=False)
+        return paths
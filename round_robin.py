@@ -1,6 +1,16 @@
 from random_team_builder import RandomTeamBuilder
 from tournament import cross_evaluate_with_random_teams, print_results
+from tournament_checkpoint import TournamentCheckpoint, matchup_key
+from sequential_testing import SequentialStopping
+from ratings import RatingStore
+from ladder import swiss_tournament, rating_ladder, print_ratings
+from sharded_runner import run_sharded_tournament
+from metrics import start_metrics, stop_metrics
+from tracing import tracer, install_signal_toggle
+from ai_players import close_provider_clients, close_log_writer
+import argparse
 import asyncio
+import signal
 
 
 # Model configurations - easy to add/remove models
@@ -49,9 +59,60 @@ INCLUDE_FORMATS=["OU", "UBER"]
 TEAM_SIZE = 4
 N_CHALLENGES = 3
 BATTLE_FORMAT = "gen3ubers"
+MAX_CONCURRENT_MATCHUPS = 4
+# Matchups running at once per provider ("local" = Ollama, "router" = OpenRouter)
+PROVIDER_LIMITS = {"local": 1, "router": 4}
+# Tournament state is saved here after every battle; run with --resume to continue a crashed run
+CHECKPOINT_FILE = "tournament_checkpoint.json"
+# Adaptive mode: stop a series once its winner is settled at ADAPTIVE_CONFIDENCE and spend the
+# saved battles on close matchups (up to MAX_BATTLES_PER_MATCHUP); N_CHALLENGES is then the average
+ADAPTIVE = False
+ADAPTIVE_CONFIDENCE = 0.95
+MIN_BATTLES_PER_MATCHUP = 2
+MAX_BATTLES_PER_MATCHUP = 10
+# Seed for team generation (None picks one, which is saved in the checkpoint)
+SEED = None
+# "round_robin" (every pair), "swiss" (SWISS_ROUNDS rounds of similar-score pairings) or
+# "ladder" (pair uncertain players with similarly rated ones until every RD <= LADDER_TARGET_RD)
+TOURNAMENT_MODE = "round_robin"
+SWISS_ROUNDS = None  # None: ceil(log2(players))
+LADDER_TARGET_RD = 75
+# Round robin on worker processes, one per entry: a Showdown "host:port" (or websocket URL), or None for
+# localhost:8000. Several entries may share a server. Empty runs everything in this process.
+SHARD_SERVERS = []
+MATCHUPS_PER_WORKER = 2
+# Live metrics: Prometheus text at http://localhost:METRICS_PORT/metrics (sharded workers use the
+# following ports) and a snapshot line every METRICS_INTERVAL seconds under METRICS_SNAPSHOT_DIR.
+# None disables either.
+METRICS_PORT = 9108
+METRICS_SNAPSHOT_DIR = "battle_logs/metrics"
+METRICS_INTERVAL = 30
+# Span tracing of every AI turn as Chrome trace / Perfetto JSON in TRACE_DIR (also toggled at runtime
+# with `kill -USR1 <pid>`); TRACE_PROFILE adds a cProfile dump of each battle's CPU-bound phases
+TRACE = False
+TRACE_PROFILE = False
+TRACE_DIR = "battle_logs/traces"
+# Per-battle outcomes, win matrix and Bradley-Terry ratings are exported here as CSV and JSON
+RESULTS_DIR = "tournament_results"
+# Glicko ratings, kept across runs and updated by every mode
+RATINGS_FILE = "ratings.json"
 
 
-async def main():
+async def main(resume: bool = False, mode: str = TOURNAMENT_MODE):
+    start_metrics(port=METRICS_PORT, snapshot_dir=METRICS_SNAPSHOT_DIR, interval=METRICS_INTERVAL)
+    tracer.trace_dir = TRACE_DIR
+    if TRACE:
+        tracer.enable(TRACE_DIR, profile=TRACE_PROFILE)
+    if hasattr(signal, "SIGUSR1"):
+        install_signal_toggle(asyncio.get_running_loop(), signal.SIGUSR1)
+    try:
+        await run_tournament(resume, mode)
+    finally:
+        stop_metrics()
+        tracer.disable()
+
+
+async def run_tournament(resume: bool, mode: str):
     # Initialize team builder
     print("Initializing Random Team Builder...")
     team_builder = RandomTeamBuilder(
@@ -60,18 +121,109 @@ async def main():
         include_formats=INCLUDE_FORMATS
     )
 
-    # Run cross-evaluation with random teams for each match
-    cross_evaluation = await cross_evaluate_with_random_teams(
-        player_configs=MODEL_CONFIGS,
-        team_builder=team_builder,
-        n_challenges=N_CHALLENGES,
-        battle_format=BATTLE_FORMAT,
-        team_size=TEAM_SIZE
-    )
+    ratings = RatingStore(RATINGS_FILE)
+
+    if mode != "round_robin":
+        if mode == "swiss":
+            scores = await swiss_tournament(
+                player_configs=MODEL_CONFIGS,
+                team_builder=team_builder,
+                ratings=ratings,
+                rounds=SWISS_ROUNDS,
+                n_challenges=N_CHALLENGES,
+                battle_format=BATTLE_FORMAT,
+                team_size=TEAM_SIZE,
+                max_concurrent_matchups=MAX_CONCURRENT_MATCHUPS,
+                provider_limits=PROVIDER_LIMITS
+            )
+        else:
+            scores = None
+            await rating_ladder(
+                player_configs=MODEL_CONFIGS,
+                team_builder=team_builder,
+                ratings=ratings,
+                target_rd=LADDER_TARGET_RD,
+                n_challenges=N_CHALLENGES,
+                battle_format=BATTLE_FORMAT,
+                team_size=TEAM_SIZE,
+                max_concurrent_matchups=MAX_CONCURRENT_MATCHUPS,
+                provider_limits=PROVIDER_LIMITS
+            )
+        await close_provider_clients()
+        close_log_writer()
+        print_ratings(ratings, [config["username"] for config in MODEL_CONFIGS], scores)
+        return
+
+    if resume:
+        checkpoint = TournamentCheckpoint.resume(CHECKPOINT_FILE, MODEL_CONFIGS, N_CHALLENGES, BATTLE_FORMAT, TEAM_SIZE)
+    else:
+        checkpoint = TournamentCheckpoint.start(CHECKPOINT_FILE, MODEL_CONFIGS, N_CHALLENGES, BATTLE_FORMAT, TEAM_SIZE,
+                                                seed=SEED)
+
+    stopping = None
+    if ADAPTIVE:
+        stopping = SequentialStopping(ADAPTIVE_CONFIDENCE, MIN_BATTLES_PER_MATCHUP, MAX_BATTLES_PER_MATCHUP)
+
+    if SHARD_SERVERS:
+        if stopping is not None:
+            raise ValueError("ADAPTIVE is not supported with SHARD_SERVERS")
+        cross_evaluation = await asyncio.to_thread(
+            run_sharded_tournament,
+            player_configs=MODEL_CONFIGS,
+            team_builder=team_builder,
+            server_urls=SHARD_SERVERS,
+            n_challenges=N_CHALLENGES,
+            battle_format=BATTLE_FORMAT,
+            team_size=TEAM_SIZE,
+            matchups_per_worker=MATCHUPS_PER_WORKER,
+            provider_limits=PROVIDER_LIMITS,
+            checkpoint=checkpoint,
+            metrics_port=METRICS_PORT,
+            metrics_snapshot_dir=METRICS_SNAPSHOT_DIR,
+            metrics_interval=METRICS_INTERVAL
+        )
+    else:
+        # Run cross-evaluation with random teams for each match
+        cross_evaluation = await cross_evaluate_with_random_teams(
+            player_configs=MODEL_CONFIGS,
+            team_builder=team_builder,
+            n_challenges=N_CHALLENGES,
+            battle_format=BATTLE_FORMAT,
+            team_size=TEAM_SIZE,
+            max_concurrent_matchups=MAX_CONCURRENT_MATCHUPS,
+            provider_limits=PROVIDER_LIMITS,
+            checkpoint=checkpoint,
+            stopping=stopping
+        )
+
+    # Close pooled OpenRouter and Ollama connections
+    await close_provider_clients()
+    # Drain queued battle interaction logs
+    close_log_writer()
 
     # Print results
-    print_results(cross_evaluation, MODEL_CONFIGS, N_CHALLENGES)
+    results = print_results(cross_evaluation, MODEL_CONFIGS, N_CHALLENGES, checkpoint=checkpoint,
+                            confidence=ADAPTIVE_CONFIDENCE)
+    paths = results.export(RESULTS_DIR, confidence=ADAPTIVE_CONFIDENCE)
+    print(f"Results written to {', '.join(paths)}")
+
+    # Feed every series not rated yet into the persistent ratings (a resumed run may already have)
+    keys = [(config1, config2, matchup_key(config1, config2))
+            for i, config1 in enumerate(MODEL_CONFIGS) for config2 in MODEL_CONFIGS[i + 1:]]
+    unrated = [(config1, config2, key) for config1, config2, key in keys if not checkpoint.rated(key)]
+    if len(unrated) == len(keys):
+        ratings.new_run()
+    for config1, config2, key in unrated:
+        ratings.record_series(config1["username"], config2["username"], checkpoint.battles(key))
+        checkpoint.mark_rated(key)
+    print_ratings(ratings, [config["username"] for config in MODEL_CONFIGS])
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Tournament between the configured players")
+    parser.add_argument("--resume", action="store_true", help=f"Continue the round robin saved in {CHECKPOINT_FILE}")
+    parser.add_argument("--mode", choices=["round_robin", "swiss", "ladder"], default=TOURNAMENT_MODE)
+    args = parser.parse_args()
+    if args.resume and args.mode != "round_robin":
+        parser.error("--resume only applies to round robin tournaments")
+    asyncio.run(main(resume=args.resume, mode=args.mode))
@@ -0,0 +1,72 @@
+import math
+from statistics import NormalDist
+
+
+def wilson_interval(wins: int, n: int, confidence: float = 0.95) -> tuple:
+    """Wilson score interval for a win rate of wins/n; (0, 1) when n is 0."""
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    p = wins / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+class SequentialStopping:
+    """
+    Adaptive battle counts for tournament matchups.
+
+    A series is settled once the Wilson interval of the first player's win rate no
+    longer contains 0.5, i.e. the winner is known at the given confidence. Settled
+    series stop early, and the battles they didn't use go to the closest unsettled
+    series, up to max_battles each.
+    """
+
+    def __init__(self, confidence: float = 0.95, min_battles: int = 2, max_battles: int = 10):
+        """
+        Args:
+            confidence: Confidence level of the Wilson interval
+            min_battles: Battles every series plays before it can stop
+            max_battles: Most battles a close series can be extended to
+        """
+        self.confidence = confidence
+        self.min_battles = min_battles
+        self.max_battles = max_battles
+
+    def interval(self, battles: list) -> tuple:
+        """Confidence interval of the first player's win rate over battle outcomes ("p1", "p2", "tie")."""
+        return wilson_interval(battles.count("p1"), len(battles), self.confidence)
+
+    def settled(self, battles: list) -> bool:
+        if len(battles) < self.min_battles:
+            return False
+        low, high = self.interval(battles)
+        return low > 0.5 or high < 0.5
+
+    def allocate(self, budget: int, series: dict) -> dict:
+        """
+        Split a battle budget over unsettled series, closest first.
+
+        Args:
+            budget: Battles left to hand out
+            series: Key -> battle outcomes so far
+
+        Returns:
+            Key -> extra battles for each series that gets any
+        """
+        open_series = sorted(
+            (key for key, battles in series.items() if not self.settled(battles) and len(battles) < self.max_battles),
+            key=lambda key: abs(series[key].count("p1") / max(len(series[key]), 1) - 0.5)
+        )
+        extra = {}
+        while budget > 0 and open_series:
+            for key in list(open_series):
+                if budget == 0:
+                    break
+                extra[key] = extra.get(key, 0) + 1
+                budget -= 1
+                if len(series[key]) + extra[key] >= self.max_battles:
+                    open_series.remove(key)
+        return extra
@@ -0,0 +1,275 @@
+"""
+Round robin tournament sharded across worker processes.
+
+The coordinator owns the tournament state (a TournamentCheckpoint) and hands matchups to
+worker processes, each running its own event loop, player pool and optionally its own
+Showdown server. Workers stream every battle outcome back as it finishes. If a worker
+dies, the battles its matchups still owed are put back in the queue and a replacement
+worker is started on the same server.
+"""
+
+import asyncio
+import multiprocessing
+import queue
+from collections import deque
+from typing import List, Dict
+from poke_env import ServerConfiguration
+from matchup_scheduler import DEFAULT_PROVIDER_LIMITS, matchup_providers
+from metrics import start_metrics, stop_metrics
+from tracing import tracer
+from random_team_builder import RandomTeamBuilder
+from tournament import PlayerFactory, PlayerPool, play_series
+from tournament_checkpoint import TournamentCheckpoint, matchup_key
+
+# Login server used with custom Showdown URLs (same as poke-env's localhost configuration)
+AUTHENTICATION_URL = "https://play.pokemonshowdown.com/action.php?"
+
+
+def server_configuration(url: str) -> ServerConfiguration:
+    """ServerConfiguration for "host:port" or a full websocket URL; None keeps poke-env's localhost default."""
+    if url is None:
+        return None
+    if "://" not in url:
+        url = f"ws://{url}/showdown/websocket"
+    return ServerConfiguration(url, AUTHENTICATION_URL)
+
+
+def _worker_main(worker_id, server_url, settings, tasks, events):
+    asyncio.run(_worker_loop(worker_id, server_url, settings, tasks, events))
+
+
+async def _worker_loop(worker_id, server_url, settings, tasks, events):
+    # Imported in the worker so each process gets its own provider clients and log writer
+    from ai_players import close_provider_clients, close_log_writer
+
+    if settings["metrics_port"] is not None or settings["metrics_snapshot_dir"] is not None:
+        start_metrics(port=settings["metrics_port"], snapshot_dir=settings["metrics_snapshot_dir"],
+                      interval=settings["metrics_interval"])
+    if settings["trace"] is not None:
+        tracer.enable(**settings["trace"])
+
+    factory = PlayerFactory(None, settings["battle_format"], settings["team_size"],
+                            server_configuration=server_configuration(server_url))
+    pool = PlayerPool(factory, tag=f"w{worker_id}_")
+    loop = asyncio.get_running_loop()
+    running = set()
+
+    async def play(task):
+        played = 0
+
+        def record(outcome):
+            nonlocal played
+            played += 1
+            events.put(("battle", worker_id, task["number"], outcome))
+
+        try:
+            await play_series(pool, task["config1"], task["config2"], task["teams"],
+                              lambda: played < task["battles"], record)
+        except Exception as e:
+            events.put(("failed", worker_id, task["number"], repr(e)))
+        else:
+            events.put(("done", worker_id, task["number"], None))
+
+    while True:
+        task = await loop.run_in_executor(None, tasks.get)
+        if task is None:
+            break
+        running.add(asyncio.create_task(play(task)))
+        running = {future for future in running if not future.done()}
+
+    await asyncio.gather(*running)
+    await pool.close()
+    await close_provider_clients()
+    close_log_writer()
+    stop_metrics()
+    tracer.disable()
+
+
+class _Worker:
+    def __init__(self, context, worker_id, slot, server_url, settings, events):
+        self.id = worker_id
+        self.slot = slot
+        self.server_url = server_url
+        self.tasks = context.Queue()
+        self.assigned = set()
+        self.process = context.Process(target=_worker_main, args=(worker_id, server_url, settings, self.tasks, events),
+                                       name=f"tournament-worker-{worker_id}", daemon=True)
+        self.process.start()
+
+
+def run_sharded_tournament(
+    player_configs: List[dict],
+    team_builder: RandomTeamBuilder,
+    server_urls: List[str],
+    n_challenges: int = 3,
+    battle_format: str = "gen3ubers",
+    team_size: int = 4,
+    matchups_per_worker: int = 2,
+    provider_limits: Dict[str, int] = None,
+    checkpoint: TournamentCheckpoint = None,
+    max_restarts: int = 3,
+    max_failures: int = 3,
+    metrics_port: int = None,
+    metrics_snapshot_dir: str = None,
+    metrics_interval: float = 30.0
+) -> Dict[str, Dict[str, float]]:
+    """
+    Play every matchup of a round robin on worker processes and merge the win-rate matrix.
+
+    Args:
+        player_configs: List of player configuration dictionaries
+        team_builder: RandomTeamBuilder instance (teams are drawn by the coordinator)
+        server_urls: One worker per entry: a Showdown "host:port" or websocket URL, or None for localhost
+        n_challenges: Number of challenges per player pair
+        battle_format: Battle format to use
+        team_size: Number of Pokemon per team
+        matchups_per_worker: Matchups a worker runs at once
+        provider_limits: Matchups using each provider at once across all workers,
+            overriding matchup_scheduler.DEFAULT_PROVIDER_LIMITS
+        checkpoint: Optional TournamentCheckpoint to save progress to (or resume from)
+        max_restarts: Replacement workers started per server after crashes
+        max_failures: Attempts per matchup before the tournament is aborted
+        metrics_port: If set, worker i serves its metrics on port metrics_port + 1 + i
+        metrics_snapshot_dir: If set, workers write metric snapshots there (one file per process)
+        metrics_interval: Seconds between the workers' snapshots
+
+    Returns:
+        Dictionary with win rates for each player pair, as cross_evaluate_with_random_teams
+
+    Raises:
+        RuntimeError: If a matchup keeps failing or every worker is gone
+    """
+    if checkpoint is None:
+        checkpoint = TournamentCheckpoint.start(None, player_configs, n_challenges, battle_format, team_size)
+    limits = dict(DEFAULT_PROVIDER_LIMITS)
+    limits.update(provider_limits or {})
+
+    pairs = [(config1, config2) for i, config1 in enumerate(player_configs) for config2 in player_configs[i + 1:]]
+    matchups = {number: pair for number, pair in enumerate(pairs, start=1)}
+    keys = {number: matchup_key(*pair) for number, pair in matchups.items()}
+    pending = deque(number for number, key in keys.items() if len(checkpoint.battles(key)) < n_challenges)
+    in_use = {provider: 0 for provider in limits}
+    failures = {}
+
+    print(f"\n{'='*80}")
+    print("Starting Sharded Round Robin Tournament")
+    print(f"{'='*80}")
+    print(f"Players: {len(player_configs)}")
+    print(f"Workers: {len(server_urls)} ({matchups_per_worker} matchups each)")
+    print(f"Total unique matchups: {len(pairs)} ({len(pending)} to play)")
+    print(f"Battles per matchup: {n_challenges}")
+    print(f"{'='*80}\n")
+
+    context = multiprocessing.get_context("spawn")
+    events = context.Queue()
+    settings = {"battle_format": battle_format, "team_size": team_size, "metrics_snapshot_dir": metrics_snapshot_dir,
+                "metrics_interval": metrics_interval,
+                # Workers trace if the coordinator does
+                "trace": {"trace_dir": tracer.trace_dir, "profile": tracer.profile} if tracer.enabled else None}
+    workers = {}
+    restarts = [0] * len(server_urls)
+    next_id = 0
+
+    def start_worker(slot):
+        nonlocal next_id
+        worker_settings = dict(settings, metrics_port=metrics_port + 1 + slot if metrics_port is not None else None)
+        worker = _Worker(context, next_id, slot, server_urls[slot], worker_settings, events)
+        workers[worker.id] = worker
+        next_id += 1
+
+    def providers(number):
+        return [provider for provider in matchup_providers(*matchups[number]) if provider in limits]
+
+    def fits(number):
+        return all(in_use[provider] < limits[provider] for provider in providers(number))
+
+    def unassign(worker, number):
+        worker.assigned.discard(number)
+        for provider in providers(number):
+            in_use[provider] -= 1
+
+    def dispatch():
+        for worker in workers.values():
+            while len(worker.assigned) < matchups_per_worker:
+                number = next((number for number in pending if fits(number)), None)
+                if number is None:
+                    return
+                pending.remove(number)
+                worker.assigned.add(number)
+                for provider in providers(number):
+                    in_use[provider] += 1
+                config1, config2 = matchups[number]
+                worker.tasks.put({
+                    "number": number,
+                    "config1": config1,
+                    "config2": config2,
+                    "teams": checkpoint.matchup_teams(keys[number], number, team_builder),
+                    "battles": n_challenges - len(checkpoint.battles(keys[number])),
+                })
+
+    def requeue(worker, number):
+        unassign(worker, number)
+        if len(checkpoint.battles(keys[number])) < n_challenges:
+            pending.appendleft(number)
+
+    def check_workers():
+        for worker in list(workers.values()):
+            if worker.process.is_alive():
+                continue
+            del workers[worker.id]
+            print(f"\n[Worker {worker.id}] exited with code {worker.process.exitcode}; "
+                  f"re-queueing {len(worker.assigned)} matchups")
+            for number in list(worker.assigned):
+                requeue(worker, number)
+            if restarts[worker.slot] < max_restarts:
+                restarts[worker.slot] += 1
+                start_worker(worker.slot)
+        if not workers and pending:
+            raise RuntimeError("Every tournament worker has exited")
+
+    for slot in range(len(server_urls)):
+        start_worker(slot)
+
+    try:
+        while pending or any(worker.assigned for worker in workers.values()):
+            dispatch()
+            try:
+                kind, worker_id, number, payload = events.get(timeout=0.5)
+            except queue.Empty:
+                check_workers()
+                continue
+            worker = workers.get(worker_id)
+            if worker is None or number not in worker.assigned:
+                continue  # Late message from a worker already given up on
+            config1, config2 = matchups[number]
+            if kind == "battle":
+                checkpoint.record_battle(keys[number], payload)
+                battles = checkpoint.battles(keys[number])
+                winner = {"p1": config1["username"], "p2": config2["username"]}.get(payload, "tie")
+                print(f"[Worker {worker_id}] {keys[number]}: battle {len(battles)}/{n_challenges} -> {winner}")
+            elif kind == "done":
+                requeue(worker, number)
+                battles = checkpoint.battles(keys[number])
+                print(f"\n[Matchup {number}/{len(pairs)}] {keys[number]}: "
+                      f"{battles.count('p1')}-{battles.count('p2')} (worker {worker_id})")
+            else:
+                failures[number] = failures.get(number, 0) + 1
+                print(f"\n[Worker {worker_id}] {keys[number]} failed ({failures[number]}/{max_failures}): {payload}")
+                if failures[number] >= max_failures:
+                    raise RuntimeError(f"Matchup {keys[number]} failed {max_failures} times: {payload}")
+                requeue(worker, number)
+            check_workers()
+    finally:
+        for worker in workers.values():
+            worker.tasks.put(None)
+        for worker in workers.values():
+            worker.process.join(timeout=30)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    results = {config["username"]: {config["username"]: None} for config in player_configs}
+    for number, (config1, config2) in matchups.items():
+        battles = checkpoint.battles(keys[number])
+        results[config1["username"]][config2["username"]] = battles.count("p1") / len(battles)
+        results[config2["username"]][config1["username"]] = battles.count("p2") / len(battles)
+    return results
@@ -0,0 +1,78 @@
+import json
+
+
+def action_first(schema: dict) -> dict:
+    """
+    Return a copy of a decision JSON schema with 'action' as the first property.
+    Structured-output backends generate properties in schema order, so the action
+    is complete long before the reasoning and scratchpad.
+    """
+    properties = schema["properties"]
+    reordered = {"action": properties["action"]}
+    reordered.update((name, value) for name, value in properties.items() if name != "action")
+    return {**schema, "properties": reordered}
+
+
+class ActionStreamParser:
+    """
+    Incremental JSON parser for a streamed decision object.
+
+    Chunks are fed as they arrive; the parser tracks the top-level object just enough
+    to notice when the string value of the action field is complete, so the move can
+    be committed before the rest of the object has been generated.
+    """
+
+    def __init__(self, field: str = "action"):
+        self.field = field
+        self.action = None
+        self._chunks = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._token = []
+        self._key_position = False
+        self._key = None
+
+    def feed(self, chunk: str):
+        """Consume a chunk of the response. Returns the action once it is complete, else None."""
+        self._chunks.append(chunk)
+        for char in chunk:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._string_done("".join(self._token))
+                    continue
+                if self._depth == 1:
+                    self._token.append(char)
+            elif char == '"':
+                self._in_string = True
+                self._token = []
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._key_position = True
+            elif char in "}]":
+                self._depth -= 1
+            elif self._depth == 1:
+                if char == ",":
+                    self._key_position = True
+                elif char == ":":
+                    self._key_position = False
+        return self.action
+
+    def _string_done(self, raw: str):
+        value = json.loads(f'"{raw}"')
+        if self._key_position:
+            self._key = value
+        elif self._key == self.field and self.action is None:
+            self.action = value
+
+    @property
+    def text(self) -> str:
+        """Everything received so far."""
+        return "".join(self._chunks)
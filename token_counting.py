@@ -0,0 +1,55 @@
+import re
+from functools import lru_cache
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def approximate_tokens(text: str) -> int:
+    """Rough token count (words and punctuation marks) for offline comparisons."""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def _tiktoken_counter(encoding_name: str):
+    try:
+        import tiktoken
+    except ImportError:
+        raise ImportError("The 'tiktoken' tokenizer requires the tiktoken package: pip install tiktoken") from None
+    encoding = tiktoken.get_encoding(encoding_name)
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def _huggingface_counter(tokenizer_file: str):
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        raise ImportError("The 'hf' tokenizer requires the tokenizers package: pip install tokenizers") from None
+    tokenizer = Tokenizer.from_file(tokenizer_file)
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def get_tokenizer(tokenizer="approx"):
+    """
+    Return a token counting function (text -> int).
+
+    Args:
+        tokenizer: Either a callable, or one of:
+            "approx"                  - word/punctuation count, no dependencies
+            "tiktoken:<encoding>"     - e.g. "tiktoken:o200k_base" (requires tiktoken)
+            "hf:<tokenizer.json path>" - a local Hugging Face tokenizer file (requires tokenizers)
+    """
+    if callable(tokenizer):
+        return tokenizer
+    if tokenizer == "approx":
+        return approximate_tokens
+    kind, _, name = tokenizer.partition(":")
+    if kind == "tiktoken":
+        return _tiktoken_counter(name or "o200k_base")
+    if kind == "hf":
+        return _huggingface_counter(name)
+    raise ValueError(f"Unknown tokenizer: {tokenizer}")
+
+
+@lru_cache(maxsize=64)
+def count_cached(count_tokens, text: str) -> int:
+    """Token count for text that repeats across turns (system prompt, section titles)."""
+    return count_tokens(text)
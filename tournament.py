@@ -1,18 +1,32 @@
-from poke_env import AccountConfiguration
+from poke_env import AccountConfiguration, ServerConfiguration
 from poke_env.player import RandomPlayer, SimpleHeuristicsPlayer, MaxBasePowerPlayer
 from ai_players import AIPlayer
+from ollama_chat import DEFAULT_KEEP_ALIVE, set_model_concurrency
+from decision_cache import DecisionCache
+from matchup_scheduler import MatchupScheduler, matchup_providers
+from tournament_checkpoint import TournamentCheckpoint, matchup_key
+from sequential_testing import SequentialStopping
+from results_engine import TournamentResults
 from random_team_builder import RandomTeamBuilder
 from tabulate import tabulate
 from typing import List, Dict
+import zlib
+
+# Longest username Showdown accepts (poke-env doesn't truncate, and waits for the exact name)
+MAX_USERNAME_LENGTH = 18
 
 
 class PlayerFactory:
     """Factory for creating Pokemon battle players with random teams."""
 
-    def __init__(self, team_builder: RandomTeamBuilder, battle_format: str = "gen3ubers", team_size: int = 4):
+    def __init__(self, team_builder: RandomTeamBuilder, battle_format: str = "gen3ubers", team_size: int = 4,
+                 decision_cache: DecisionCache = None, server_configuration: ServerConfiguration = None):
         self.team_builder = team_builder
         self.battle_format = battle_format
         self.team_size = team_size
+        self.decision_cache = decision_cache
+        # Showdown server the players connect to (None = localhost:8000)
+        self.server_configuration = server_configuration
 
     def create_player(self, config: dict, team: str = None):
         """
@@ -28,16 +42,31 @@ class PlayerFactory:
         if team is None:
             team = self.team_builder.generate_random_team(team_size=self.team_size)
 
+        if len(config["username"]) > MAX_USERNAME_LENGTH:
+            raise ValueError(f"Username {config['username']!r} is longer than Showdown's "
+                             f"{MAX_USERNAME_LENGTH} characters")
         account_config = AccountConfiguration(config["username"], None)
 
         if config["type"] == "local":
+            if "model_concurrency" in config:
+                set_model_concurrency(config["model"], config["model_concurrency"], host=config.get("ollama_host"))
             return AIPlayer.local(
                 model=config["model"],
                 verbosity=config.get("verbosity", False),
                 account_configuration=account_config,
                 battle_format=self.battle_format,
                 team=team,
-                max_turns=config.get("max_turns", 25)
+                max_turns=config.get("max_turns", 25),
+                prompt_variant=config.get("prompt_variant", "agent"),
+                ollama_host=config.get("ollama_host"),
+                keep_alive=config.get("keep_alive", DEFAULT_KEEP_ALIVE),
+                stream=config.get("stream", False),
+                temperature=config.get("temperature"),
+                decision_cache=self.decision_cache,
+                prompt_layout=config.get("prompt_layout", "stable"),
+                token_budget=config.get("token_budget"),
+                tokenizer=config.get("tokenizer", "approx"),
+                server_configuration=self.server_configuration
             )
         elif config["type"] == "router":
             return AIPlayer.router(
@@ -46,46 +75,191 @@ class PlayerFactory:
                 account_configuration=account_config,
                 battle_format=self.battle_format,
                 team=team,
-                max_turns=config.get("max_turns", 25)
+                max_turns=config.get("max_turns", 25),
+                prompt_variant=config.get("prompt_variant", "agent"),
+                stream=config.get("stream", False),
+                temperature=config.get("temperature"),
+                decision_cache=self.decision_cache,
+                prompt_layout=config.get("prompt_layout", "stable"),
+                token_budget=config.get("token_budget"),
+                tokenizer=config.get("tokenizer", "approx"),
+                server_configuration=self.server_configuration
             )
         elif config["type"] == "random":
             return RandomPlayer(
                 account_configuration=account_config,
                 battle_format=self.battle_format,
                 team=team,
-                max_concurrent_battles=0
+                max_concurrent_battles=0,
+                server_configuration=self.server_configuration
             )
         elif config["type"] == "simple":
             return SimpleHeuristicsPlayer(
                 account_configuration=account_config,
                 battle_format=self.battle_format,
                 team=team,
-                max_concurrent_battles=0
+                max_concurrent_battles=0,
+                server_configuration=self.server_configuration
             )
         elif config["type"] == "max":
             return MaxBasePowerPlayer(
                 account_configuration=account_config,
                 battle_format=self.battle_format,
                 team=team,
-                max_concurrent_battles=0
+                max_concurrent_battles=0,
+                server_configuration=self.server_configuration
             )
         else:
             raise ValueError(f"Unknown player type: {config['type']}")
 
 
+def pool_username(username: str, suffix: str, salt: int = 0) -> str:
+    """
+    username + suffix, shortened to MAX_USERNAME_LENGTH. A shortened base name ends in four
+    hex characters of its hash (salted, so a caller can retry after a collision), so long
+    names sharing a prefix still get distinct usernames.
+    """
+    room = MAX_USERNAME_LENGTH - len(suffix)
+    if room < 5:
+        raise ValueError(f"Username suffix {suffix!r} leaves no room for the name")
+    if len(username) > room:
+        digest = zlib.crc32(f"{username}:{salt}".encode("utf-8")) & 0xffff
+        username = username[:room - 4] + f"{digest:04x}"
+    return username + suffix
+
+
+class PlayerPool:
+    """
+    Keeps logged-in players alive across matchups, one per config unless it plays concurrent matchups.
+
+    Players are created on first use with a numbered username suffix (e.g. "grok_1") and
+    handed back after their matchup. The next matchup for the same config reuses an idle
+    player: its team is swapped for the new one and its battle history (which win_rate and
+    n_won_battles are computed from) is cleared, so no new websocket login is needed.
+    """
+
+    def __init__(self, factory: PlayerFactory, tag: str = ""):
+        """
+        Args:
+            factory: PlayerFactory that creates the players
+            tag: Inserted before the suffix number (e.g. "w2_" gives "grok_w2_1"), to keep
+                usernames unique when several pools share a Showdown server. Names are
+                shortened to fit Showdown's 18 characters (see pool_username)
+        """
+        self.factory = factory
+        self.tag = tag
+        self._idle = {}
+        self._created = {}
+        # Generated username -> config username, to catch two configs shortened to the same name
+        self._usernames = {}
+        self.players = []
+
+    def acquire(self, config: dict, team: str = None):
+        """
+        Get a player for config with the given team (a new random team if None).
+
+        Returns:
+            Player instance with no recorded battles
+        """
+        if team is None:
+            team = self.factory.team_builder.generate_random_team(team_size=self.factory.team_size)
+
+        idle = self._idle.get(config["username"])
+        if idle:
+            player = idle.pop()
+            player.update_team(team)
+            player.reset_battles()
+            return player
+
+        number = self._created[config["username"]] = self._created.get(config["username"], 0) + 1
+        config_copy = config.copy()
+        salt = 0
+        while True:
+            username = pool_username(config["username"], f"_{self.tag}{number}", salt)
+            if self._usernames.setdefault(username, config["username"]) == config["username"]:
+                break
+            salt += 1
+        config_copy["username"] = username
+        player = self.factory.create_player(config_copy, team)
+        self.players.append(player)
+        return player
+
+    def release(self, config: dict, player):
+        """Return a player after its matchup so later matchups can reuse it."""
+        self._idle.setdefault(config["username"], []).append(player)
+
+    async def close(self):
+        """Log every pooled player out of Showdown."""
+        for player in self.players:
+            await player.ps_client.stop_listening()
+        self.players = []
+        self._idle.clear()
+
+
+async def play_series(pool: PlayerPool, config1: dict, config2: dict, teams: list, keep_playing, record_battle):
+    """
+    Play battles between two players from the pool, one at a time with the same teams.
+
+    Args:
+        pool: PlayerPool to take the players from
+        config1: First player's configuration
+        config2: Second player's configuration
+        teams: The two players' team strings
+        keep_playing: Called before each battle; the series ends when it returns False
+        record_battle: Called with each battle's outcome ("p1", "p2" or "tie") as it finishes
+    """
+    # Reuse logged-in players from the pool with this series' teams
+    player1 = pool.acquire(config1, teams[0])
+    player2 = pool.acquire(config2, teams[1])
+
+    while keep_playing():
+        won_p1 = player1.n_won_battles
+        won_p2 = player2.n_won_battles
+        await player1.battle_against(player2, n_battles=1)
+        if player1.n_won_battles > won_p1:
+            record_battle("p1")
+        elif player2.n_won_battles > won_p2:
+            record_battle("p2")
+        else:
+            record_battle("tie")
+
+    # Players of a failed series may still have battles running, so only finished ones go back
+    pool.release(config1, player1)
+    pool.release(config2, player2)
+
+
 async def cross_evaluate_with_random_teams(
     player_configs: List[dict],
     team_builder: RandomTeamBuilder,
     n_challenges: int = 3,
     battle_format: str = "gen3ubers",
-    team_size: int = 4
+    team_size: int = 4,
+    decision_cache: DecisionCache = None,
+    max_concurrent_matchups: int = 4,
+    provider_limits: Dict[str, int] = None,
+    checkpoint: TournamentCheckpoint = None,
+    stopping: SequentialStopping = None
 ) -> Dict[str, Dict[str, float]]:
     """
     Custom cross-evaluation that generates random teams for each matchup.
 
-    This creates new players with random teams for each matchup, then runs
-    all n_challenges battles with those teams. This is different from the
-    default cross_evaluate which keeps the same teams throughout.
+    Each matchup gets fresh random teams and then runs all n_challenges battles
+    with those teams. This is different from the default cross_evaluate which
+    keeps the same teams throughout. Players come from a PlayerPool, so each one
+    logs in once and is reused (with its new team) across matchups; every
+    connection is closed when the tournament ends.
+
+    Matchups run concurrently, up to max_concurrent_matchups at once and at most
+    provider_limits[provider] at once among those using a given provider
+    ("local" for Ollama, "router" for OpenRouter).
+
+    With a checkpoint, teams and battle outcomes are saved after every battle. A
+    checkpoint loaded with TournamentCheckpoint.resume skips finished matchups and
+    plays only the remaining battles of partially finished ones, with their teams.
+
+    With stopping, n_challenges becomes the average battle budget per matchup: a
+    series ends as soon as its winner is settled, and the unused battles are
+    spent extending the closest series (see SequentialStopping).
 
     Args:
         player_configs: List of player configuration dictionaries
@@ -93,16 +267,26 @@ async def cross_evaluate_with_random_teams(
         n_challenges: Number of challenges per player pair
         battle_format: Battle format to use
         team_size: Number of Pokemon per team
+        decision_cache: Optional DecisionCache shared by all AI players
+        max_concurrent_matchups: Matchups running at once (1 runs them one after another)
+        provider_limits: Per-provider caps, overriding matchup_scheduler.DEFAULT_PROVIDER_LIMITS
+        checkpoint: Optional TournamentCheckpoint to save progress to (or resume from)
+        stopping: Optional SequentialStopping for adaptive battle counts
 
     Returns:
         Dictionary with win rates for each player pair
     """
-    factory = PlayerFactory(team_builder, battle_format, team_size)
     results = {config["username"]: {} for config in player_configs}
+    for config in player_configs:
+        # Self-play: mark as None
+        results[config["username"]][config["username"]] = None
+
+    if checkpoint is None:
+        checkpoint = TournamentCheckpoint.start(None, player_configs, n_challenges, battle_format, team_size)
 
     # Calculate only unique matchups (like built-in cross_evaluate)
-    total_matchups = len(player_configs) * (len(player_configs) - 1) // 2
-    current_matchup = 0
+    pairs = [(config1, config2) for i, config1 in enumerate(player_configs) for config2 in player_configs[i + 1:]]
+    total_matchups = len(pairs)
 
     print(f"\n{'='*80}")
     print(f"Starting Round Robin Tournament")
@@ -111,94 +295,152 @@ async def cross_evaluate_with_random_teams(
     print(f"Battles per matchup: {n_challenges}")
     print(f"Total unique matchups: {total_matchups}")
     print(f"Total battles: {total_matchups * n_challenges}")
+    print(f"Concurrent matchups: {max_concurrent_matchups}")
+    print(f"Seed: {checkpoint.seed}")
     print(f"{'='*80}\n")
 
-    # Cross-evaluate all pairs (only unique matchups)
-    for i, config1 in enumerate(player_configs):
-        for j, config2 in enumerate(player_configs):
-            if i == j:
-                # Self-play: mark as None
-                results[config1["username"]][config2["username"]] = None
-                continue
-
-            if j <= i:
-                # Skip reverse matchup (already played)
-                continue
-
-            current_matchup += 1
-
-            print(f"\n[Matchup {current_matchup}/{total_matchups}] {config1['username']} vs {config2['username']}")
-            print(f"{'-'*80}")
-            print(f"  Generating random teams for this matchup...", end=" ")
-
-            # Create players ONCE per matchup with unique usernames and random teams
-            # Add matchup number to username to avoid conflicts with previous matchups
-            config1_copy = config1.copy()
-            config2_copy = config2.copy()
-            config1_copy["username"] = f"{config1['username']}_{current_matchup}"
-            config2_copy["username"] = f"{config2['username']}_{current_matchup}"
-
-            player1 = factory.create_player(config1_copy)
-            player2 = factory.create_player(config2_copy)
-
-            print("Done!")
-
-            # Battle n_challenges times with the same teams
-            await player1.battle_against(player2, n_battles=n_challenges)
-
-            # Calculate win rates for both directions
-            win_rate_p1 = player1.win_rate
-            win_rate_p2 = player2.win_rate
-
-            results[config1["username"]][config2["username"]] = win_rate_p1
-            results[config2["username"]][config1["username"]] = win_rate_p2
-
-            print(f"  Results: {config1['username']} won {player1.n_won_battles}/{n_challenges} ({win_rate_p1:.1%})")
-            print(f"           {config2['username']} won {player2.n_won_battles}/{n_challenges} ({win_rate_p2:.1%})")
+    def record_results(matchup_number, config1, config2):
+        battles = checkpoint.battles(matchup_key(config1, config2))
+        n_won_p1 = battles.count("p1")
+        n_won_p2 = battles.count("p2")
+
+        # Calculate win rates for both directions
+        win_rate_p1 = n_won_p1 / len(battles)
+        win_rate_p2 = n_won_p2 / len(battles)
+
+        results[config1["username"]][config2["username"]] = win_rate_p1
+        results[config2["username"]][config1["username"]] = win_rate_p2
+
+        print(f"\n[Matchup {matchup_number}/{total_matchups}] {config1['username']} vs {config2['username']}")
+        print(f"  Results: {config1['username']} won {n_won_p1}/{len(battles)} ({win_rate_p1:.1%})")
+        print(f"           {config2['username']} won {n_won_p2}/{len(battles)} ({win_rate_p2:.1%})")
+        if stopping is not None:
+            low, high = stopping.interval(battles)
+            status = "settled" if stopping.settled(battles) else "open"
+            print(f"  {stopping.confidence:.0%} CI for {config1['username']}: [{low:.2f}, {high:.2f}] ({status})")
+
+    def done(key, target):
+        battles = checkpoint.battles(key)
+        return len(battles) >= target or (stopping is not None and stopping.settled(battles))
+
+    pool = PlayerPool(PlayerFactory(team_builder, battle_format, team_size, decision_cache))
+
+    async def play_matchup(matchup_number, config1, config2, target):
+        key = matchup_key(config1, config2)
+        teams = checkpoint.matchup_teams(key, matchup_number, team_builder)
+        await play_series(pool, config1, config2, teams, lambda: not done(key, target),
+                          lambda outcome: checkpoint.record_battle(key, outcome))
+        record_results(matchup_number, config1, config2)
+
+    async def play_round(targets):
+        scheduler = MatchupScheduler(max_concurrent_matchups, provider_limits)
+        await scheduler.run_all([
+            (f"{config1['username']} vs {config2['username']}", matchup_providers(config1, config2),
+             lambda number=number, config1=config1, config2=config2: play_matchup(number, config1, config2,
+                                                                                  targets[number]))
+            for number, (config1, config2) in enumerate(pairs, start=1) if number in targets
+        ])
+
+    keys = {number: matchup_key(config1, config2) for number, (config1, config2) in enumerate(pairs, start=1)}
+    remaining = {number: n_challenges for number, key in keys.items() if not done(key, n_challenges)}
+    for number, (config1, config2) in enumerate(pairs, start=1):
+        if checkpoint.battles(keys[number]) and number not in remaining:
+            record_results(number, config1, config2)
+    if len(remaining) < total_matchups:
+        print(f"\nResumed from {checkpoint.path}: {total_matchups - len(remaining)} matchups already finished\n")
+
+    try:
+        await play_round(remaining)
+
+        # Adaptive mode: battles saved by settled series go to the closest open ones
+        while stopping is not None:
+            series = {number: checkpoint.battles(key) for number, key in keys.items()}
+            budget = total_matchups * n_challenges - sum(len(battles) for battles in series.values())
+            extra = stopping.allocate(budget, series)
+            if not extra:
+                break
+            print(f"\nReallocating {sum(extra.values())} of {budget} unused battles to {len(extra)} open matchups\n")
+            await play_round({number: len(series[number]) + count for number, count in extra.items()})
+    finally:
+        await pool.close()
+
+    if decision_cache is not None:
+        stats = decision_cache.stats()
+        print(f"\nDecision cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
 
     return results
 
 
-def print_results(cross_evaluation: Dict[str, Dict[str, float]], player_configs: List[dict], n_challenges: int):
+def print_results(cross_evaluation: Dict[str, Dict[str, float]], player_configs: List[dict], n_challenges: int,
+                  checkpoint: TournamentCheckpoint = None, confidence: float = 0.95,
+                  n_bootstrap: int = 200) -> TournamentResults:
     """
-    Print tournament results in a formatted table with overall statistics.
+    Print tournament results in a formatted table with overall statistics and ratings.
 
     Args:
         cross_evaluation: Dictionary with win rates for each player pair
         player_configs: List of player configuration dictionaries
         n_challenges: Number of challenges per player pair
+        checkpoint: Optional TournamentCheckpoint of the tournament; when given, results come from
+            its battle outcomes and each win rate is shown with its Wilson confidence interval
+        confidence: Confidence level of the intervals
+        n_bootstrap: Bootstrap replicates for the rating intervals (0 skips them)
+
+    Returns:
+        The TournamentResults the tables were computed from (e.g. to export them)
     """
+    usernames = [config["username"] for config in player_configs]
+    if checkpoint is not None:
+        results = TournamentResults.from_checkpoint(checkpoint, usernames)
+        intervals = results.pair_intervals(confidence)
+    else:
+        results = TournamentResults.from_win_rates(cross_evaluation, n_challenges, usernames)
+        intervals = None
+    counts = results.counts()
+    win_rates = results.win_rates()
+
     print(f"\n\n{'='*80}")
     print("FINAL RESULTS - WIN RATE MATRIX")
     print(f"{'='*80}\n")
 
-    usernames = [config["username"] for config in player_configs]
     table = [["-"] + usernames]
-
-    for username in usernames:
+    for i, username in enumerate(usernames):
         row = [username]
-        for opponent in usernames:
-            win_rate = cross_evaluation[username][opponent]
-            row.append("-" if win_rate is None else f"{win_rate:.2f}")
+        for j, opponent in enumerate(usernames):
+            if i == j or not counts["battles"][i, j]:
+                row.append("-")
+            elif intervals is not None:
+                low, high = intervals[username, opponent]
+                row.append(f"{win_rates[i, j]:.2f} [{low:.2f}, {high:.2f}] n={int(counts['battles'][i, j])}")
+            else:
+                row.append(f"{win_rates[i, j]:.2f}")
         table.append(row)
 
     print(tabulate(table, headers="firstrow", tablefmt="grid"))
+    if intervals is not None:
+        print(f"\n[low, high]: {confidence:.0%} Wilson interval of the row player's win rate, n: battles played")
     print(f"\n{'='*80}")
 
     # Calculate overall statistics
     print("\nOVERALL STATISTICS")
     print(f"{'='*80}")
 
-    for username in usernames:
-        wins = 0
-        total = 0
-        for opponent in usernames:
-            if username != opponent:
-                win_rate = cross_evaluation[username][opponent]
-                wins += win_rate * n_challenges
-                total += n_challenges
+    wins = counts["wins"].sum(1)
+    totals = counts["battles"].sum(1)
+    for username, won, total in zip(usernames, wins, totals):
+        overall_win_rate = won / total if total > 0 else 0
+        print(f"{username:20} | Win Rate: {overall_win_rate:.1%} ({int(won)}/{int(total)} battles won)")
 
-        overall_win_rate = wins / total if total > 0 else 0
-        print(f"{username:20} | Win Rate: {overall_win_rate:.1%} ({int(wins)}/{total} battles won)")
+    print(f"{'='*80}\n")
 
+    # Bradley-Terry ratings on the Elo scale
+    print("RATINGS (Bradley-Terry, Elo scale)")
     print(f"{'='*80}\n")
+    rows = []
+    for rank, row in enumerate(results.summary(confidence=confidence, n_bootstrap=n_bootstrap), start=1):
+        interval = f"[{row['rating_low']:.0f}, {row['rating_high']:.0f}]" if row["rating_low"] is not None else "-"
+        rows.append([rank, row["player"], f"{row['rating']:.0f}", interval,
+                     f"{row['wins']}-{row['losses']}-{row['ties']}"])
+    print(tabulate(rows, headers=["Rank", "Player", "Rating", f"{confidence:.0%} CI", "W-L-T"], tablefmt="grid"))
+    print(f"\n{'='*80}\n")
+    return results
@@ -0,0 +1,106 @@
+import json
+import os
+import random
+
+DEFAULT_CHECKPOINT_FILE = "tournament_checkpoint.json"
+
+
+def matchup_key(config1: dict, config2: dict) -> str:
+    return f"{config1['username']} vs {config2['username']}"
+
+
+class TournamentCheckpoint:
+    """
+    Tournament state persisted after every completed battle.
+
+    Holds the player configs, tournament settings, RNG seed, and for each matchup its
+    teams and the outcome of every finished battle ("p1", "p2" or "tie"). Teams are
+    drawn from a per-matchup generator seeded from the tournament seed, so a resumed
+    run gets the same teams for matchups that had not started, and the stored teams
+    for those that had. Matchups whose series went into the persistent ratings are marked
+    as rated. The file is replaced atomically, so a crash mid-write leaves
+    the previous checkpoint intact. With path None nothing is written.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_FILE, state: dict = None):
+        self.path = path
+        self.state = state or {}
+
+    @classmethod
+    def start(cls, path: str, player_configs: list, n_challenges: int, battle_format: str, team_size: int,
+              seed: int = None) -> "TournamentCheckpoint":
+        """New checkpoint for a fresh tournament (replaces any existing file at path; None keeps it in memory)."""
+        checkpoint = cls(path, {
+            "seed": seed if seed is not None else random.randrange(2 ** 32),
+            "settings": {"n_challenges": n_challenges, "battle_format": battle_format, "team_size": team_size},
+            "player_configs": player_configs,
+            "matchups": {},
+        })
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def resume(cls, path: str, player_configs: list, n_challenges: int, battle_format: str,
+               team_size: int) -> "TournamentCheckpoint":
+        """
+        Load a checkpoint to continue its tournament.
+
+        Raises:
+            ValueError: If the checkpoint was written for different players or settings
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            checkpoint = cls(path, json.load(f))
+        settings = {"n_challenges": n_challenges, "battle_format": battle_format, "team_size": team_size}
+        if checkpoint.state["settings"] != settings:
+            raise ValueError(f"Checkpoint {path} was written with settings {checkpoint.state['settings']}, not {settings}")
+        # Round-trip through JSON so tuples and lists compare equal
+        if checkpoint.state["player_configs"] != json.loads(json.dumps(player_configs)):
+            raise ValueError(f"Checkpoint {path} was written for different player configs")
+        return checkpoint
+
+    @property
+    def seed(self) -> int:
+        return self.state["seed"]
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def matchup(self, key: str) -> dict:
+        """Stored state of a matchup ({"teams": [...], "battles": [...]}), or None if it hasn't started."""
+        return self.state["matchups"].get(key)
+
+    def matchup_teams(self, key: str, number: int, team_builder) -> list:
+        """The matchup's two teams: stored ones if it has started, otherwise drawn from the seeded generator."""
+        matchup = self.matchup(key)
+        if matchup is None:
+            rng = random.Random(f"{self.seed}:{number}")
+            teams = [team_builder.generate_random_team(team_size=self.state["settings"]["team_size"], rng=rng)
+                     for _ in range(2)]
+            matchup = self.state["matchups"][key] = {"teams": teams, "battles": []}
+            self.save()
+        return matchup["teams"]
+
+    def record_battle(self, key: str, outcome: str):
+        """Record one finished battle of a matchup ("p1", "p2" or "tie") and save."""
+        self.state["matchups"][key]["battles"].append(outcome)
+        self.save()
+
+    def rated(self, key: str) -> bool:
+        """Whether the matchup's series was already fed into the persistent ratings."""
+        return key in self.state.get("rated", [])
+
+    def mark_rated(self, key: str):
+        """Record that the matchup's series is in the ratings (so a resumed run doesn't add it again) and save."""
+        self.state.setdefault("rated", []).append(key)
+        self.save()
+
+    def battles(self, key: str) -> list:
+        matchup = self.matchup(key)
+        return matchup["battles"] if matchup is not None else []
@@ -0,0 +1,200 @@
+"""
+Span tracing of AIPlayer turns, exported as Chrome trace / Perfetto JSON.
+
+Each player's side of a battle gets its own track, and every phase of choose_move is a
+nested span tagged with the battle, turn, model and player. The background consumer of a
+streamed decision outlives the choose_move call that started it, so it gets a second
+"... (stream)" track.
+Open the trace files in https://ui.perfetto.dev or chrome://tracing.
+
+Tracing is off by default. While off, span() returns a shared no-op context manager, so
+an instrumented phase costs one call and one attribute check. With profile=True, the
+synchronous (CPU-bound) spans of each battle are also recorded with cProfile and dumped
+per battle when it finishes.
+"""
+
+import atexit
+import cProfile
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+
+DEFAULT_TRACE_DIR = os.path.join("battle_logs", "traces")
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "track", "args", "profile", "start", "token", "profiler")
+
+    def __init__(self, tracer, name, track, args, profile, token=None):
+        self.tracer = tracer
+        self.name = name
+        self.track = track
+        self.args = args
+        self.profile = profile
+        self.token = token
+        self.profiler = None
+
+    def __enter__(self):
+        if self.profile:
+            self.profiler = self.tracer._enable_profiler((self.args.get("battle"), self.args.get("player")))
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter_ns()
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.tracer._record(self.name, self.track, self.start, end, self.args)
+        if self.token is not None:
+            self.tracer._context.reset(self.token)
+        return False
+
+
+class Tracer:
+    """Collects spans in memory and writes them as a Chrome trace when flushed."""
+
+    def __init__(self):
+        self.enabled = False
+        self.profile = False
+        self.trace_dir = DEFAULT_TRACE_DIR
+        self.max_events = 1000000
+        self._events = []
+        self._tracks = {}
+        self._profilers = {}
+        self._lock = threading.Lock()
+        self._context = contextvars.ContextVar("trace_battle", default=None)
+        self._files = 0
+        self._origin = time.perf_counter_ns()
+        atexit.register(self.flush)
+
+    def enable(self, trace_dir: str = DEFAULT_TRACE_DIR, profile: bool = False, max_events: int = 1000000):
+        """
+        Start recording spans.
+
+        Args:
+            trace_dir: Directory for trace files and per-battle profiles
+            profile: Also cProfile the CPU-bound phases of each battle
+            max_events: Spans kept in memory before they are written out to a trace file
+        """
+        self.trace_dir = trace_dir
+        self.profile = profile
+        self.max_events = max_events
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording and write what was recorded (the settings are kept for toggle)."""
+        self.enabled = False
+        self.flush()
+
+    def toggle(self):
+        """Disable, or re-enable with the last trace_dir, profile and max_events settings."""
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable(self.trace_dir, self.profile, self.max_events)
+
+    def battle(self, name: str, battle_tag: str, turn: int, model: str, player: str):
+        """
+        Outermost span of a turn: later spans in the same task (and tasks it starts) are
+        tagged with this battle, turn, model and player.
+        """
+        if not self.enabled:
+            return _NOOP
+        args = {"battle": battle_tag, "turn": turn, "model": model, "player": player}
+        return _Span(self, name, f"{battle_tag} {player}", args, False, self._context.set(args))
+
+    def span(self, name: str, profile: bool = False, track: str = None):
+        """
+        Span of a phase within the current battle span.
+
+        Args:
+            name: Phase name
+            profile: The phase is synchronous CPU work to include in the battle's cProfile dump
+            track: Suffix of a separate track for work that outlives its parent (e.g. "stream")
+        """
+        if not self.enabled:
+            return _NOOP
+        args = self._context.get()
+        base = f"{args['battle']} {args['player']}" if args else "untracked"
+        return _Span(self, name, f"{base} ({track})" if track else base, args or {}, profile and self.profile)
+
+    def _enable_profiler(self, key):
+        profiler = self._profilers.get(key)
+        if profiler is None:
+            profiler = self._profilers[key] = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return None  # Another profiler is active (e.g. the whole run is under cProfile)
+        return profiler
+
+    def _record(self, name, track, start, end, args):
+        with self._lock:
+            tid = self._tracks.get(track)
+            if tid is None:
+                tid = self._tracks[track] = len(self._tracks) + 1
+            self._events.append((name, tid, start, end, args))
+            full = len(self._events) >= self.max_events
+        if full:
+            self.flush()
+
+    def finish_battle(self, battle_tag: str, player: str):
+        """Write the player's cProfile dump for the battle (if profiled) to <trace_dir>/profiles/."""
+        profiler = self._profilers.pop((battle_tag, player), None)
+        if profiler is None:
+            return
+        directory = os.path.join(self.trace_dir, "profiles")
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r"[^\w.-]", "_", f"{battle_tag}-{player}")
+        profiler.dump_stats(os.path.join(directory, f"{name}.prof"))
+
+    def flush(self) -> str:
+        """Write the recorded spans to a new trace file; returns its path (None if there were none)."""
+        with self._lock:
+            events, self._events = self._events, []
+            tracks = dict(self._tracks)
+            self._files += 1
+            number = self._files
+        if not events:
+            return None
+        pid = os.getpid()
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": track}}
+                        for track, tid in tracks.items()]
+        for name, tid, start, end, args in events:
+            trace_events.append({"name": name, "cat": "choose_move", "ph": "X", "pid": pid, "tid": tid,
+                                 "ts": (start - self._origin) / 1000, "dur": (end - start) / 1000, "args": args})
+        os.makedirs(self.trace_dir, exist_ok=True)
+        path = os.path.join(self.trace_dir, f"trace-{pid}-{number:04d}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+        return path
+
+
+tracer = Tracer()
+
+
+def install_signal_toggle(loop, signum=None):
+    """
+    Toggle tracing when the process receives signum (default SIGUSR1; not available on Windows).
+
+    The toggle runs as a callback on loop rather than inside the signal handler, which could
+    interrupt a thread holding the tracer's lock and deadlock on flush.
+    """
+    import signal
+    loop.add_signal_handler(signum or signal.SIGUSR1, tracer.toggle)
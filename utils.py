@@ -166,6 +166,70 @@ def create_team_array(battle: Battle):
     return remove_empty_values({"player_team": team})
 
 
+def create_team_sets(battle: Battle):
+    """
+    Create the static part of the team (what doesn't change during a battle).
+    Used by the stable prompt layout so it can form a cacheable prefix.
+    """
+    team = []
+    for pokemon in battle.team.values():
+        poke_data = {
+            "species": pokemon.species,
+            "level": pokemon.level,
+            "ability": str(pokemon.ability),
+            "item": str(pokemon.item),
+            "max_hp": pokemon.max_hp,
+        }
+
+        # Flatten stats directly into pokemon object
+        if pokemon.stats:
+            for stat_name, stat_value in pokemon.stats.items():
+                if stat_value is not None:
+                    poke_data[stat_name] = stat_value
+
+        poke_data["types"] = [str(type_) for type_ in pokemon.types]
+        poke_data["moves"] = list(pokemon.moves.keys())
+        team.append(poke_data)
+
+    return remove_empty_values({"player_team": team})
+
+
+def create_team_status(battle: Battle):
+    """
+    Create the per-turn part of the team: HP, status, boosts, spent PP and effects.
+    Complements create_team_sets().
+    """
+    team = []
+    for pokemon in battle.team.values():
+        poke_data = {
+            "species": pokemon.species,
+            "current_hp": pokemon.current_hp,
+            "current_hp_fraction": "{:.2%}".format(pokemon.current_hp_fraction),
+            "is_active": pokemon == battle.active_pokemon,
+            "fainted": pokemon.fainted,
+        }
+
+        if pokemon.status:
+            poke_data["status"] = str(pokemon.status)
+
+        non_zero_boosts = {k: v for k, v in pokemon.boosts.items() if v != 0}
+        if non_zero_boosts:
+            poke_data["boosts"] = non_zero_boosts
+
+        # Only moves that have spent PP
+        spent_pp = [{"id": move_id, "pp": move.current_pp, "max_pp": move.max_pp}
+                    for move_id, move in pokemon.moves.items() if move.current_pp < move.max_pp]
+        if spent_pp:
+            poke_data["pp"] = spent_pp
+
+        if pokemon.effects:
+            poke_data["effects"] = [str(effect) for effect in pokemon.effects]
+
+        team.append(poke_data)
+
+    return remove_empty_values({"player_team": team})
+
+
 # Keep old function for backwards compatibility if needed
 def create_team_dictionary(battle: Battle):
     """Deprecated: Use create_team_array() instead for better token efficiency."""
@@ -200,7 +264,8 @@ def load_yaml(yaml_path="prompts.yaml"):
         return yaml.safe_load(f)
 
 
-def log_battle_interaction(model_name, messages, response, outcome, is_valid_response=True):
+def log_battle_interaction(model_name, messages, response, outcome, is_valid_response=True, latency=None, extra=None,
+                           writer=None):
     """
     Log battle interactions to JSONL files organized by model and outcome.
 
@@ -208,12 +273,13 @@ def log_battle_interaction(model_name, messages, response, outcome, is_valid_res
         model_name: Name of the model (will be sanitized for filename)
         messages: List of messages sent to the AI
         response: The AI's response (dict or string)
-        outcome: "win", "loss", or None (for ongoing/unknown)
+        outcome: "win", "loss", "unfinished" (recovered from a spool), or None (for ongoing/unknown)
         is_valid_response: Whether the response conformed to the expected schema
+        latency: Optional dict with the provider request latency breakdown (seconds)
+        extra: Optional dict of per-turn measurements added to the entry (None values are skipped)
+        writer: Optional BatchedLogWriter; the entry is queued on it instead of written here
     """
-    # Create logs directory if it doesn't exist
     logs_dir = "battle_logs"
-    os.makedirs(logs_dir, exist_ok=True)
 
     # Sanitize model name for filename (replace / and \ with _)
     safe_model_name = model_name.replace("/", "_").replace("\\", "_").replace(":", "_")
@@ -225,6 +291,8 @@ def log_battle_interaction(model_name, messages, response, outcome, is_valid_res
         filename = f"{safe_model_name}_wins.jsonl"
     elif outcome == "loss":
         filename = f"{safe_model_name}_losses.jsonl"
+    elif outcome == "unfinished":
+        filename = f"{safe_model_name}_unfinished.jsonl"
     else:
         # Don't log ongoing moves - only log when we know the outcome
         return
@@ -237,8 +305,21 @@ def log_battle_interaction(model_name, messages, response, outcome, is_valid_res
         "messages": messages,
         "response": response,
         "outcome": outcome if is_valid_response else "invalid",
+        # The battle's result, kept for invalid responses too (outcome is "invalid" for those)
+        "battle_outcome": outcome,
         "is_valid_response": is_valid_response
     }
+    if latency:
+        log_entry["latency"] = latency
+    if extra:
+        log_entry.update({key: value for key, value in extra.items() if value is not None})
+
+    if writer is not None:
+        writer.write(filepath, log_entry)
+        return
+
+    # Create logs directory if it doesn't exist (the writer's thread does this itself)
+    os.makedirs(logs_dir, exist_ok=True)
 
     # Append to JSONL file (one JSON object per line, no indentation)
     with open(filepath, 'a', encoding='utf-8') as f: